@@ -2,13 +2,13 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
 import subprocess
-import re  # <-- DODANY IMPORT
 
-os.environ['IMAGEMAGICK_BINARY'] = r'C:\Program Files\ImageMagick-7.1.1-Q16\magick.exe'
-import threading
-from video_merger import VideoMerger
+from video_merger import VideoMerger, CONCAT_COPY
 from gui_elements import VideoConfigDialog, TemplateConfigDialog
 import data_load
+import job_queue
+import output_profiles
+import proxy_cache
 
 
 class VideoMergerGUI:
@@ -21,6 +21,12 @@ class VideoMergerGUI:
         self.pre_template_clips = []
         self.post_template_clips = []
         self.item_no_var = tk.StringVar()
+        self.profile_var = tk.StringVar(value=output_profiles.DEFAULT_PROFILE)
+        self.profile_combo = None
+        self.template_profiles = None
+        # Kolejka renderu; przy starcie wznawia zadania przerwane w poprzedniej sesji
+        self.render_queue = job_queue.get_job_queue()
+        self.render_queue.start()
 
         self.load_template()
         self.setup_ui()
@@ -74,35 +80,17 @@ class VideoMergerGUI:
             return
 
         try:
-            names = data_load.load_names(item_no)
-            description = data_load.load_description(item_no)
-            materials = data_load.load_materials(item_no)
-
-            data_map = {
-                "{INDEKS}": item_no,
-                "{NAZWA_PL}": names.get("PL", "Brak nazwy PL"),
-                "{NAZWA_EN}": names.get("EN", "Brak nazwy EN"),
-                "{OPIS}": description,
-                "{MATERIALY}": materials
-            }
+            data_map = data_load.build_placeholder_map(item_no)
         except Exception as e:
             messagebox.showerror("Błąd ładowania danych", f"Wystąpił błąd podczas komunikacji z plikiem Excel: {e}",
                                  parent=self.root)
             return
 
-        # --- ZMIENIONA FUNKCJA WEWNĘTRZNA ---
-        # Nowa logika, która skanuje tekst i zamienia wszystkie znalezione symbole.
+        # Jeden przebieg wspólnego wzorca po każdym tekście zamienia wszystkie znalezione symbole.
         def update_clip_texts(clips_list):
             for clip in clips_list:
                 for text_info in clip.get('texts', []):
-                    current_text = text_info.get('text', '')
-                    # Pętla po wszystkich symbolach i zamiana każdego z nich w tekście
-                    for placeholder, value in data_map.items():
-                        # Używamy re.sub do zamiany bez względu na wielkość liter
-                        current_text = re.sub(re.escape(placeholder), str(value), current_text, flags=re.IGNORECASE)
-                    text_info['text'] = current_text
-
-        # --- KONIEC ZMIANY ---
+                    text_info['text'] = data_load.resolve_placeholders(text_info.get('text', ''), data_map)
 
         update_clip_texts(self.pre_template_clips)
         update_clip_texts(self.post_template_clips)
@@ -131,17 +119,10 @@ class VideoMergerGUI:
         scrollbar.grid(row=3, column=2, sticky=(tk.N, tk.S), pady=(0, 10))
         parent.rowconfigure(3, weight=1)
 
-    def merge_files_thread(self, output_path, item_no, progress_callback):
+    def full_clip_list(self):
         user_clips_start_index = len(self.pre_template_clips)
         user_clips = self.merger.clips_data[user_clips_start_index:]
-        full_clips = self.pre_template_clips + user_clips + self.post_template_clips
-
-        temp_merger = VideoMerger()
-        for clip in full_clips:
-            temp_merger.add_clip(clip['path'], clip['texts'], clip.get('image_duration'))
-
-        success, message = temp_merger.merge_videos(output_path, item_no, progress_callback)
-        self.root.after(0, lambda: self.merge_complete(success, message))
+        return self.pre_template_clips + user_clips + self.post_template_clips
 
     def start_merge_process(self):
         user_clips_count = len(self.merger.clips_data) - len(self.pre_template_clips)
@@ -156,12 +137,13 @@ class VideoMergerGUI:
         self.progress_bar['mode'] = 'determinate'
         self.status_var.set("Processing...")
         item_no = self.item_no_var.get().strip()
-        thread = threading.Thread(
-            target=self.merge_files_thread,
-            args=(self.output_var.get(), item_no, self.update_progress),
-            daemon=True
-        )
-        thread.start()
+        # Render trafia do trwałej kolejki zadań - przerwany (np. zamknięcie programu)
+        # zostanie wznowiony przy następnym starcie, z użyciem gotowych segmentów
+        self.render_queue.submit(
+            item_no, self.output_var.get(), self.full_clip_list(), self.profile_var.get(),
+            options={'concat_method': CONCAT_COPY, 'template_profiles': self.template_profiles},
+            progress_callback=self.update_progress,
+            done_callback=lambda success, message: self.root.after(0, lambda: self.merge_complete(success, message)))
 
     def load_template(self):
         success, result = self.template_manager.load_template()
@@ -172,8 +154,14 @@ class VideoMergerGUI:
         if success:
             self.pre_template_clips = result.get('pre_clips', [])
             self.post_template_clips = result.get('post_clips', [])
+            self.template_profiles = result.get('output_profiles')
+            if self.profile_combo is None and result.get('output_profile'):
+                self.profile_var.set(result['output_profile'])
+            self.refresh_profiles()
             for clip in self.pre_template_clips:
                 self.merger.add_clip(clip['path'], clip['texts'], clip.get('image_duration'))
+            for clip in self.pre_template_clips + self.post_template_clips:
+                proxy_cache.get_proxy_manager().request(clip['path'])
         else:
             print(result)
 
@@ -222,9 +210,22 @@ class VideoMergerGUI:
         self.output_var = tk.StringVar(value=f"{self.item_no_var}.mp4")
         ttk.Entry(output_frame, textvariable=self.output_var).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(0, 10))
         ttk.Button(output_frame, text="Szukaj", command=self.browse_output_file).grid(row=0, column=2)
-        ttk.Button(output_frame, text="Generuj film", command=self.start_merge_process).grid(row=1, column=0,
+        ttk.Label(output_frame, text="Profil wyjścia:").grid(row=1, column=0, sticky=tk.W, padx=(0, 10), pady=(10, 0))
+        self.profile_combo = ttk.Combobox(output_frame, textvariable=self.profile_var, state="readonly")
+        self.profile_combo.grid(row=1, column=1, sticky=tk.W, pady=(10, 0))
+        self.refresh_profiles()
+        ttk.Button(output_frame, text="Generuj film", command=self.start_merge_process).grid(row=2, column=0,
                                                                                             columnspan=3, pady=(10, 0))
 
+    def refresh_profiles(self):
+        """Lista profili wyjścia: wbudowane, z output_profiles.json i z szablonu."""
+        if self.profile_combo is None:
+            return
+        names = list(output_profiles.load_profiles(self.template_profiles))
+        self.profile_combo['values'] = names
+        if self.profile_var.get() not in names:
+            self.profile_var.set(output_profiles.DEFAULT_PROFILE)
+
     def setup_progress_area(self, parent):
         progress_frame = ttk.LabelFrame(parent, text="Postęp", padding="10")
         progress_frame.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E))
@@ -276,6 +277,8 @@ class VideoMergerGUI:
         if dialog.result:
             path, texts_data, duration = dialog.result
             self.merger.add_clip(path, texts_data, image_duration=duration)
+            # Proxy do szybkich renderów szkicowych powstaje w tle, zanim operator skończy montaż
+            proxy_cache.get_proxy_manager().request(path)
             self.update_file_list()
 
     def edit_file_dialog(self):
@@ -399,10 +402,13 @@ class VideoMergerGUI:
                 if capture_output:
                     result = subprocess.run(command, check=True, text=True, stdout=subprocess.PIPE,
                                             stderr=subprocess.PIPE)
-                    return result
                 else:
-                    return subprocess.run(command, check=True)
+                    result = subprocess.run(command, check=True)
+                # Nowy eksport -> od razu budujemy cache, żeby kolejne starty nie parsowały xlsx
+                data_load.build_cache()
+                return result
             else:
+                # Bez czekania cache zostanie przebudowany przy pierwszym odczycie (inny hash pliku)
                 return subprocess.Popen(command)
         except subprocess.CalledProcessError as e:
             print(f"Błąd podczas uruchamiania: {e}")
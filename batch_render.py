@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Video Merger - batch rendering without the GUI.
+
+Renders one `{item_no}.mp4` per product index using the pre/post clips from the
+template and a list of user clips, e.g.:
+
+    python batch_render.py --clips klipy.json --items-file indeksy.txt --output-dir filmy
+    python batch_render.py --clips klipy.json --range 10400 10450 --workers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+
+import data_load
+import output_profiles
+import proxy_cache
+import render_scheduler
+from segment_cache import SegmentCache
+from template_manager import TemplateManager
+from video_merger import VideoMerger, CONCAT_COPY, CONCAT_STREAM, ENGINE_MOVIEPY, ENGINE_FFMPEG
+
+
+def load_item_numbers(items_file=None, item_range=None, items=None):
+    """Zbiera listę indeksów z pliku (jeden na linię), zakresu liczbowego i argumentów - bez duplikatów."""
+    item_numbers = list(items or [])
+
+    if items_file:
+        with open(items_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    item_numbers.append(line)
+
+    if item_range:
+        start, end = item_range
+        # Zachowujemy zera wiodące z początku zakresu, np. 00100-00150
+        width = len(start)
+        for number in range(int(start), int(end) + 1):
+            item_numbers.append(str(number).zfill(width))
+
+    return list(dict.fromkeys(item_numbers))
+
+
+def load_user_clips(clips_file):
+    """Wczytuje listę klipów użytkownika (ten sam format co pre_clips/post_clips w szablonie)."""
+    if not clips_file:
+        return []
+    with open(clips_file, 'r', encoding='utf-8') as f:
+        clips = json.load(f)
+    if isinstance(clips, dict):
+        clips = clips.get("clips", [])
+    if not isinstance(clips, list):
+        raise ValueError(f"Invalid clip list format in {clips_file}: expected a list.")
+    return clips
+
+
+def build_clip_list(template_file, clips_file):
+    template_manager = TemplateManager(template_file)
+    success, result = template_manager.load_template()
+    if not success:
+        print(result)
+        result = {"pre_clips": [], "post_clips": []}
+    return result["pre_clips"] + load_user_clips(clips_file) + result["post_clips"]
+
+
+def load_output_profiles(template_file):
+    """(profile wyjścia, nazwa profilu domyślnego szablonu) - profile z szablonu nadpisują wbudowane."""
+    success, result = TemplateManager(template_file).load_template()
+    if not success:
+        result = {}
+    return output_profiles.load_profiles(result.get("output_profiles")), result.get("output_profile")
+
+
+def collect_input_files(full_clips, template_file, clips_file):
+    """Pliki, od których zależy wynik renderu - używane do sprawdzenia, czy film jest aktualny."""
+    paths = [template_file, clips_file, data_load.EXCEL_PATH, output_profiles.PROFILES_FILE]
+    paths.extend(clip['path'] for clip in full_clips)
+    return [p for p in paths if p]
+
+
+def is_up_to_date(output_path, input_files):
+    if not os.path.exists(output_path):
+        return False
+    output_mtime = os.path.getmtime(output_path)
+    for path in input_files:
+        if os.path.exists(path) and os.path.getmtime(path) > output_mtime:
+            return False
+    return True
+
+
+def make_merger(full_clips, render_engine=ENGINE_MOVIEPY, concat_method=CONCAT_COPY, output_profile=None,
+                profiles=None, collect_metrics=None):
+    merger = VideoMerger(segment_cache=SegmentCache(), concat_method=concat_method, render_engine=render_engine,
+                         output_profile=output_profile, profiles=profiles, collect_metrics=collect_metrics)
+    for clip in full_clips:
+        merger.add_clip(clip['path'], clip['texts'], clip.get('image_duration'))
+    return merger
+
+
+def console_progress(prefix):
+    def callback(percentage=None, message=""):
+        if percentage is not None:
+            print(f"\r[{prefix}] {message}", end="", flush=True)
+        else:
+            print(f"\n[{prefix}] {message}", flush=True)
+    return callback
+
+
+def render_batch(full_clips, item_numbers, output_dir=".", input_files=(), force=False, workers=1,
+                 memory_limit_mb=None, render_engine=ENGINE_MOVIEPY, concat_method=CONCAT_COPY,
+                 output_profile=None, profiles=None, output_suffix="", variants=None, collect_metrics=None):
+    """
+    Renderuje film dla każdego indeksu. Katalog produktów i lista klipów są
+    ładowane raz i współdzielone przez cały batch (przy workers != 1 - raz na proces).
+    Pliki wynikowe to `{item_no}{output_suffix}.mp4`, a przy `variants` (lista profili)
+    `{item_no}_{profil}.mp4` dla każdego profilu - wszystkie warianty z jednego dekodowania.
+    Przy collect_metrics obok każdego filmu powstaje raport czasów `{item_no}.metrics.json`.
+    Zwraca listę krotek (item_no, success, message).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    jobs = []
+
+    for item_no in item_numbers:
+        if variants:
+            output = [(os.path.join(output_dir, f"{item_no}_{name}.mp4"), name) for name in variants]
+            output_paths = [path for path, _ in output]
+        else:
+            output = os.path.join(output_dir, f"{item_no}{output_suffix}.mp4")
+            output_paths = [output]
+        if not force and all(is_up_to_date(path, input_files) for path in output_paths):
+            print(f"{item_no}: aktualny, pomijam")
+            results[item_no] = (item_no, True, f"Skipped (up to date): {', '.join(output_paths)}")
+        else:
+            jobs.append((item_no, output))
+
+    if workers == 1:
+        merger = make_merger(full_clips, render_engine, concat_method, output_profile, profiles, collect_metrics)
+        for i, (item_no, output) in enumerate(jobs):
+            start = time.perf_counter()
+            try:
+                if isinstance(output, list):
+                    print(f"[{i + 1}/{len(jobs)}] {item_no}: renderowanie {len(output)} wariantów")
+                    success, message = merger.merge_outputs(output, item_no, console_progress(item_no))
+                else:
+                    print(f"[{i + 1}/{len(jobs)}] {item_no}: renderowanie do {output}")
+                    success, message = merger.merge_videos(output, item_no, console_progress(item_no))
+            except Exception as e:
+                # Błąd jednego indeksu nie przerywa całego batcha (jak w render_scheduler)
+                traceback.print_exc()
+                success, message = False, f"Error during video merging: {str(e)}"
+            print(f"\n[{item_no}] {message} ({time.perf_counter() - start:.1f} s)")
+            results[item_no] = (item_no, success, message)
+    else:
+        for result in render_scheduler.render_parallel(full_clips, jobs, console_progress("batch"),
+                                                       workers=workers, memory_limit_mb=memory_limit_mb,
+                                                       render_engine=render_engine,
+                                                       concat_method=concat_method,
+                                                       output_profile=output_profile, profiles=profiles,
+                                                       collect_metrics=collect_metrics):
+            results[result[0]] = result
+
+    return [results[item_no] for item_no in item_numbers]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch rendering of product videos (one video per item number).")
+    parser.add_argument("--template", default="template.json", help="template file with pre_clips/post_clips")
+    parser.add_argument("--clips", help="JSON file with the list of user clips")
+    parser.add_argument("--items-file", help="text file with one item number per line")
+    parser.add_argument("--range", nargs=2, metavar=("START", "END"), dest="item_range",
+                        help="numeric range of item numbers (inclusive)")
+    parser.add_argument("items", nargs="*", help="item numbers")
+    parser.add_argument("--output-dir", default=".", help="directory for {item_no}.mp4 files")
+    parser.add_argument("--force", action="store_true", help="render even if the output is up to date")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of parallel render processes (0 = choose from the CPU count)")
+    parser.add_argument("--memory-limit-mb", type=int,
+                        help="resident memory (RSS) cap per render process including its ffmpeg children; "
+                             "a job over the cap is cancelled (--workers > 1, Linux or psutil)")
+    parser.add_argument("--engine", choices=[ENGINE_MOVIEPY, ENGINE_FFMPEG], default=ENGINE_MOVIEPY,
+                        help="render engine (ffmpeg falls back to moviepy for unsupported templates)")
+    parser.add_argument("--profile", nargs="+",
+                        help="output profile(s): default, final, social, square, horizontal, draft or one defined "
+                             "in output_profiles.json or the template; outputs are named {item_no}_{profile}.mp4. "
+                             "Several profiles are rendered from a single decode pass")
+    parser.add_argument("--concat", choices=[CONCAT_COPY, CONCAT_STREAM], default=CONCAT_COPY,
+                        help="moviepy engine: encode segments and join them with -c copy, or stream frames "
+                             "one source at a time into a single encoder (constant memory for long clips)")
+    parser.add_argument("--metrics", action="store_true", default=None,
+                        help="write a per-stage timing report ({item_no}.metrics.json) next to each video "
+                             "(also enabled by VIDEOM_METRICS=1)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    item_numbers = load_item_numbers(args.items_file, args.item_range, args.items)
+    if not item_numbers:
+        print("Nie podano żadnych indeksów (--items-file, --range lub lista indeksów).")
+        return 2
+
+    full_clips = build_clip_list(args.template, args.clips)
+    if not full_clips:
+        print("Brak klipów do połączenia (szablon i lista klipów są puste).")
+        return 2
+
+    profiles, template_profile = load_output_profiles(args.template)
+    selected = args.profile or [template_profile]
+    try:
+        for name in selected:
+            output_profiles.get_profile(name, profiles)
+    except ValueError as e:
+        print(e)
+        return 2
+    output_profile = selected[0]
+    variants = args.profile if args.profile and len(args.profile) > 1 else None
+
+    if any(output_profiles.get_profile(name, profiles).get('proxies') for name in selected):
+        # Proxy tworzymy raz przed batchem - wszystkie szkice czytają już małe pliki
+        print("Przygotowywanie proxy klipów wideo...")
+        proxy_cache.get_proxy_manager().prepare(clip['path'] for clip in full_clips if not clip.get('is_image'))
+
+    input_files = collect_input_files(full_clips, args.template, args.clips)
+    results = render_batch(full_clips, item_numbers, args.output_dir, input_files, args.force,
+                           workers=args.workers, memory_limit_mb=args.memory_limit_mb, render_engine=args.engine,
+                           concat_method=args.concat, output_profile=output_profile, profiles=profiles,
+                           output_suffix=f"_{output_profile}" if args.profile else "", variants=variants,
+                           collect_metrics=args.metrics)
+
+    failed = [item_no for item_no, success, _ in results if not success]
+    print(f"Gotowe: {len(results) - len(failed)}/{len(results)} OK")
+    if failed:
+        print("Błędy dla indeksów: " + ", ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Video Merger - benchmark suite for the render pipeline.
+
+Generates synthetic test data (colour-bar MP4s and PNG boards at 1080x1920,
+a NAV workbook with thousands of items and a template shaped like
+template.json), times the pipeline and appends the results to a JSONL file
+so runs can be compared over time:
+
+    python benchmark.py                      # full run, results in bench_results.jsonl
+    python benchmark.py --only catalog overlays
+    python benchmark.py --compare            # compare with the previous run with the same parameters
+
+Dane testowe są deterministyczne (stałe ziarno) i generowane raz w --data-dir;
+benchmark działa w tym katalogu, więc cache (segment_cache, text_cache, cache
+arkusza) nie mieszają się z cache aplikacji.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+import batch_render
+import data_load
+import ffmpeg_tools
+import text_render
+from segment_cache import SegmentCache
+from text_cache import TextOverlayCache
+from video_merger import VideoMerger
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCH_DATA_DIR = "bench_data"
+RESULTS_FILE = "bench_results.jsonl"
+SEED = 1234
+FRAME_SIZE = (1080, 1920)
+FPS = 30
+SUITES = ("catalog", "overlays", "single", "batch")
+
+# Konfiguracje pojedynczego renderu: nazwa -> argumenty VideoMerger
+SINGLE_RENDER_CONFIGS = {
+    "moviepy_copy": {"render_engine": "moviepy", "concat_method": "copy"},
+    "moviepy_stream": {"render_engine": "moviepy", "concat_method": "stream"},
+    "ffmpeg": {"render_engine": "ffmpeg", "concat_method": "copy"},
+}
+
+_WORDS = ("stół", "krzesło", "lampa", "dąb", "sosna", "metal", "szkło", "szafka", "regał", "komoda",
+          "table", "chair", "lamp", "oak", "pine", "steel", "glass", "cabinet", "shelf", "drawer")
+
+
+# --- dane testowe ---------------------------------------------------------------------------------
+
+def item_number(n):
+    return f"9{n:05d}"
+
+
+def generate_video(path, seconds, pattern="smptehdbars", size=FRAME_SIZE):
+    """Plansza testowa ffmpeg (lavfi) z tonem 440 Hz - format jak klipy z telefonu."""
+    command = [
+        ffmpeg_tools.ffmpeg_binary(), '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f"{pattern}=size={size[0]}x{size[1]}:rate={FPS}:duration={seconds}",
+        '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=44100:duration={seconds}",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', path,
+    ]
+    subprocess.run(command, check=True)
+
+
+def generate_board(path, color, label, size=FRAME_SIZE):
+    """Plansza PNG (tło z gradientem i ramką) jak tła szablonu."""
+    image = Image.new("RGB", size, color)
+    draw = ImageDraw.Draw(image)
+    for y in range(0, size[1], 8):
+        shade = int(60 * y / size[1])
+        draw.line([(0, y), (size[0], y)], fill=tuple(max(0, c - shade) for c in color), width=8)
+    draw.rectangle([40, 40, size[0] - 40, size[1] - 40], outline=(255, 255, 255), width=6)
+    draw.text((80, 80), label, fill=(255, 255, 255))
+    image.save(path)
+
+
+def generate_workbook(path, items, seed=SEED):
+    """Eksport NAV z arkuszami Indeksy / Opisy / Materialy (kilka wierszy opisu na kartę)."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    indeksy, opisy, materialy = [], [], []
+    cards = max(1, items // 3)
+    for n in range(items):
+        card = f"K{n % cards:05d}"
+        indeksy.append({
+            "Item No_": item_number(n),
+            "DescriptionPL": " ".join(rng.choice(_WORDS) for _ in range(4)),
+            "DescriptionENU": " ".join(rng.choice(_WORDS) for _ in range(4)),
+            "Assortment Card No_": card,
+        })
+    for c in range(cards):
+        card = f"K{c:05d}"
+        for _ in range(rng.randint(1, 3)):
+            opisy.append({"Assortment Card No_": card,
+                          "Opis Indeksu": " ".join(rng.choice(_WORDS) for _ in range(12))})
+        materialy.append({"Assortment Card No_": card, "Material": ", ".join(rng.sample(_WORDS, 3))})
+
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(indeksy).to_excel(writer, sheet_name="Indeksy", index=False)
+        pd.DataFrame(opisy).to_excel(writer, sheet_name="Opisy", index=False)
+        pd.DataFrame(materialy).to_excel(writer, sheet_name="Materialy", index=False)
+
+
+def _text(text, fontsize, position, wrap_width=None, bg_color="None"):
+    return {"text": text, "config": {
+        "fontsize": fontsize, "color": "white", "movement": "static", "alignment": "center", "opacity": 0.9,
+        "start_time": 0.0, "bg_color": bg_color, "duration": 0.0, "wrap_width": wrap_width, "position": position,
+    }}
+
+
+def template_texts():
+    """Napisy planszy produktu - te same symbole i układ co w template.json."""
+    return [
+        _text("{Nazwa_pl}", 40, [0.5, 0.444]),
+        _text("{Nazwa_EN}", 35, [0.5, 0.506]),
+        _text("{opis}", 20, [0.5, 0.7], wrap_width=350),
+        _text("{materialy}", 20, [0.5, 0.9], wrap_width=350),
+        _text("{indeks}", 40, [0.5, 0.311], bg_color="#ffffff"),
+    ]
+
+
+def generate_data(data_dir, items, seconds):
+    """
+    Tworzy brakujące dane testowe (po zmianie parametrów - od nowa); zwraca
+    (szablon jak template.json, klipy użytkownika). Ścieżki są względne wobec data_dir.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+
+    def path(name):
+        return os.path.join(data_dir, name)
+
+    data_meta = path("bench_data.json")
+    meta = {"items": items, "seconds": seconds, "seed": SEED, "size": list(FRAME_SIZE), "fps": FPS}
+    fresh = _read_json(data_meta) != meta
+
+    media = {
+        "intro.mp4": lambda p: generate_video(p, 2, "testsrc2"),
+        "outro.mp4": lambda p: generate_video(p, 2, "testsrc2"),
+        "product_1.mp4": lambda p: generate_video(p, seconds, "smptehdbars"),
+        "product_2.mp4": lambda p: generate_video(p, seconds, "smptebars"),
+        "board_start.png": lambda p: generate_board(p, (30, 60, 120), "start"),
+        "board_product.png": lambda p: generate_board(p, (20, 20, 20), "product"),
+        "board_end.png": lambda p: generate_board(p, (120, 40, 40), "end"),
+    }
+    for name, create in media.items():
+        if fresh or not os.path.exists(path(name)):
+            print(f"Generowanie {name}...")
+            create(path(name))
+
+    workbook = path(data_load.EXCEL_PATH)
+    if fresh or not os.path.exists(workbook):
+        print(f"Generowanie arkusza NAV ({items} indeksów)...")
+        generate_workbook(workbook, items)
+    with open(data_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    template = {
+        "pre_clips": [
+            {"path": "board_start.png", "texts": [], "is_image": True, "image_duration": 3},
+            {"path": "intro.mp4", "texts": [], "is_image": False, "image_duration": None},
+            {"path": "board_product.png", "texts": template_texts(), "is_image": True, "image_duration": 3},
+        ],
+        "post_clips": [
+            {"path": "outro.mp4", "texts": [], "is_image": False, "image_duration": None},
+            {"path": "board_end.png", "texts": [], "is_image": True, "image_duration": 3},
+        ],
+    }
+    with open(path("template.json"), 'w', encoding='utf-8') as f:
+        json.dump(template, f, indent=4)
+
+    user_clips = [
+        {"path": "product_1.mp4", "texts": [_text("{indeks}", 60, [0.5, 0.1], bg_color="#000000")]},
+        {"path": "product_2.mp4", "texts": []},
+    ]
+    return template, user_clips
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# --- pomiary --------------------------------------------------------------------------------------
+
+def measure(function, repeat=1):
+    """Czasy `repeat` wywołań; wynik: min, mediana i wszystkie próby (sekundy)."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return {"min": round(min(samples), 4), "median": round(statistics.median(samples), 4),
+            "samples": [round(s, 4) for s in samples]}
+
+
+def bench_catalog(items, repeat, lookups=1000):
+    results = {}
+    cache_file = data_load.cache_path_for(data_load.EXCEL_PATH)
+
+    def cold():
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+        data_load.load_sheets()
+
+    results["catalog_cold_xlsx"] = measure(cold, repeat)
+    results["catalog_warm_cache"] = measure(data_load.load_sheets, repeat)
+
+    def build_index():
+        data_load.ProductCatalog().load()
+
+    results["catalog_build_index"] = measure(build_index, repeat)
+
+    catalog = data_load.ProductCatalog()
+    catalog.load()
+    rng = random.Random(SEED)
+    item_numbers = [item_number(rng.randrange(items)) for _ in range(lookups)]
+
+    def lookup():
+        for item_no in item_numbers:
+            catalog.names(item_no)
+            catalog.description(item_no)
+            catalog.materials(item_no)
+
+    results[f"catalog_{lookups}_lookups"] = measure(lookup, repeat)
+    return results
+
+
+def bench_overlays(items, repeat, count=50):
+    """Rasteryzacja napisów planszy produktu dla `count` indeksów: bez cache i z cache w pamięci."""
+    data_load.get_catalog().load()
+    texts = []
+    for n in range(count):
+        placeholder_map = data_load.build_placeholder_map(item_number(n * (items // count or 1)))
+        for text_info in template_texts():
+            texts.append((data_load.resolve_placeholders(text_info["text"], placeholder_map), text_info["config"]))
+
+    renderer = text_render.get_text_renderer("pillow")
+    results = {
+        f"overlays_{len(texts)}_render": measure(lambda: [renderer.render(t, c) for t, c in texts], repeat),
+    }
+
+    cache = TextOverlayCache(max_items=len(texts) + 1, cache_dir="text_cache_bench")
+    shutil.rmtree(cache.cache_dir, ignore_errors=True)
+
+    def cached():
+        for text, config in texts:
+            key = cache.key_for(text, config, extra=renderer.name)
+            if cache.get(key) is None:
+                cache.put(key, renderer.render(text, config))
+
+    cached()
+    results[f"overlays_{len(texts)}_cached"] = measure(cached, repeat)
+    shutil.rmtree(cache.cache_dir, ignore_errors=True)
+    return results
+
+
+def _clear_render_caches():
+    for directory in ("segment_cache", "text_cache", "out"):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _make_merger(full_clips, config, output_profile=None, text_overlay_cache=None):
+    merger = VideoMerger(segment_cache=SegmentCache(), output_profile=output_profile, collect_metrics=True,
+                         text_overlay_cache=text_overlay_cache, **config)
+    for clip in full_clips:
+        merger.add_clip(clip["path"], clip["texts"], clip.get("image_duration"))
+    return merger
+
+
+def bench_single(full_clips, repeat, profile=None):
+    """
+    Jeden film w każdej konfiguracji: zimny (puste cache segmentów i napisów) i ciepły.
+    Katalog produktów jest w obu przypadkach już wczytany.
+    """
+    results = {}
+    for name, config in SINGLE_RENDER_CONFIGS.items():
+        output_path = os.path.join("out", f"single_{name}.mp4")
+        reports = {}
+
+        def render(kind):
+            # Zimny render dostaje nową instancję cache napisów - bez bitmap z poprzednich pomiarów
+            text_overlay_cache = TextOverlayCache() if kind == "cold" else None
+            merger = _make_merger(full_clips, config, profile, text_overlay_cache)
+            success, message = merger.merge_videos(output_path, item_number(0))
+            if not success:
+                raise RuntimeError(f"{name}: {message}")
+            report = _read_json(os.path.splitext(output_path)[0] + ".metrics.json") or {}
+            reports[kind] = {stage: entry["seconds"] for stage, entry in report.get("stages", {}).items()}
+
+        def cold():
+            _clear_render_caches()
+            os.makedirs("out", exist_ok=True)
+            render("cold")
+
+        results[f"single_{name}_cold"] = dict(measure(cold, repeat), stages=reports.get("cold"))
+        results[f"single_{name}_warm"] = dict(measure(lambda: render("warm"), repeat), stages=reports.get("warm"))
+    return results
+
+
+def bench_batch(full_clips, items, count, workers, repeat, profile=None):
+    item_numbers = [item_number(n * (items // count or 1)) for n in range(count)]
+    results = {}
+
+    def batch():
+        _clear_render_caches()
+        outcome = batch_render.render_batch(full_clips, item_numbers, "out", force=True, workers=workers,
+                                            output_profile=profile)
+        failed = [item_no for item_no, success, _ in outcome if not success]
+        if failed:
+            raise RuntimeError(f"batch: failed items {', '.join(failed)}")
+
+    results[f"batch_{count}_items_{workers}_workers"] = measure(batch, repeat)
+    return results
+
+
+# --- wyniki ---------------------------------------------------------------------------------------
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                                text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_results(path):
+    runs = []
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    runs.append(json.loads(line))
+    return runs
+
+
+def print_results(run, previous=None):
+    print(f"\nWyniki ({run['commit'] or 'bez git'}, {run['timestamp']}):")
+    if previous:
+        print(f"Porównanie z {previous['commit'] or '?'} ({previous['timestamp']})")
+    for name, result in run["results"].items():
+        line = f"  {name:<40} {result['min']:>9.3f} s"
+        old = (previous or {}).get("results", {}).get(name)
+        if old and old["min"] > 0:
+            change = (result["min"] - old["min"]) / old["min"] * 100
+            line += f"   (było {old['min']:.3f} s, {change:+.1f}%)"
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite for the render pipeline (synthetic data).")
+    parser.add_argument("--data-dir", default=BENCH_DATA_DIR, help="directory for the generated test data")
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSONL file the results are appended to")
+    parser.add_argument("--only", nargs="+", choices=SUITES, help="run only the selected suites")
+    parser.add_argument("--items", type=int, default=5000, help="number of items in the synthetic workbook")
+    parser.add_argument("--seconds", type=int, default=4, help="length of the synthetic product clips")
+    parser.add_argument("--batch-items", type=int, default=4, help="number of videos in the batch benchmark")
+    parser.add_argument("--workers", type=int, default=1, help="render processes in the batch benchmark")
+    parser.add_argument("--profile", help="output profile for the render benchmarks (default: 'default')")
+    parser.add_argument("--repeat", type=int, default=1, help="repetitions per measurement (min is compared)")
+    parser.add_argument("--compare", action="store_true",
+                        help="compare with the previous run that used the same parameters")
+    parser.add_argument("--no-save", action="store_true", help="do not append the results to --results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results_path = os.path.abspath(args.results)
+    suites = args.only or SUITES
+    params = {"items": args.items, "seconds": args.seconds, "batch_items": args.batch_items,
+              "workers": args.workers, "profile": args.profile, "repeat": args.repeat, "suites": list(suites)}
+
+    template, user_clips = generate_data(args.data_dir, args.items, args.seconds)
+    full_clips = template["pre_clips"] + user_clips + template["post_clips"]
+
+    cwd = os.getcwd()
+    os.chdir(args.data_dir)
+    results = {}
+    try:
+        if "catalog" in suites:
+            print("Katalog produktów...")
+            results.update(bench_catalog(args.items, args.repeat))
+        if "overlays" in suites:
+            print("Napisy...")
+            results.update(bench_overlays(args.items, args.repeat))
+        if "single" in suites:
+            print("Pojedynczy render...")
+            results.update(bench_single(full_clips, args.repeat, args.profile))
+        if "batch" in suites:
+            print("Batch...")
+            results.update(bench_batch(full_clips, args.items, args.batch_items, args.workers, args.repeat,
+                                       args.profile))
+    finally:
+        os.chdir(cwd)
+
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "params": params,
+        "results": results,
+    }
+    previous = None
+    if args.compare:
+        same = [r for r in load_results(results_path) if r.get("params") == params]
+        previous = same[-1] if same else None
+        if previous is None:
+            print("Brak wcześniejszego przebiegu z tymi parametrami.")
+    print_results(run, previous)
+
+    if not args.no_save:
+        with open(results_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run, ensure_ascii=False) + "\n")
+        print(f"\nWyniki dopisane do {results_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
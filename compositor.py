@@ -0,0 +1,107 @@
+# compositor.py
+
+"""
+Nakładanie bitmap RGBA na klatki w NumPy, bez warstw MoviePy.
+Pozycje są obcinane do liczb całkowitych tak samo jak w CompositeVideoClip.
+"""
+
+import bisect
+
+import numpy as np
+
+
+def blit_rgba(frame, rgba, pos):
+    """
+    Nakłada bitmapę RGBA (uint8) na klatkę RGB (float32) w miejscu - operator "over".
+    Fragmenty poza kadrem są obcinane.
+    """
+    x, y = (int(p) for p in pos)
+    frame_h, frame_w = frame.shape[:2]
+    h, w = rgba.shape[:2]
+
+    x1, y1 = max(0, x), max(0, y)
+    x2, y2 = min(frame_w, x + w), min(frame_h, y + h)
+    if x1 >= x2 or y1 >= y2:
+        return frame
+
+    patch = rgba[y1 - y:y2 - y, x1 - x:x2 - x]
+    alpha = patch[:, :, 3:4].astype(np.float32) / 255.0
+    region = frame[y1:y2, x1:x2]
+    region *= 1.0 - alpha
+    region += patch[:, :, :3] * alpha
+    return frame
+
+
+class StaticOverlayCompositor:
+    """
+    Nakłada nieruchome napisy na klatki filmu jedną operacją NumPy na klatkę.
+
+    Czas klipu jest dzielony na przedziały, w których zestaw widocznych napisów się
+    nie zmienia. Dla każdego przedziału wszystkie napisy są raz łączone w jedną
+    płaszczyznę: kolor przemnożony przez alfę (premultiplied) i przepuszczalność
+    (1 - alfa), ograniczone do prostokąta obejmującego napisy. Klatka to wtedy
+    `frame * przepuszczalność + kolor` - bez warstw i tablic tymczasowych per napis.
+    """
+
+    def __init__(self, frame_size, overlays):
+        """
+        frame_size: (szerokość, wysokość); overlays: lista (rgba, (x, y), start, end)
+        w kolejności rysowania. Napis jest widoczny dla start <= t < end.
+        """
+        self.frame_size = frame_size
+        boundaries = sorted({0.0} | {float(o[2]) for o in overlays} | {float(o[3]) for o in overlays})
+        self._starts = []
+        self._planes = []
+        for start, end in zip(boundaries, boundaries[1:] + [float('inf')]):
+            visible = [o for o in overlays if o[2] <= start < o[3]]
+            self._starts.append(start)
+            self._planes.append(self._build_plane(visible))
+
+    def _build_plane(self, visible):
+        frame_w, frame_h = self.frame_size
+        boxes = []
+        for rgba, pos, _, _ in visible:
+            x, y = (int(p) for p in pos)
+            h, w = rgba.shape[:2]
+            x1, y1, x2, y2 = max(0, x), max(0, y), min(frame_w, x + w), min(frame_h, y + h)
+            if x1 < x2 and y1 < y2:
+                boxes.append((rgba, x, y, x1, y1, x2, y2))
+        if not boxes:
+            return None
+
+        bx1, by1 = min(b[3] for b in boxes), min(b[4] for b in boxes)
+        bx2, by2 = max(b[5] for b in boxes), max(b[6] for b in boxes)
+        premultiplied = np.zeros((by2 - by1, bx2 - bx1, 3), dtype=np.float32)
+        transmittance = np.ones((by2 - by1, bx2 - bx1, 1), dtype=np.float32)
+
+        for rgba, x, y, x1, y1, x2, y2 in boxes:
+            patch = rgba[y1 - y:y2 - y, x1 - x:x2 - x]
+            alpha = patch[:, :, 3:4].astype(np.float32) / 255.0
+            target = (slice(y1 - by1, y2 - by1), slice(x1 - bx1, x2 - bx1))
+            premultiplied[target] *= 1.0 - alpha
+            premultiplied[target] += patch[:, :, :3] * alpha
+            transmittance[target] *= 1.0 - alpha
+
+        buffer = np.empty(premultiplied.shape, dtype=np.float32)
+        return (by1, by2, bx1, bx2), premultiplied, transmittance, buffer
+
+    def plane_at(self, t):
+        return self._planes[bisect.bisect_right(self._starts, t) - 1]
+
+    def __call__(self, frame, t):
+        if self.plane_at(t) is None:
+            return frame
+        return self.apply(np.array(frame, dtype=np.uint8), t)
+
+    def apply(self, frame, t):
+        """Nakłada napisy na klatkę uint8 w miejscu (bez kopii klatki)."""
+        plane = self.plane_at(t)
+        if plane is None:
+            return frame
+        (y1, y2, x1, x2), premultiplied, transmittance, buffer = plane
+
+        region = frame[y1:y2, x1:x2]
+        np.multiply(region, transmittance, out=buffer)
+        buffer += premultiplied
+        np.copyto(region, buffer, casting='unsafe')
+        return frame
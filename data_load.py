@@ -1,58 +1,247 @@
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+import uuid
+
 import pandas as pd
 
 # plik obsługujący ładowanie danych z bazy
 
-def load_description(item_no):
-    df = pd.read_excel("dane_z_nav.xlsx", sheet_name="Indeksy")
-
-    foreign = df[df["Item No_"] == item_no]
-    if foreign.empty:
-        return "nie znaleziono indeksu w bazie"
-    foreign = foreign["Assortment Card No_"].values[0]
+EXCEL_PATH = "dane_z_nav.xlsx"
+SHEETS = ["Indeksy", "Opisy", "Materialy"]
+CACHE_VERSION = 1
+
+
+def cache_path_for(excel_path):
+    """Ścieżka pliku cache obok arkusza, np. `dane_z_nav.xlsx` -> `dane_z_nav.cache.pkl`."""
+    return os.path.splitext(excel_path)[0] + ".cache.pkl"
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_cache(cache_path, xlsx_hash):
+    """Zwraca arkusze z cache albo None, jeśli cache nie istnieje lub dotyczy innej wersji pliku."""
+    try:
+        with open(cache_path, 'rb') as f:
+            # Nagłówek jest osobnym obiektem, żeby sprawdzić hash bez wczytywania danych
+            header = pickle.load(f)
+            if header.get("version") != CACHE_VERSION or header.get("xlsx_sha1") != xlsx_hash:
+                return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ostrzeżenie: nie udało się odczytać cache '{cache_path}': {e}")
+        return None
+
+
+def _write_cache(cache_path, xlsx_hash, sheets):
+    # Zapis do pliku tymczasowego i podmiana - równoległe procesy nie widzą niepełnego cache
+    tmp_path = f"{cache_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({"version": CACHE_VERSION, "xlsx_sha1": xlsx_hash}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(sheets, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_sheets(excel_path=EXCEL_PATH, use_cache=True):
+    """
+    Wczytuje arkusze NAV. Jeśli istnieje cache zbudowany z tej samej wersji pliku
+    (ten sam SHA-1), dane są brane z niego zamiast parsowania XML przez openpyxl.
+    """
+    xlsx_hash = _file_hash(excel_path)
+    cache_path = cache_path_for(excel_path)
+    if use_cache:
+        sheets = _read_cache(cache_path, xlsx_hash)
+        if sheets is not None:
+            return sheets
+
+    sheets = pd.read_excel(excel_path, sheet_name=SHEETS)
+    try:
+        _write_cache(cache_path, xlsx_hash, sheets)
+    except OSError as e:
+        print(f"Ostrzeżenie: nie udało się zapisać cache '{cache_path}': {e}")
+    return sheets
+
+
+def build_cache(excel_path=EXCEL_PATH):
+    """Przebudowuje cache po pobraniu nowego eksportu z NAV."""
+    load_sheets(excel_path, use_cache=False)
+
+
+class ProductCatalog:
+    """
+    Katalog produktów z eksportu NAV trzymany w pamięci.
+
+    Arkusze `Indeksy`, `Opisy` i `Materialy` są czytane raz, a wyniki zapytań
+    trafiają do słowników kluczowanych `Item No_` / `Assortment Card No_`.
+    Plik jest wczytywany ponownie tylko wtedy, gdy zmieni się jego mtime
+    (z cache, jeśli zawartość pliku jest taka sama jak przy ostatniej konwersji).
+    """
+
+    def __init__(self, excel_path=EXCEL_PATH):
+        self.excel_path = excel_path
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._names = {}
+        self._item_to_card = {}
+        self._descriptions = {}
+        self._materials = {}
+
+    def _ensure_loaded(self):
+        mtime = os.path.getmtime(self.excel_path)
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            sheets = load_sheets(self.excel_path)
+            self._build_indexes(sheets)
+            self._mtime = mtime
+
+    def load(self):
+        """Wczytuje katalog od razu (np. przy starcie usługi) zamiast przy pierwszym zapytaniu."""
+        self._ensure_loaded()
+
+    def _build_indexes(self, sheets):
+        names = {}
+        item_to_card = {}
+        for item_no, rows in sheets["Indeksy"].groupby("Item No_", sort=False):
+            names[item_no] = (
+                " ".join(rows["DescriptionPL"].astype(str).dropna()),
+                " ".join(rows["DescriptionENU"].astype(str).dropna()),
+            )
+            item_to_card[item_no] = rows["Assortment Card No_"].values[0]
+
+        descriptions = {
+            card: " ".join(rows["Opis Indeksu"].astype(str).dropna())
+            for card, rows in sheets["Opisy"].groupby("Assortment Card No_", sort=False)
+        }
+        materials = {
+            card: " ".join(rows["Material"].astype(str).dropna())
+            for card, rows in sheets["Materialy"].groupby("Assortment Card No_", sort=False)
+        }
+
+        # Podmiana całych słowników naraz - czytelnicy w innych wątkach nigdy nie widzą połowy danych
+        self._names, self._item_to_card = names, item_to_card
+        self._descriptions, self._materials = descriptions, materials
+
+    def names(self, item_no):
+        self._ensure_loaded()
+        found = self._names.get(item_no)
+        if found is None:
+            return {"PL": "Nie znaleziono produktu", "EN": "Product not found"}
+
+        opis_pl, opis_en = found
+        return {
+            "PL": opis_pl if opis_pl else "Brak opisu polskiego",
+            "EN": opis_en if opis_en else "Brak opisu angielskiego"
+        }
+
+    def description(self, item_no):
+        self._ensure_loaded()
+        if item_no not in self._item_to_card:
+            return "nie znaleziono indeksu w bazie"
+        opis = self._descriptions.get(self._item_to_card[item_no])
+        if opis is None:
+            return "nie znaleziono opisu w bazie"
+        return opis
+
+    def materials(self, item_no):
+        self._ensure_loaded()
+        if item_no not in self._item_to_card:
+            return "nie znaleziono indeksu w bazie"
+        opis = self._materials.get(self._item_to_card[item_no])
+        if opis is None:
+            return "nie znaleziono materiału w bazie"
+        return opis
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Zwraca współdzielony katalog produktów (tworzony przy pierwszym użyciu)."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = ProductCatalog()
+    return _catalog
 
-    df = pd.read_excel("dane_z_nav.xlsx", sheet_name="Opisy")
-    wynik = df[df["Assortment Card No_"] == foreign]
 
-    if wynik.empty:
-        return "nie znaleziono opisu w bazie"
+def load_description(item_no):
+    return get_catalog().description(item_no)
 
-    opis = " ".join(wynik["Opis Indeksu"].astype(str).dropna())
-    return opis
 
 def load_materials(Item_no):
-    df = pd.read_excel("dane_z_nav.xlsx", sheet_name="Indeksy")
+    return get_catalog().materials(Item_no)
 
-    foreign = df[df["Item No_"]==Item_no]
-    if foreign.empty:
-        return "nie znaleziono indeksu w bazie"
-    foreign=foreign["Assortment Card No_"].values[0]
 
-    df = pd.read_excel("dane_z_nav.xlsx", sheet_name="Materialy")
+def load_names(Item_no):
+    return get_catalog().names(Item_no)
 
-    wynik = df[df["Assortment Card No_"]==foreign]
 
-    if wynik.empty:
-        return "nie znaleziono materiału w bazie"
+PLACEHOLDERS = ("{INDEKS}", "{NAZWA_PL}", "{NAZWA_EN}", "{OPIS}", "{MATERIALY}")
+# Jeden skompilowany wzorzec dla wszystkich symboli - bez względu na wielkość liter
+PLACEHOLDER_PATTERN = re.compile("|".join(re.escape(k) for k in PLACEHOLDERS), re.IGNORECASE)
 
-    opis = " ".join(wynik["Material"].astype(str).dropna())
-    return opis
 
+def build_placeholder_map(item_no):
+    """
+    Zwraca słownik {symbol: wartość} dla danego indeksu. Budowany raz na render
+    i współdzielony przez wszystkie teksty wszystkich klipów.
+    """
+    catalog = get_catalog()
+    names = catalog.names(item_no)
+    return {
+        "{INDEKS}": item_no,
+        "{NAZWA_PL}": names.get("PL", "Brak nazwy PL"),
+        "{NAZWA_EN}": names.get("EN", "Brak nazwy EN"),
+        "{OPIS}": catalog.description(item_no),
+        "{MATERIALY}": catalog.materials(item_no),
+    }
 
-def load_names(Item_no):
-    df = pd.read_excel("dane_z_nav.xlsx", sheet_name="Indeksy")
-    wynik = df[df["Item No_"] == Item_no]
 
-    if wynik.empty:
-        return {"PL": "Nie znaleziono produktu", "EN": "Product not found"}
+def resolve_placeholders(text, data_map):
+    """Podmienia w jednym przebiegu wszystkie znane symbole w tekście na wartości z `data_map`."""
+    if not data_map or '{' not in text:
+        return text
 
-    opis_pl = " ".join(wynik["DescriptionPL"].astype(str).dropna())
-    opis_en = " ".join(wynik["DescriptionENU"].astype(str).dropna())
+    def repl(match):
+        key = match.group(0).upper()
+        return str(data_map.get(key, match.group(0)))
 
-    return {
-        "PL": opis_pl if opis_pl else "Brak opisu polskiego",
-        "EN": opis_en if opis_en else "Brak opisu angielskiego"
-    }
+    return PLACEHOLDER_PATTERN.sub(repl, text)
 
 # This block will only run when you execute `data_load.py` directly
 if __name__ == '__main__':
     print("--- Testing data_load.py ---")
+    # Porównanie: parsowanie xlsx (zimny start) vs. odczyt z cache (ciepły start)
+    start = time.perf_counter()
+    build_cache()
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_sheets()
+    warm = time.perf_counter() - start
+
+    print(f"Zimny odczyt xlsx + budowa cache: {cold:.3f} s")
+    print(f"Ciepły odczyt z cache:           {warm:.3f} s")
+    if warm > 0:
+        print(f"Przyspieszenie: x{cold / warm:.1f}")
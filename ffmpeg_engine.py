@@ -0,0 +1,153 @@
+# ffmpeg_engine.py
+
+"""
+Silnik renderowania jednym wywołaniem ffmpeg (filtergraph) zamiast pętli klatek MoviePy.
+
+Każdy klip to łańcuch `scale` -> `overlay` (napisy wyrenderowane do PNG, widoczne
+w `enable='gte(t,a)*lt(t,b)'`), a całość jest sklejana filtrem `concat`. Plansze
+ze zdjęć są najpierw spłaszczane z napisami stałymi do jednej klatki (jak w MoviePy).
+Szablony, których nie da się tak opisać, zgłaszają UnsupportedByFilterGraph -
+VideoMerger renderuje je wtedy przez MoviePy.
+"""
+
+import os
+import shutil
+import tempfile
+import traceback
+
+from PIL import Image
+
+import ffmpeg_tools
+
+
+class UnsupportedByFilterGraph(Exception):
+    """Szablon zawiera elementy, których nie da się wyrazić filtergraphem ffmpeg."""
+
+
+class FFmpegRenderEngine:
+    def __init__(self, merger, encode_params):
+        self.merger = merger
+        self.encode_params = encode_params
+
+    def _save_png(self, array, work_dir, name):
+        path = os.path.join(work_dir, name)
+        Image.fromarray(array).save(path)
+        return path
+
+    def _overlays_for(self, overlays, clip_duration, work_dir, prefix):
+        inputs = []
+        for k, overlay in enumerate(overlays):
+            if overlay['end'] > clip_duration + 1e-6:
+                raise UnsupportedByFilterGraph(f"napis '{overlay['text']}' wydłuża klip")
+            if overlay['x'] is None:
+                raise UnsupportedByFilterGraph(f"napis '{overlay['text']}' nie ma stałej pozycji")
+            rgba = self.merger._render_text_rgba(overlay['text'], overlay['config'])
+            png_path = self._save_png(rgba, work_dir, f"{prefix}_text_{k:02d}.png")
+            inputs.append((png_path, overlay['x'], overlay['y'], overlay['start'], overlay['end']))
+        return inputs
+
+    def compile(self, plan, work_dir):
+        """
+        Zamienia segmenty planu renderu na opis wejść dla ffmpeg:
+        [{'path', 'is_image', 'duration', 'has_audio', 'overlays': [(png, x, y, start, end), ...]}, ...]
+        """
+        segments = []
+        for segment in plan['segments']:
+            prefix = f"clip_{segment['index']:03d}"
+            overlays = segment['overlays']
+            path = segment['path']
+            if segment['is_image']:
+                frame, overlays = self.merger._flatten_image(segment)
+                path = self._save_png(frame, work_dir, f"{prefix}.png")
+
+            segments.append({
+                'path': path,
+                'is_image': segment['is_image'],
+                # Plansze są już spłaszczone w rozdzielczości wyjściowej
+                'source_size': plan['final_size'] if segment['is_image'] else segment['source_size'],
+                'duration': segment['duration'],
+                'has_audio': segment['has_audio'],
+                'overlays': self._overlays_for(overlays, segment['duration'], work_dir, prefix),
+            })
+        return segments
+
+    def build_command(self, segments, final_size, output_path, threads=None):
+        width, height = final_size
+        fps = self.encode_params['fps']
+        audio_fps = self.encode_params['audio_fps']
+
+        inputs = []
+        filters = []
+        concat_inputs = []
+        input_index = 0
+
+        for i, segment in enumerate(segments):
+            duration = segment['duration']
+            if segment['is_image']:
+                inputs += ['-loop', '1', '-framerate', str(fps), '-t', str(duration), '-i', segment['path']]
+            else:
+                inputs += ['-i', segment['path']]
+            clip_input = input_index
+            input_index += 1
+
+            scale = "" if list(segment['source_size']) == [width, height] else f"scale={width}:{height},"
+            filters.append(f"[{clip_input}:v]{scale}setsar=1,fps={fps},"
+                           f"trim=duration={duration},setpts=PTS-STARTPTS[v{i}_0]")
+            label = f"v{i}_0"
+            for k, (png_path, x, y, start, end) in enumerate(segment['overlays']):
+                inputs += ['-i', png_path]
+                new_label = f"v{i}_{k + 1}"
+                filters.append(f"[{label}][{input_index}:v]overlay=x={x}:y={y}:"
+                               f"enable='gte(t,{start})*lt(t,{end})'[{new_label}]")
+                label = new_label
+                input_index += 1
+            filters.append(f"[{label}]format=yuv420p[v{i}]")
+
+            filters.append(ffmpeg_tools.segment_audio_filter(clip_input, segment, audio_fps, f"a{i}"))
+            concat_inputs.append(f"[v{i}][a{i}]")
+
+        filters.append(f"{''.join(concat_inputs)}concat=n={len(segments)}:v=1:a=1[outv][outa]")
+
+        command = [ffmpeg_tools.ffmpeg_binary(), '-y', '-loglevel', 'error'] + inputs + [
+            '-filter_complex', ';'.join(filters),
+            '-map', '[outv]', '-map', '[outa]',
+        ] + ffmpeg_tools.video_codec_args(self.encode_params) + [
+            '-pix_fmt', 'yuv420p', '-r', str(fps),
+            '-c:a', self.encode_params['audio_codec'], '-ar', str(audio_fps),
+            '-movflags', '+faststart',
+        ]
+        if threads:
+            command += ['-threads', str(threads)]
+        command.append(output_path)
+        return command
+
+    def render(self, plan, output_path, progress=None, threads=None):
+        """
+        Renderuje plan (render_plan) jednym wywołaniem ffmpeg. Rzuca UnsupportedByFilterGraph,
+        jeśli szablon wymaga MoviePy; pozostałe błędy zwraca jak merge_videos.
+        progress (RenderProgress) dostaje liczbę klatek zakodowanych przez ffmpeg.
+        """
+        work_dir = tempfile.mkdtemp(prefix="videom_ffmpeg_")
+        try:
+            segments = self.compile(plan, work_dir)
+            if not segments:
+                return False, "No clips were successfully processed! Check console for detailed error messages."
+
+            if progress:
+                progress.set_phase("Renderowanie przez ffmpeg...")
+            with ffmpeg_tools.atomic_output(output_path) as temp_path:
+                command = self.build_command(segments, plan['final_size'], temp_path, threads)
+                frames = ffmpeg_tools.run_with_progress(command, progress.update if progress else None)
+            self.merger.metrics.add_frames(frames)
+
+            print("Video merge completed successfully!")
+            return True, f"Video successfully created: {output_path}"
+
+        except UnsupportedByFilterGraph:
+            raise
+        except Exception as e:
+            print(f"ERROR during video merging: {str(e)}")
+            traceback.print_exc()
+            return False, f"Error during video merging: {str(e)}"
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,299 @@
+# ffmpeg_tools.py
+
+"""
+Pomocnicze wywołania ffmpeg: odczyt parametrów strumieni, łączenie segmentów
+przez concat demuxer i kodowanie strumienia surowych klatek przez stdin.
+"""
+
+import os
+import re
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+from moviepy.config import get_setting
+from PIL import Image
+
+_VIDEO_STREAM = re.compile(r"Stream #\S+.*?: Video: (\w+)[^,]*, (\w+).*?, (\d+)x(\d+)[^\n]*")
+# Część plików (np. surowe strumienie, AVI) nie podaje "fps" - wtedy liczy się tbr
+_FRAME_RATE = re.compile(r", ([\d.]+)(k?) (fps|tbr)")
+# Obrót z telefonu: metadana "rotate" (starsze ffmpeg) albo side data "displaymatrix"
+_ROTATION = re.compile(r"rotate\s*:\s*(-?\d+)|displaymatrix: rotation of (-?[\d.]+) degrees")
+_NEXT_STREAM = re.compile(r"\n\s*Stream #")
+_AUDIO_STREAM = re.compile(r"Stream #\S+.*?: Audio: (\w+)[^,]*, (\d+) Hz, ([\w.()]+)")
+_DURATION = re.compile(r"Duration: (\d+):(\d+):([\d.]+)")
+
+
+def ffmpeg_binary():
+    return get_setting("FFMPEG_BINARY")
+
+
+@contextmanager
+def atomic_output(output_path):
+    """
+    Ścieżka tymczasowa obok pliku wynikowego (to samo rozszerzenie - po nim ffmpeg wybiera
+    format); po udanym zapisie plik jest podmieniany atomowo (os.replace). Przerwany lub
+    nieudany render nie zostawia niedokończonego filmu pod docelową nazwą.
+    """
+    directory, name = os.path.split(os.path.abspath(output_path))
+    base, extension = os.path.splitext(name)
+    fd, temp_path = tempfile.mkstemp(prefix=f"{base}.", suffix=f".partial{extension}", dir=directory)
+    os.close(fd)
+    try:
+        yield temp_path
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def video_codec_args(encode_params):
+    """Argumenty kodeka wideo: kodek, preset i (opcjonalnie) CRF z parametrów profilu."""
+    args = ['-c:v', encode_params.get('codec', 'libx264'), '-preset', encode_params.get('preset', 'ultrafast')]
+    if encode_params.get('crf') is not None:
+        args += ['-crf', str(encode_params['crf'])]
+    return args
+
+
+def _frame_rate(stream_line):
+    rates = {unit: float(value) * (1000 if kilo else 1) for value, kilo, unit in _FRAME_RATE.findall(stream_line)}
+    return rates.get('fps', rates.get('tbr'))
+
+
+def _rotation(stream_block):
+    """Obrót strumienia w stopniach (0, 90, 180, 270) z metadanych wypisanych pod linią Stream."""
+    match = _ROTATION.search(stream_block)
+    if not match:
+        return 0
+    return int(round(float(match.group(1) or match.group(2)))) % 360
+
+
+def probe_streams(path):
+    """
+    Zwraca parametry pierwszego strumienia wideo i audio pliku oraz czas trwania, np.
+    {'video': ('h264', 'yuv420p', 1080, 1920, 29.0), 'audio': ('aac', 44100, 'stereo'), 'duration': 5.0,
+     'rotation': 0}.
+    Rozmiar wideo jest rozmiarem wyświetlanym: przy obrocie o 90/270 stopni (pionowe
+    nagrania z telefonu) szerokość i wysokość są zamienione, tak jak w klatkach, które
+    ffmpeg zwraca po automatycznym obrocie. fps może być None, jeśli plik go nie podaje.
+    """
+    result = subprocess.run([ffmpeg_binary(), '-hide_banner', '-i', path],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace')
+    video = _VIDEO_STREAM.search(result.stderr)
+    audio = _AUDIO_STREAM.search(result.stderr)
+    duration = _DURATION.search(result.stderr)
+
+    rotation = 0
+    if video:
+        block = result.stderr[video.start():]
+        next_stream = _NEXT_STREAM.search(block)
+        rotation = _rotation(block[:next_stream.start()] if next_stream else block)
+        width, height = int(video.group(3)), int(video.group(4))
+        if rotation in (90, 270):
+            width, height = height, width
+        video = (video.group(1), video.group(2), width, height, _frame_rate(video.group(0)))
+
+    return {
+        'video': video,
+        'audio': (audio.group(1), int(audio.group(2)), audio.group(3)) if audio else None,
+        'duration': int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3))
+        if duration else None,
+        'rotation': rotation,
+    }
+
+
+def segments_compatible(segment_paths):
+    """Czy wszystkie segmenty mają identyczne parametry strumieni (warunek łączenia przez -c copy)."""
+    signatures = set()
+    for path in segment_paths:
+        streams = probe_streams(path)
+        signatures.add((streams['video'], streams['audio']))
+    return len(signatures) == 1
+
+
+def write_concat_list(segment_paths, list_path):
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+
+def concat_segments(segment_paths, output_path, work_dir, encode_params=None):
+    """
+    Łączy segmenty przez ffmpeg concat demuxer. Segmenty o identycznych parametrach
+    są łączone bez dekodowania (-c copy). Jeśli parametry się różnią (np. segment z
+    innej wersji programu), całość jest kodowana ponownie z `encode_params`.
+    Zwraca True, jeśli udało się połączyć bez ponownego kodowania.
+    """
+    list_path = os.path.join(work_dir, "segments.txt")
+    write_concat_list(segment_paths, list_path)
+
+    stream_copy = len(segment_paths) == 1 or segments_compatible(segment_paths)
+    command = [ffmpeg_binary(), '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+    if stream_copy:
+        command += ['-c', 'copy']
+    else:
+        print("Ostrzeżenie: segmenty mają różne parametry - łączenie z ponownym kodowaniem.")
+        encode_params = encode_params or {}
+        command += video_codec_args(encode_params) + [
+            '-pix_fmt', 'yuv420p',
+            '-r', str(encode_params.get('fps', 29)),
+            '-c:a', encode_params.get('audio_codec', 'aac'),
+            '-ar', str(encode_params.get('audio_fps', 44100)),
+            '-ac', '2',
+        ]
+    command += ['-movflags', '+faststart', output_path]
+
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg concat failed: {result.stderr.strip()}")
+    return stream_copy
+
+
+def encode_still_segment(frame, duration, output_path, encode_params, threads=None):
+    """
+    Koduje stałą klatkę (uint8 HxWx3) jako segment o podanej długości przez `-loop 1`,
+    z cichą ścieżką stereo - parametry jak w segmentach pisanych przez MoviePy.
+    """
+    frame_path = f"{os.path.splitext(output_path)[0]}.frame.png"
+    Image.fromarray(frame).save(frame_path)
+    try:
+        fps = encode_params.get('fps', 29)
+        command = [
+            ffmpeg_binary(), '-y', '-loglevel', 'error',
+            '-loop', '1', '-framerate', str(fps), '-i', frame_path,
+            '-f', 'lavfi', '-i', f"anullsrc=channel_layout=stereo:sample_rate={encode_params.get('audio_fps', 44100)}",
+            '-t', str(duration),
+        ] + video_codec_args(encode_params) + [
+            '-pix_fmt', 'yuv420p', '-r', str(fps),
+            '-c:a', encode_params.get('audio_codec', 'aac'),
+        ]
+        if threads:
+            command += ['-threads', str(threads)]
+        command.append(output_path)
+
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace')
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg still encode failed: {result.stderr.strip()}")
+    finally:
+        if os.path.exists(frame_path):
+            os.remove(frame_path)
+    return output_path
+
+
+def run_with_progress(command, on_frames=None):
+    """
+    Uruchamia ffmpeg z `-progress pipe:1` i przekazuje liczbę zakodowanych klatek
+    (pole frame=) do on_frames(klatki), np. RenderProgress.update.
+    Ostatni element `command` to plik wyjściowy. Zwraca liczbę zakodowanych klatek.
+    """
+    command = command[:-1] + ['-progress', 'pipe:1', '-nostats', command[-1]]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace')
+    frames = 0
+    for line in process.stdout:
+        key, _, value = line.strip().partition('=')
+        if key == 'frame' and value.isdigit():
+            frames = int(value)
+            if on_frames:
+                on_frames(frames)
+
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.strip()}")
+    return frames
+
+
+def segment_audio_filter(input_index, segment, audio_fps, label):
+    """
+    Łańcuch filtrów audio segmentu dokładnie tej samej długości co obraz (inaczej concat
+    przesuwa kolejne klipy); segmenty bez audio dostają ciszę stereo.
+    """
+    duration = segment['duration']
+    if segment['has_audio']:
+        return (f"[{input_index}:a]aresample={audio_fps},aformat=channel_layouts=stereo,"
+                f"apad,atrim=duration={duration},asetpts=PTS-STARTPTS[{label}]")
+    return f"anullsrc=r={audio_fps}:cl=stereo,atrim=duration={duration}[{label}]"
+
+
+class FrameWriter:
+    """
+    Jeden proces ffmpeg kodujący surowe klatki RGB (uint8 HxWx3) podawane przez stdin.
+    Zapisuje tylko obraz - audio dokłada mux_segment_audio.
+    """
+
+    def __init__(self, output_path, size, encode_params, threads=None):
+        width, height = size
+        command = [
+            ffmpeg_binary(), '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-vcodec', 'rawvideo', '-pix_fmt', 'rgb24',
+            '-s', f"{width}x{height}", '-r', str(encode_params.get('fps', 29)), '-i', '-',
+            '-an',
+        ] + video_codec_args(encode_params) + ['-pix_fmt', 'yuv420p']
+        if threads:
+            command += ['-threads', str(threads)]
+        command.append(output_path)
+        self._frame_shape = (height, width, 3)
+        # stderr do pliku tymczasowego zamiast PIPE - nieczytany PIPE mógłby zablokować enkoder
+        self._stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                        stderr=self._stderr)
+        self.frames_written = 0
+
+    def write_frame(self, frame):
+        if frame.dtype != np.uint8:
+            frame = np.clip(frame, 0, 255).astype(np.uint8)
+        if frame.shape != self._frame_shape:
+            raise ValueError(f"Klatka {frame.shape} nie pasuje do rozmiaru wyjścia {self._frame_shape}")
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame).tobytes())
+        except (BrokenPipeError, OSError):
+            self.close()
+            raise
+        self.frames_written += 1
+
+    def close(self):
+        """Zamyka stdin i czeka na koniec kodowania; błąd ffmpeg zgłasza jako RuntimeError."""
+        if self.process.stdin and not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+        returncode = self.process.wait()
+        self._stderr.seek(0)
+        stderr = self._stderr.read().decode('utf-8', errors='replace')
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg frame encode failed: {stderr.strip()}")
+
+
+def mux_segment_audio(video_path, segments, output_path, encode_params):
+    """
+    Dokłada do filmu (bez audio) ścieżkę złożoną z audio segmentów planu renderu,
+    bez ponownego kodowania obrazu (-c:v copy).
+    """
+    audio_fps = encode_params.get('audio_fps', 44100)
+    inputs = ['-i', video_path]
+    filters = []
+    labels = []
+    input_index = 1
+    for i, segment in enumerate(segments):
+        if segment['has_audio']:
+            inputs += ['-vn', '-i', segment['path']]
+        filters.append(segment_audio_filter(input_index, segment, audio_fps, f"a{i}"))
+        if segment['has_audio']:
+            input_index += 1
+        labels.append(f"[a{i}]")
+    filters.append(f"{''.join(labels)}concat=n={len(segments)}:v=0:a=1[outa]")
+
+    command = [ffmpeg_binary(), '-y', '-loglevel', 'error'] + inputs + [
+        '-filter_complex', ';'.join(filters),
+        '-map', '0:v', '-map', '[outa]',
+        '-c:v', 'copy',
+        '-c:a', encode_params.get('audio_codec', 'aac'), '-ar', str(audio_fps),
+        '-movflags', '+faststart', output_path,
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg audio mux failed: {result.stderr.strip()}")
+    return output_path
@@ -0,0 +1,126 @@
+# frame_pipeline.py
+
+"""
+Potok klatek w trzech wątkach: dekodowanie -> nakładanie napisów -> zapis do enkodera.
+
+Etapy są połączone ograniczonymi kolejkami i krążą między nimi prealokowane bufory
+klatek (pula `buffers` sztuk), więc pamięć nie rośnie z długością filmu. Odczyt
+z potoku ffmpeg, operacje NumPy i zapis do stdin enkodera zwalniają GIL, dlatego
+przepustowość zbliża się do najwolniejszego etapu zamiast do sumy wszystkich.
+"""
+
+import queue
+import threading
+
+import numpy as np
+
+DEFAULT_BUFFERS = 4
+_END = object()
+_POLL_SECONDS = 0.1
+
+
+class FramePipeline:
+    def __init__(self, frame_shape, write_frame, buffers=DEFAULT_BUFFERS):
+        """
+        frame_shape: (wysokość, szerokość, 3) klatek wyjściowych (uint8);
+        write_frame(frame) - zapis klatki do enkodera (wywoływany w wątku wywołującym run).
+        """
+        self.write_frame = write_frame
+        self._free = queue.Queue()
+        for _ in range(buffers):
+            self._free.put(np.empty(frame_shape, dtype=np.uint8))
+        self._decoded = queue.Queue(maxsize=buffers)
+        self._composited = queue.Queue(maxsize=buffers)
+        self._stop = threading.Event()
+        self._errors = []
+
+    def _put(self, target, item):
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source):
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, error):
+        self._errors.append(error)
+        self._stop.set()
+
+    def _decode(self, frames):
+        try:
+            for frame, t, composite in frames:
+                buffer = self._get(self._free)
+                if buffer is _END:
+                    return
+                np.copyto(buffer, frame, casting='unsafe')
+                if not self._put(self._decoded, (buffer, t, composite)):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            close = getattr(frames, 'close', None)
+            if close:
+                close()  # zamyka bieżący klip także przy przerwaniu potoku
+            self._put(self._decoded, _END)
+
+    def _composite(self):
+        try:
+            while True:
+                item = self._get(self._decoded)
+                if item is _END:
+                    break
+                buffer, t, composite = item
+                result = composite(buffer, t) if composite is not None else buffer
+                if not self._put(self._composited, (buffer, result)):
+                    break
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self._composited, _END)
+
+    def run(self, frames):
+        """
+        Przepuszcza przez potok klatki z `frames` - iterowalnego (klatka, t, composite),
+        gdzie composite(bufor, t) nakłada napisy na bufor w miejscu albo jest None.
+        Do write_frame trafia wynik composite (np. sam bufor albo klatki kilku wariantów
+        wyjścia) - bufor wraca do puli dopiero po zapisie.
+        Iteracja `frames` (czyli dekodowanie) odbywa się w osobnym wątku.
+        Zwraca liczbę zapisanych klatek; pierwszy błąd dowolnego etapu jest rzucany ponownie.
+        """
+        threads = [
+            threading.Thread(target=self._decode, args=(frames,), name="frame-decode", daemon=True),
+            threading.Thread(target=self._composite, name="frame-composite", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        written = 0
+        try:
+            while True:
+                item = self._get(self._composited)
+                if item is _END:
+                    break
+                buffer, result = item
+                self.write_frame(result)
+                written += 1
+                self._free.put(buffer)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            # Także przy KeyboardInterrupt (np. limit pamięci) - inaczej wątki etapów kręcą się w nieskończoność
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+        return written
@@ -5,7 +5,6 @@ from tkinter import ttk, filedialog, messagebox, colorchooser
 import os
 import data_load
 from tkinter.scrolledtext import ScrolledText
-os.environ['IMAGEMAGICK_BINARY'] = r'C:\Program Files\ImageMagick-7.1.1-Q16\magick.exe'
 import copy
 
 
@@ -0,0 +1,393 @@
+# job_queue.py
+
+"""
+Kolejka zadań renderu z trwałym magazynem (SQLite, render_jobs.db obok programu).
+
+Każde zlecenie renderu jest zapisywane w bazie (id, indeks produktu, klipy, profil,
+plik wynikowy, odcisk planu, stan, czasy), a wątki robocze pobierają z niej kolejne
+zadania. Stany: queued -> running -> done / failed.
+
+Zadanie w stanie "running" odświeża znacznik heartbeat_at. Jeśli program został
+zamknięty albo render przerwany w połowie, zadanie zostaje w bazie jako "running"
+z nieaktualnym heartbeatem - przy następnym starcie kolejki wraca do stanu "queued"
+i jest renderowane ponownie (najwyżej MAX_ATTEMPTS prób - potem "failed"). Render
+działa w trybie przyrostowym (katalog roboczy film.segments), więc segmenty
+zakodowane przed awarią są używane ponownie, a kodowane są tylko brakujące.
+
+Zadanie ma właściciela (owner: gui, service) - kolejka pobiera i wznawia tylko zadania
+swojego właściciela, więc usługa nie przejmie zleceń GUI (których callbacki są tylko w GUI).
+Kolejka bez właściciela (np. `python job_queue.py run`) obsługuje wszystkie zadania.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import traceback
+
+import output_profiles
+import render_plan
+from segment_cache import SegmentCache
+from video_merger import VideoMerger, CONCAT_COPY, ENGINE_MOVIEPY
+
+JOBS_DB = "render_jobs.db"
+HEARTBEAT_SECONDS = 10
+# Zadanie "running" bez heartbeatu przez tyle sekund uznajemy za przerwane
+STALE_SECONDS = 60
+# Zadanie przerwane tyle razy (np. proces zabijany przez brak pamięci) nie wraca już do kolejki
+MAX_ATTEMPTS = 3
+
+OWNER_GUI = "gui"
+OWNER_SERVICE = "service"
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_no TEXT,
+    owner TEXT,
+    output_path TEXT NOT NULL,
+    profile TEXT,
+    clips TEXT NOT NULL,
+    options TEXT NOT NULL,
+    plan_hash TEXT,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    progress INTEGER,
+    message TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL
+)
+"""
+_JSON_COLUMNS = ("clips", "options")
+# Kolumny dodane po pierwszej wersji schematu - starsze bazy są uzupełniane przy otwarciu
+_ADDED_COLUMNS = {"owner": "TEXT"}
+# Zadania bez właściciela (z baz sprzed kolumny owner) może pobrać każda kolejka
+_OWNER_FILTER = " AND (owner = ? OR owner IS NULL)"
+
+
+class JobStore:
+    """Tabela zadań w SQLite; każde wywołanie otwiera własne połączenie (bezpieczne dla wątków)."""
+
+    def __init__(self, db_path=JOBS_DB):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, column_type in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {column_type}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _Connection(conn)
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        for column in _JSON_COLUMNS:
+            job[column] = json.loads(job[column])
+        return job
+
+    def submit(self, item_no, output_path, clips, profile=None, options=None, owner=None):
+        """Dodaje zadanie do kolejki; clips to pełna lista klipów (path, texts, image_duration)."""
+        clips = [{'path': c['path'], 'texts': c.get('texts', []), 'image_duration': c.get('image_duration')}
+                 for c in clips]
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (item_no, owner, output_path, profile, clips, options, state, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (item_no, owner, output_path, profile, json.dumps(clips), json.dumps(options or {}),
+                 STATE_QUEUED, time.time()))
+            return cursor.lastrowid
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            return self._row(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list_jobs(self, state=None, limit=None):
+        query, args = "SELECT * FROM jobs", []
+        if state:
+            query += " WHERE state = ?"
+            args.append(state)
+        query += " ORDER BY id DESC"
+        if limit:
+            query += " LIMIT ?"
+            args.append(limit)
+        with self._connect() as conn:
+            return [self._row(row) for row in conn.execute(query, args).fetchall()]
+
+    def claim_next(self, owner=None):
+        """
+        Atomowo przejmuje najstarsze zadanie "queued" (stan -> running); None, gdy kolejka pusta.
+        Z `owner` - tylko zadania tego właściciela (i zadania bez właściciela).
+        """
+        now = time.time()
+        query, args = "SELECT id FROM jobs WHERE state = ?", [STATE_QUEUED]
+        if owner:
+            query += _OWNER_FILTER
+            args.append(owner)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(query + " ORDER BY id LIMIT 1", args).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET state = ?, attempts = attempts + 1, started_at = ?, heartbeat_at = ?, "
+                    "finished_at = NULL, progress = NULL, message = NULL WHERE id = ?",
+                    (STATE_RUNNING, now, now, row['id']))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(row['id'])
+
+    def heartbeat(self, job_ids):
+        if not job_ids:
+            return
+        with self._connect() as conn:
+            conn.executemany("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND state = ?",
+                             [(time.time(), job_id, STATE_RUNNING) for job_id in job_ids])
+
+    def update(self, job_id, **fields):
+        """Aktualizuje wybrane kolumny zadania (np. progress, message, plan_hash)."""
+        if not fields:
+            return
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def finish(self, job_id, success, message):
+        self.update(job_id, state=STATE_DONE if success else STATE_FAILED, message=message,
+                    finished_at=time.time(), progress=100 if success else None)
+
+    def recover_interrupted(self, stale_seconds=STALE_SECONDS, owner=None, max_attempts=MAX_ATTEMPTS):
+        """
+        Zadania przerwane w trakcie (bez heartbeatu) wracają do kolejki; zwraca ich liczbę.
+        Zadania, które wykorzystały już `max_attempts` prób, kończą się stanem "failed".
+        """
+        query, args = "WHERE state = ? AND COALESCE(heartbeat_at, 0) < ?", [STATE_RUNNING, time.time() - stale_seconds]
+        if owner:
+            query += _OWNER_FILTER
+            args.append(owner)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    f"UPDATE jobs SET state = ?, message = ?, finished_at = ? {query} AND attempts >= ?",
+                    (STATE_FAILED, f"Przerwane {max_attempts} razy - zadanie nie będzie wznawiane", time.time(),
+                     *args, max_attempts))
+                cursor = conn.execute(f"UPDATE jobs SET state = ?, message = ? {query}",
+                                      (STATE_QUEUED, "Wznowione po przerwaniu", *args))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount
+
+
+class _Connection:
+    """Połączenie SQLite zamykane po wyjściu z bloku with (sqlite3.Connection go nie zamyka)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, *exc_info):
+        self.conn.close()
+
+
+class RenderQueue:
+    """
+    Wątki robocze renderujące zadania z JobStore po kolei. Wyniki i postęp trafiają
+    do bazy oraz - dla zadań zleconych w tym procesie - do przekazanych callbacków.
+    Kolejka z `owner` zleca zadania jako ten właściciel i renderuje tylko jego zadania.
+    """
+
+    def __init__(self, store=None, workers=1, owner=None):
+        self.store = store or JobStore()
+        self.workers = workers
+        self.owner = owner
+        self._callbacks = {}
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._threads = []
+        self._heartbeat_thread = None
+
+    def start(self):
+        """Wznawia przerwane zadania i uruchamia wątki robocze (wywołanie powtórne nic nie robi)."""
+        with self._lock:
+            if self._threads:
+                return
+            recovered = self.store.recover_interrupted(owner=self.owner)
+            if recovered:
+                print(f"Wznawianie {recovered} przerwanych zadań renderu.")
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"render-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        self._start_heartbeat()
+        self._wake.set()
+
+    def _start_heartbeat(self):
+        """
+        Wątek odświeżający heartbeat_at wszystkich renderowanych zadań. Bez niego długi etap
+        bez zmiany procentu (łączenie, audio) wyglądałby dla innych procesów jak przerwane zadanie.
+        """
+        with self._lock:
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat, name="render-heartbeat",
+                                                          daemon=True)
+                self._heartbeat_thread.start()
+
+    def submit(self, item_no, output_path, clips, profile=None, options=None,
+               progress_callback=None, done_callback=None):
+        """
+        Zleca render i zwraca id zadania. progress_callback(percentage, message) jak
+        w merge_videos; done_callback(success, message) po zakończeniu zadania.
+        """
+        with self._lock:
+            # Pod blokadą - wątek roboczy nie weźmie zadania, zanim nie będzie callbacków
+            job_id = self.store.submit(item_no, output_path, clips, profile, options, self.owner)
+            self._callbacks[job_id] = (progress_callback, done_callback)
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self._lock:
+                running = list(self._running)
+            try:
+                self.store.heartbeat(running)
+            except sqlite3.Error as e:
+                print(f"Błąd zapisu heartbeat zadań: {e}")
+
+    def _worker(self):
+        while True:
+            try:
+                self.store.recover_interrupted(owner=self.owner)
+                job = self.store.claim_next(self.owner)
+            except sqlite3.Error as e:
+                print(f"Błąd odczytu kolejki zadań: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(timeout=HEARTBEAT_SECONDS)
+                self._wake.clear()
+                continue
+            with self._lock:
+                self._running.add(job['id'])
+            try:
+                self.run_job(job)
+            finally:
+                with self._lock:
+                    self._running.discard(job['id'])
+                    self._callbacks.pop(job['id'], None)
+
+    def run_job(self, job):
+        """Renderuje zadanie (stan w bazie musi już być "running") i zapisuje wynik."""
+        with self._lock:
+            progress_callback, done_callback = self._callbacks.get(job['id'], (None, None))
+        last = {'percent': None}
+
+        def report(percentage=None, message=""):
+            if percentage is not None and percentage != last['percent']:
+                # Do bazy tylko zmiany procentu - najwyżej ~100 zapisów na render
+                last['percent'] = percentage
+                self.store.update(job['id'], progress=percentage, message=message, heartbeat_at=time.time())
+            if progress_callback:
+                progress_callback(percentage=percentage, message=message)
+
+        print(f"Zadanie #{job['id']} (próba {job['attempts']}): {job['output_path']}")
+        try:
+            merger = make_job_merger(job)
+            success, message = merger.merge_videos(job['output_path'], job['item_no'], report)
+            if merger.last_plan is not None:
+                self.store.update(job['id'], plan_hash=render_plan.plan_hash(merger.last_plan))
+        except Exception as e:
+            traceback.print_exc()
+            success, message = False, f"Error during video merging: {str(e)}"
+
+        self.store.finish(job['id'], success, message)
+        if done_callback:
+            done_callback(success, message)
+        return success, message
+
+    def run_pending(self):
+        """Renderuje w bieżącym wątku wszystkie zadania z kolejki (np. z wiersza poleceń)."""
+        self._start_heartbeat()
+        self.store.recover_interrupted(owner=self.owner)
+        results = []
+        while True:
+            job = self.store.claim_next(self.owner)
+            if job is None:
+                return results
+            with self._lock:
+                self._running.add(job['id'])
+            try:
+                results.append((job['id'],) + self.run_job(job))
+            finally:
+                with self._lock:
+                    self._running.discard(job['id'])
+
+
+def make_job_merger(job):
+    """VideoMerger zadania: tryb przyrostowy, więc wznowiony render używa gotowych segmentów."""
+    options = job['options']
+    merger = VideoMerger(segment_cache=SegmentCache(), concat_method=options.get('concat_method', CONCAT_COPY),
+                         incremental=True, output_profile=job['profile'],
+                         render_engine=options.get('render_engine', ENGINE_MOVIEPY),
+                         profiles=output_profiles.load_profiles(options.get('template_profiles')),
+                         collect_metrics=options.get('collect_metrics'))
+    for clip in job['clips']:
+        merger.add_clip(clip['path'], clip['texts'], clip.get('image_duration'))
+    return merger
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Zwraca współdzieloną kolejkę renderu (tworzona przy pierwszym użyciu, wątki startują przy start/submit)."""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = RenderQueue(owner=OWNER_GUI)
+    return _job_queue
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Kolejka zadań renderu.")
+    parser.add_argument("command", choices=["list", "run"],
+                        help="list - pokaż zadania, run - wyrenderuj zadania z kolejki (w tym przerwane)")
+    parser.add_argument("--db", default=JOBS_DB, help=f"plik bazy zadań (domyślnie {JOBS_DB})")
+    parser.add_argument("--owner", choices=[OWNER_GUI, OWNER_SERVICE],
+                        help="run - tylko zadania tego właściciela (domyślnie wszystkie)")
+    args = parser.parse_args()
+
+    job_store = JobStore(args.db)
+    if args.command == "list":
+        for listed in job_store.list_jobs():
+            print(f"#{listed['id']:<5} {listed['state']:<8} {listed['owner'] or '-':<8} {listed['item_no'] or '-':<12} "
+                  f"{listed['output_path']}  {listed['message'] or ''}")
+    else:
+        for job_id, ok, result in RenderQueue(job_store, owner=args.owner).run_pending():
+            print(f"#{job_id}: {'OK' if ok else 'BŁĄD'} - {result}")
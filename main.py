@@ -9,13 +9,11 @@ import tkinter as tk
 from tkinter import ttk
 from app_gui import VideoMergerGUI
 import os
-os.environ['IMAGEMAGICK_BINARY'] = r'C:\Program Files\ImageMagick-7.1.1-Q16\magick.exe'
 
-# Ensure ImageMagick is in the PATH or specify its binary location
-# os.environ['IMAGEMAGICK_BINARY'] = r'C:\Program Files\ImageMagick-7.1.1-Q16\magick.exe'
-# Uncomment and set the correct path if MoviePy struggles to find ImageMagick.
-# Otherwise, if ImageMagick is properly installed and in your system's PATH,
-# this line might not be necessary.
+# Napisy są domyślnie renderowane przez Pillow (bez ImageMagick). Backend ImageMagick
+# wybiera się przez VIDEOM_TEXT_BACKEND=imagemagick; ścieżkę do magick.exe ustawia
+# text_render (domyślna instalacja) albo zmienna IMAGEMAGICK_BINARY.
+# Raport czasów etapów renderu (film.metrics.json obok filmu) włącza VIDEOM_METRICS=1.
 
 
 import tkinter as tk
@@ -23,7 +21,6 @@ from tkinter import ttk
 from app_gui import VideoMergerGUI
 from template_manager import TemplateManager
 import os
-os.environ['IMAGEMAGICK_BINARY'] = r'C:\Program Files\ImageMagick-7.1.1-Q16\magick.exe'
 
 def main():
     root = tk.Tk()
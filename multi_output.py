@@ -0,0 +1,235 @@
+# multi_output.py
+
+"""
+Kilka wariantów filmu (proporcje, rozdzielczość, bitrate) z jednego dekodowania.
+
+Każde źródło jest dekodowane raz - w rozdzielczości wystarczającej dla największego
+wariantu - a każda klatka trafia do wszystkich wariantów: przycięcie / skalowanie
+do rozdzielczości wariantu, napisy według planu renderu wariantu (układ liczony
+osobno dla każdych proporcji) i zapis do osobnego procesu ffmpeg. N wariantów to
+jedno dekodowanie i N kodowań zamiast N pełnych renderów.
+
+Warianty o różnym fps nie mają wspólnych klatek - każda grupa fps to osobny przebieg.
+"""
+
+import math
+import os
+import shutil
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from moviepy.editor import ImageClip, VideoFileClip
+from PIL import Image
+
+import ffmpeg_tools
+import frame_pipeline
+import output_profiles
+import render_progress
+
+
+class UnsupportedMultiOutput(Exception):
+    """Szablon wymaga warstw MoviePy (napisy bez stałej pozycji lub wydłużające klip)."""
+
+
+def _resize(frame, size):
+    if frame.shape[1] == size[0] and frame.shape[0] == size[1]:
+        return np.array(frame)
+    return np.array(Image.fromarray(frame).resize(tuple(size), Image.BICUBIC))
+
+
+class OutputTarget:
+    """Jeden wariant wyjścia: plik, profil, plan renderu i proces enkodera."""
+
+    def __init__(self, output_path, profile, plan):
+        self.output_path = output_path
+        self.profile = profile
+        self.plan = plan
+        self.encode_params = output_profiles.encode_params(profile)
+        self.size = plan['final_size']
+        self.video_path = None
+        self.writer = None
+        self._box = None
+        self._static = {}
+        self._compositors = {}
+
+    def box_for(self, frame_size):
+        if self._box is None:
+            self._box = output_profiles.crop_box(frame_size, self.size, self.profile.get('fit'))
+        return self._box
+
+    def frame(self, merger, frame, t, segment_index, static):
+        """Klatka wariantu: przycięcie, skalowanie i napisy segmentu `segment_index`."""
+        if static and segment_index in self._static:
+            out = np.array(self._static[segment_index])
+        else:
+            x1, y1, x2, y2 = self.box_for((frame.shape[1], frame.shape[0]))
+            out = _resize(frame[y1:y2, x1:x2], self.size)
+            if static:
+                self._static[segment_index] = out.copy()
+
+        if segment_index not in self._compositors:
+            segment = self.plan['segments'][segment_index]
+            self._compositors[segment_index] = merger._static_overlay_compositor(
+                segment['overlays'], segment['duration'], frame_size=self.size) if segment['overlays'] else None
+        overlay_compositor = self._compositors[segment_index]
+        if overlay_compositor is not None:
+            overlay_compositor.apply(out, t)
+        return out
+
+
+class MultiOutputRenderer:
+    def __init__(self, merger, targets):
+        """targets: lista (ścieżka wyjściowa, nazwa profilu z merger.profiles)."""
+        self.merger = merger
+        self.targets = targets
+        # Skompilowane warianty (OutputTarget z planami) ostatniego renderu
+        self.compiled = None
+
+    def compile(self, item_no):
+        profiles = [(output_path, output_profiles.get_profile(profile_name, self.merger.profiles))
+                    for output_path, profile_name in self.targets]
+        # Wszystkie warianty dekodują te same pliki - proxy tylko wtedy, gdy każdy wariant je dopuszcza,
+        # inaczej finalny wariant byłby skalowany w górę z proxy
+        proxies = all(profile.get('proxies') for _, profile in profiles)
+        targets = []
+        for output_path, profile in profiles:
+            plan = self.merger.build_render_plan(item_no, profile, proxies=proxies)
+            for segment in plan['segments']:
+                for overlay in segment['overlays']:
+                    if overlay['x'] is None or overlay['end'] > segment['duration'] + 1e-6:
+                        raise UnsupportedMultiOutput(f"napis '{overlay['text']}' wymaga warstw MoviePy")
+            targets.append(OutputTarget(output_path, profile, plan))
+        return targets
+
+    def decode_size(self, targets):
+        """
+        Rozdzielczość dekodowania: rozmiar pierwszego klipu, powiększony tak, żeby
+        żaden wariant nie był skalowany w górę z przyciętego fragmentu - ale nie
+        ponad rozdzielczość największego źródła (więcej szczegółów i tak tam nie ma).
+        """
+        layout_w, layout_h = targets[0].plan['layout_size']
+        scale = 1.0
+        for target in targets:
+            x1, y1, x2, y2 = output_profiles.crop_box((layout_w, layout_h), target.size, target.profile.get('fit'))
+            scale = max(scale, target.size[0] / (x2 - x1), target.size[1] / (y2 - y1))
+        source_scale = max(segment['source_size'][0] / layout_w for segment in targets[0].plan['segments'])
+        scale = min(scale, max(1.0, source_scale))
+        return [int(math.ceil(layout_w * scale / 2)) * 2, int(math.ceil(layout_h * scale / 2)) * 2]
+
+    def _open(self, segment, size):
+        """(funkcja t -> klatka, czas trwania, czy klatka stała, funkcja zamykająca)."""
+        if segment['is_image']:
+            image_clip = ImageClip(segment['path'])
+            frame = image_clip.get_frame(0).astype(np.float32)
+            if image_clip.mask is not None:
+                frame *= image_clip.mask.get_frame(0)[:, :, None]
+            image_clip.close()
+            frame = _resize(np.clip(np.round(frame), 0, 255).astype(np.uint8), size)
+            return (lambda t: frame), segment['duration'], True, (lambda: None)
+
+        # Obrócone nagrania zawsze z jawnym rozmiarem (jak VideoMerger._open_video)
+        if list(segment['source_size']) == list(size) and not segment.get('rotation'):
+            clip = VideoFileClip(segment['path'], audio=False)
+        else:
+            clip = VideoFileClip(segment['path'], audio=False, target_resolution=(size[1], size[0]))
+        return clip.get_frame, clip.duration, False, clip.close
+
+    def _frames(self, targets, size, written, pool):
+        merger = self.merger
+        fps = targets[0].encode_params['fps']
+        timeline = 0.0
+        for index, segment in enumerate(targets[0].plan['segments']):
+            merger._report_segment(segment, fps)
+            try:
+                get_frame, duration, static, close = self._open(segment, size)
+            except Exception as e:
+                print(f"ERROR processing clip {segment['path']}: {str(e)}")
+                continue
+            try:
+                def fan_out(buffer, t, index=index, static=static):
+                    # Skalowanie (Pillow) i NumPy zwalniają GIL - warianty są liczone równolegle
+                    return list(pool.map(lambda target: target.frame(merger, buffer, t, index, static), targets))
+
+                for t in merger._segment_times(duration, timeline, fps):
+                    yield get_frame(t), t, fan_out
+                written.append(dict(segment, duration=duration))
+                timeline += duration
+            finally:
+                close()
+
+    def _render_group(self, targets, work_dir, threads):
+        size = self.decode_size(targets)
+        fps = targets[0].encode_params['fps']
+        progress = self.merger.progress
+        encoder_threads = max(1, (threads or os.cpu_count()) // len(targets))
+
+        for i, target in enumerate(targets):
+            target.video_path = os.path.join(work_dir, f"fps{fps}_target_{i:02d}.mp4")
+            target.writer = ffmpeg_tools.FrameWriter(target.video_path, target.size, target.encode_params,
+                                                     encoder_threads)
+
+        metrics = self.merger.metrics
+
+        def write_frames(frames):
+            with metrics.stage("encode", clip=None):
+                for target, frame in zip(targets, frames):
+                    target.writer.write_frame(frame)
+            progress.advance()
+
+        written = []
+        try:
+            with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="target") as pool:
+                frame_pipeline.FramePipeline((size[1], size[0], 3), write_frames).run(
+                    self._frames(targets, size, written, pool))
+        finally:
+            errors = []
+            for target in targets:
+                metrics.add_frames(target.writer.frames_written)
+                try:
+                    target.writer.close()
+                except RuntimeError as e:
+                    errors.append(e)
+            if errors:
+                raise errors[0]
+
+        if not written:
+            raise RuntimeError("No clips were successfully processed! Check console for detailed error messages.")
+        progress.set_phase("Dokładanie ścieżki audio...")
+        for target in targets:
+            with ffmpeg_tools.atomic_output(target.output_path) as temp_path:
+                ffmpeg_tools.mux_segment_audio(target.video_path, written, temp_path, target.encode_params)
+
+    def render(self, item_no, threads=None):
+        """
+        Renderuje wszystkie warianty. Rzuca UnsupportedMultiOutput, jeśli szablon wymaga
+        warstw MoviePy; pozostałe błędy zwraca jak merge_videos.
+        """
+        targets = self.compile(item_no)
+        self.compiled = targets
+        if not targets or not targets[0].plan['segments']:
+            return False, "No clips were successfully processed! Check console for detailed error messages."
+        self.merger.last_plan = targets[0].plan
+
+        groups = {}
+        for target in targets:
+            groups.setdefault(target.encode_params['fps'], []).append(target)
+        # Każda grupa fps to osobny przebieg po wszystkich klatkach filmu
+        self.merger._begin_progress(
+            sum(render_progress.plan_frames(group[0].plan, fps) for fps, group in groups.items()),
+            len(self.merger.clips_data))
+
+        work_dir = tempfile.mkdtemp(prefix="videom_multi_")
+        try:
+            for group in groups.values():
+                self._render_group(group, work_dir, threads)
+            print("Video merge completed successfully!")
+            paths = ", ".join(target.output_path for target in targets)
+            return True, f"Videos successfully created: {paths}"
+        except Exception as e:
+            print(f"ERROR during video merging: {str(e)}")
+            traceback.print_exc()
+            return False, f"Error during video merging: {str(e)}"
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
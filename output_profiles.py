@@ -0,0 +1,126 @@
+# output_profiles.py
+
+"""
+Profile wyjścia: rozdzielczość, fps, kodek, preset i CRF filmu końcowego.
+
+Profile wbudowane można nadpisać lub uzupełnić w pliku output_profiles.json
+(obok programu) albo w szablonie (klucz "output_profiles"); szablon może też
+wskazać profil domyślny (klucz "output_profile"). Profil nie musi podawać
+wszystkich pól - brakujące są brane z profilu "default":
+
+    {
+        "output_profiles": {
+            "final": {"size": [1080, 1920], "preset": "slow", "crf": 18},
+            "draft": {"scale": 0.33, "fps": 15, "crf": 35}
+        },
+        "output_profile": "final"
+    }
+
+"size" to stała rozdzielczość [szerokość, wysokość]; "scale" to skala względem
+rozdzielczości pierwszego klipu (bez "size" i "scale" - rozdzielczość pierwszego klipu).
+"fit" określa dopasowanie obrazu o innych proporcjach: "stretch" (rozciągnięcie)
+albo "crop" (przycięcie środka kadru do proporcji wyjścia). "proxies": true oznacza
+render z proxy klipów wideo (proxy_cache), jeśli są gotowe - dla szkiców.
+"""
+
+import json
+import os
+
+PROFILES_FILE = "output_profiles.json"
+DEFAULT_PROFILE = "default"
+
+BUILTIN_PROFILES = {
+    # Dotychczasowe zachowanie: rozdzielczość pierwszego klipu, szybkie kodowanie
+    "default": {
+        "size": None,
+        "scale": None,
+        "fps": 29,
+        "codec": "libx264",
+        "preset": "ultrafast",
+        "crf": None,
+        "audio_codec": "aac",
+        "audio_fps": 44100,
+        "fit": "stretch",
+        "proxies": False,
+    },
+    # Film do publikacji: pion 1080x1920, wolniejszy preset, stała jakość
+    "final": {"size": [1080, 1920], "fps": 30, "preset": "slow", "crf": 18},
+    # Wersja do social media: mniejszy plik
+    "social": {"size": [720, 1280], "fps": 30, "preset": "fast", "crf": 23},
+    # Warianty w innych proporcjach - obraz przycięty do proporcji wyjścia (środek kadru)
+    "square": {"size": [1080, 1080], "fps": 30, "preset": "fast", "crf": 23, "fit": "crop"},
+    "horizontal": {"size": [1920, 1080], "fps": 30, "preset": "fast", "crf": 23, "fit": "crop"},
+    # Podgląd układu napisów w kilka sekund
+    "draft": {"scale": 0.33, "fps": 15, "preset": "ultrafast", "crf": 35, "proxies": True},
+}
+
+# Pola przekazywane do enkoderów (MoviePy / ffmpeg)
+ENCODE_FIELDS = ("fps", "codec", "preset", "crf", "audio_codec", "audio_fps")
+
+
+def load_profiles(template_profiles=None, profiles_file=PROFILES_FILE):
+    """Profile wbudowane, nadpisane profilami z pliku konfiguracyjnego i z szablonu."""
+    profiles = {name: dict(profile) for name, profile in BUILTIN_PROFILES.items()}
+    sources = []
+    if profiles_file and os.path.exists(profiles_file):
+        try:
+            with open(profiles_file, 'r', encoding='utf-8') as f:
+                sources.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Ostrzeżenie: nie udało się wczytać profili z {profiles_file}: {e}")
+    if template_profiles:
+        sources.append(template_profiles)
+
+    for source in sources:
+        for name, profile in source.items():
+            profiles.setdefault(name, {}).update(profile)
+    return profiles
+
+
+def get_profile(name=None, profiles=None):
+    """Pełny profil (uzupełniony polami z "default"); nieznana nazwa -> ValueError."""
+    profiles = profiles if profiles is not None else load_profiles()
+    name = name or DEFAULT_PROFILE
+    if name not in profiles:
+        raise ValueError(f"Unknown output profile '{name}'. Available: {', '.join(profiles)}")
+    profile = dict(profiles[DEFAULT_PROFILE])
+    profile.update(profiles[name])
+    profile['name'] = name
+    return profile
+
+
+def encode_params(profile):
+    """Parametry kodowania profilu (bez pól rozdzielczości)."""
+    return {field: profile[field] for field in ENCODE_FIELDS}
+
+
+def output_size(profile, layout_size):
+    """
+    Rozdzielczość wyjścia dla profilu; layout_size to rozdzielczość pierwszego klipu.
+    Wymiary są parzyste - wymaga tego yuv420p.
+    """
+    if profile.get('size'):
+        width, height = profile['size']
+    elif profile.get('scale'):
+        width, height = (layout_size[0] * profile['scale'], layout_size[1] * profile['scale'])
+    else:
+        return list(layout_size)
+    return [max(2, int(round(width / 2)) * 2), max(2, int(round(height / 2)) * 2)]
+
+
+def crop_box(frame_size, target_size, fit):
+    """
+    Fragment klatki (x1, y1, x2, y2) skalowany do wyjścia: cała klatka dla "stretch",
+    środek kadru w proporcjach wyjścia dla "crop".
+    """
+    width, height = frame_size
+    if fit != "crop":
+        return 0, 0, width, height
+    target_ratio = target_size[0] / target_size[1]
+    if width / height > target_ratio:
+        crop_w = int(round(height * target_ratio))
+        x1 = (width - crop_w) // 2
+        return x1, 0, x1 + crop_w, height
+    crop_h = int(round(width / target_ratio))
+    y1 = (height - crop_h) // 2
+    return 0, y1, width, y1 + crop_h
@@ -0,0 +1,135 @@
+# proxy_cache.py
+
+"""
+Proxy klipów użytkownika: małe kopie robocze dużych oryginałów z kamery.
+
+Proxy to plik w niskiej rozdzielczości, kodowany samymi klatkami kluczowymi
+(-g 1, -tune fastdecode), więc dekodowanie i przewijanie jest tanie. Proxy są
+tworzone w tle po dodaniu klipu i trzymane w cache adresowanym zawartością
+(klucz: tożsamość oryginału + ustawienia proxy). Render szkicowy (profil
+z "proxies": true) używa proxy, jeśli jest gotowe; render końcowy zawsze
+czyta oryginały.
+"""
+
+import hashlib
+import json
+import os
+import queue
+import subprocess
+import threading
+
+import ffmpeg_tools
+from segment_cache import SegmentCache, file_identity
+
+PROXY_CACHE_DIR = "proxy_cache"
+PROXY_HEIGHT = 640
+PROXY_SETTINGS = {
+    'codec': 'libx264',
+    'preset': 'ultrafast',
+    'crf': 28,
+    'gop': 1,
+    'audio_codec': 'aac',
+    'audio_fps': 44100,
+}
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+
+class ProxyManager:
+    def __init__(self, cache_dir=PROXY_CACHE_DIR, height=PROXY_HEIGHT):
+        self.store = SegmentCache(cache_dir)
+        self.height = height
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._not_needed = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def key_for(self, path):
+        description = {"source": file_identity(path), "height": self.height, "settings": PROXY_SETTINGS}
+        payload = json.dumps(description, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def needs_proxy(self, path):
+        return path.lower().endswith(VIDEO_EXTENSIONS) and os.path.exists(path)
+
+    def proxy_for(self, path):
+        """Ścieżka gotowego proxy albo None (klip nie potrzebuje proxy albo proxy jeszcze nie ma)."""
+        if not self.needs_proxy(path):
+            return None
+        return self.store.get(self.key_for(path))
+
+    def request(self, path):
+        """Zleca utworzenie proxy w tle (jeśli klip go potrzebuje i jeszcze nie ma)."""
+        if not self.needs_proxy(path) or self.proxy_for(path):
+            return
+        key = self.key_for(path)
+        with self._lock:
+            if key in self._pending or key in self._not_needed:
+                return
+            self._pending.add(key)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="proxy-generator", daemon=True)
+                self._thread.start()
+        self._queue.put((path, key))
+
+    def wait(self):
+        """Czeka, aż wszystkie zlecone proxy będą gotowe."""
+        self._queue.join()
+
+    def prepare(self, paths):
+        """Tworzy brakujące proxy dla listy klipów i czeka na nie (np. przed batchem szkiców)."""
+        for path in paths:
+            self.request(path)
+        self.wait()
+
+    def _worker(self):
+        while True:
+            path, key = self._queue.get()
+            try:
+                self.create(path, key)
+            except Exception as e:
+                print(f"Błąd tworzenia proxy dla {path}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                self._queue.task_done()
+
+    def create(self, path, key=None):
+        """Koduje proxy oryginału; klipy nie większe od proxy są pomijane (zwraca None)."""
+        key = key or self.key_for(path)
+        streams = ffmpeg_tools.probe_streams(path)
+        if streams['video'] is None or streams['video'][3] <= self.height:
+            with self._lock:
+                self._not_needed.add(key)
+            return None
+
+        temp_path = self.store.temp_path_for(key)
+        command = [
+            ffmpeg_tools.ffmpeg_binary(), '-y', '-loglevel', 'error', '-i', path,
+            '-vf', f"scale=-2:{self.height}",
+            '-c:v', PROXY_SETTINGS['codec'], '-preset', PROXY_SETTINGS['preset'],
+            '-crf', str(PROXY_SETTINGS['crf']), '-g', str(PROXY_SETTINGS['gop']), '-tune', 'fastdecode',
+            '-pix_fmt', 'yuv420p',
+            '-c:a', PROXY_SETTINGS['audio_codec'], '-ar', str(PROXY_SETTINGS['audio_fps']), '-ac', '2',
+            temp_path,
+        ]
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace')
+        if result.returncode != 0:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise RuntimeError(f"ffmpeg proxy encode failed: {result.stderr.strip()}")
+        return self.store.store(key, temp_path)
+
+
+_proxy_manager = None
+_proxy_manager_lock = threading.Lock()
+
+
+def get_proxy_manager():
+    """Zwraca współdzielony generator proxy (tworzony przy pierwszym użyciu)."""
+    global _proxy_manager
+    if _proxy_manager is None:
+        with _proxy_manager_lock:
+            if _proxy_manager is None:
+                _proxy_manager = ProxyManager()
+    return _proxy_manager
@@ -0,0 +1,216 @@
+# render_metrics.py
+
+"""
+Pomiary czasu etapów renderu: dane z katalogu, napisy, przygotowanie klipów,
+dekodowanie, nakładanie napisów, kodowanie i łączenie.
+
+Czasy są sumowane dla całego renderu i osobno dla każdego klipu (indeks segmentu
+planu), a raport JSON trafia obok pliku wynikowego (film.mp4 -> film.metrics.json).
+Pomiary są opcjonalne: VideoMerger(collect_metrics=True), --metrics w batch_render
+albo zmienna środowiskowa VIDEOM_METRICS=1. Bez nich używany jest NULL_METRICS,
+którego etapy nic nie mierzą.
+
+Etapy mogą się zawierać (np. "plan" obejmuje "text_render"), więc ich suma nie jest
+czasem całego renderu - ten jest w polu "wall_seconds".
+
+Klatki: "frames" to klatki pliku wynikowego, a "encoded_frames" - klatki faktycznie
+zakodowane w tym renderze (add_frames ze ścieżek zapisu; bez segmentów wziętych z cache,
+z klatkami wszystkich wariantów przy wspólnym dekodowaniu). Z nich liczone jest "encode_fps".
+
+Pamięć: "peak_rss_mb.render" to szczyt RSS tego procesu próbkowany w trakcie tego renderu,
+a "peak_rss_mb.process_lifetime" - szczyt z całego życia procesu (ru_maxrss), więc w batchu
+i w usłudze renderu obejmuje też wcześniejsze rendery.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource  # tylko POSIX
+except ImportError:
+    resource = None
+
+METRICS_ENV = "VIDEOM_METRICS"
+METRICS_SUFFIX = ".metrics.json"
+REPORT_VERSION = 3
+RSS_SAMPLE_SECONDS = 0.2
+
+# Etap przypisywany do bieżącego klipu (ustawianego przez begin_clip)
+CURRENT_CLIP = object()
+# Etapy, w których powstają zakodowane klatki (encode_fps)
+ENCODE_STAGES = ('write', 'encode', 'ffmpeg_render')
+
+
+def metrics_enabled(flag=None):
+    """Wartość flagi, a bez niej - zmienna środowiskowa VIDEOM_METRICS."""
+    if flag is not None:
+        return bool(flag)
+    return os.environ.get(METRICS_ENV, "").lower() in ("1", "true", "yes")
+
+
+def metrics_path(output_path):
+    """Ścieżka raportu obok pliku wynikowego, np. film.mp4 -> film.metrics.json."""
+    return os.path.splitext(output_path)[0] + METRICS_SUFFIX
+
+
+def current_rss_mb():
+    """Bieżąca pamięć rezydentna (RSS, MB) tego procesu albo None, jeśli nie da się jej odczytać (poza Linuksem)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss_mb():
+    """
+    Szczytowe zużycie pamięci (MB) tego procesu i największego z procesów potomnych (ffmpeg)
+    w całym życiu procesu - nie tylko w bieżącym renderze.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss: kilobajty w Linuksie, bajty w macOS
+    unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'self': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 1),
+        'children': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit, 1),
+    }
+
+
+def _add(stages, name, seconds):
+    entry = stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+    entry['seconds'] += seconds
+    entry['calls'] += 1
+
+
+class RenderMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.clips = {}
+        self.frames = 0
+        self.current_clip = None
+        self._lock = threading.Lock()
+        # Szczyt RSS tego renderu - ru_maxrss dotyczy całego życia procesu
+        self.render_peak_rss = current_rss_mb()
+        self._stopped = threading.Event()
+        if self.render_peak_rss is not None:
+            threading.Thread(target=self._sample_rss, name="metrics-rss", daemon=True).start()
+
+    def _sample_rss(self):
+        while not self._stopped.wait(RSS_SAMPLE_SECONDS):
+            rss = current_rss_mb()
+            if rss is not None and rss > self.render_peak_rss:
+                self.render_peak_rss = rss
+
+    def close(self):
+        """Kończy próbkowanie pamięci (po zapisaniu raportu albo przy przerwaniu renderu)."""
+        self._stopped.set()
+
+    def begin_clip(self, index, path):
+        """Kolejne etapy (bez jawnego `clip`) są przypisywane do tego klipu."""
+        with self._lock:
+            self.clips.setdefault(index, {'index': index, 'path': path, 'stages': {}})
+            self.current_clip = index
+
+    def add(self, name, seconds, clip=CURRENT_CLIP):
+        with self._lock:
+            _add(self.stages, name, seconds)
+            if clip is CURRENT_CLIP:
+                clip = self.current_clip
+            if clip is not None and clip in self.clips:
+                _add(self.clips[clip]['stages'], name, seconds)
+
+    @contextmanager
+    def stage(self, name, clip=CURRENT_CLIP):
+        """Mierzy blok kodu; clip=None - tylko w sumie całego renderu."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, clip)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_frames(self, frames):
+        """Klatki zakodowane przez ścieżkę zapisu (MoviePy, potok strumieniowy, ffmpeg)."""
+        with self._lock:
+            self.frames += frames
+
+    def report(self, output_path, success, message, plan=None, encode_params=None, frames=None):
+        """frames - klatki tego pliku, jeśli inne niż suma add_frames (np. segmenty z cache, warianty)."""
+        wall = time.perf_counter() - self.started
+        frames = self.frames if frames is None else frames
+        encode_seconds = sum(self.stages.get(name, {}).get('seconds', 0.0) for name in ENCODE_STAGES)
+
+        def rounded(stages):
+            return {name: {'seconds': round(entry['seconds'], 4), 'calls': entry['calls']}
+                    for name, entry in stages.items()}
+
+        return {
+            'version': REPORT_VERSION,
+            'output_path': output_path,
+            'success': success,
+            'message': message,
+            'wall_seconds': round(wall, 3),
+            'frames': frames,
+            'fps': round(frames / wall, 2) if wall > 0 else None,
+            'encoded_frames': self.frames,
+            'encode_fps': round(self.frames / encode_seconds, 2) if encode_seconds > 0 else None,
+            'peak_rss_mb': {
+                'render': round(self.render_peak_rss, 1) if self.render_peak_rss is not None else None,
+                'process_lifetime': peak_rss_mb(),
+            },
+            'final_size': plan['final_size'] if plan else None,
+            'encode': encode_params,
+            'stages': rounded(self.stages),
+            'counters': dict(self.counters),
+            'clips': [dict(clip, stages=rounded(clip['stages'])) for _, clip in sorted(self.clips.items())],
+        }
+
+    def write_report(self, output_path, success, message, plan=None, encode_params=None, frames=None):
+        """Zapisuje raport obok pliku wynikowego; zwraca ścieżkę raportu (None przy błędzie zapisu)."""
+        path = metrics_path(output_path)
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.report(output_path, success, message, plan, encode_params, frames), f, indent=2,
+                          ensure_ascii=False)
+        except OSError as e:
+            print(f"Ostrzeżenie: nie udało się zapisać raportu czasów {path}: {e}")
+            return None
+        return path
+
+
+class _NullMetrics:
+    """Pomiary wyłączone - ten sam interfejs, zero kosztu poza wywołaniem."""
+
+    current_clip = None
+
+    def begin_clip(self, index, path):
+        pass
+
+    def add(self, name, seconds, clip=CURRENT_CLIP):
+        pass
+
+    @contextmanager
+    def stage(self, name, clip=CURRENT_CLIP):
+        yield
+
+    def count(self, name, value=1):
+        pass
+
+    def add_frames(self, frames):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_METRICS = _NullMetrics()
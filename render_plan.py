@@ -0,0 +1,242 @@
+# render_plan.py
+
+"""
+Plan renderu - opis "co renderować" oddzielony od "jak renderować".
+
+Plan to zwykły słownik (serializowalny do JSON) liczony przed dekodowaniem
+czegokolwiek: rozdzielczość i parametry wyjścia oraz lista segmentów (po jednym
+na klip) z rozwiązanymi tekstami, pozycjami napisów w pikselach i czasami.
+Każdy segment ma odcisk (fingerprint) - ten sam odcisk oznacza identyczny
+wynik kodowania, więc backendy (MoviePy, filtergraph ffmpeg) i cache mogą
+podejmować decyzje przed startem renderu.
+
+    {
+        'version': 1, 'item_no': '10400', 'final_size': [1080, 1920], 'layout_size': [1080, 1920],
+        'profile': 'final', 'layout_scale': 1.0, 'encode': {...}, 'text_backend': 'pillow',
+        'segments': [
+            {'index': 0, 'path': ..., 'source': {'path', 'mtime', 'size'}, 'is_image': True,
+             'duration': 5.0, 'has_audio': False, 'source_size': [1080, 1920], 'rotation': 0,
+             'item_invariant': False, 'fingerprint': '3f1c...',
+             'overlays': [{'text': 'Krzesło', 'config': {...}, 'x': 412, 'y': 780,
+                           'position': [412, 780], 'width': 256, 'height': 48,
+                           'start': 0.0, 'end': 5.0}]},
+            ...
+        ]
+    }
+"""
+
+import hashlib
+import json
+import os
+
+from moviepy.editor import VideoFileClip
+from PIL import Image
+
+import data_load
+import ffmpeg_tools
+import output_profiles
+from segment_cache import file_identity
+
+PLAN_VERSION = 1
+
+
+def static_position(config, final_size, text_w, text_h):
+    """Pozycja napisu w pikselach; pozycje względne (0-1) są przeliczane z uwzględnieniem wyrównania."""
+    pos = config.get('position', (0.5, 0.5))
+
+    if (isinstance(pos, (tuple, list)) and len(pos) == 2 and
+            all(isinstance(p, (int, float)) for p in pos)):
+
+        if 0 <= pos[0] <= 1 and 0 <= pos[1] <= 1:
+            x = pos[0] * final_size[0]
+            y = pos[1] * final_size[1]
+
+            alignment = config.get('alignment', 'center')
+            if alignment == 'left':
+                y -= text_h / 2
+            elif alignment == 'right':
+                x -= text_w
+                y -= text_h / 2
+            else:  # center
+                x -= text_w / 2
+                y -= text_h / 2
+
+            pos = (x, y)
+
+    return pos
+
+
+def overlay_position(config, final_size, text_w, text_h):
+    """Stała pozycja napisu w pikselach albo None, jeśli nie da się jej wyznaczyć z góry."""
+    if config.get('movement') != 'static':
+        return (0, 0)  # bez ustawionej pozycji MoviePy rysuje napis w lewym górnym rogu
+    pos = static_position(config, final_size, text_w, text_h)
+    if all(isinstance(p, (int, float)) for p in pos):
+        return pos
+    return None
+
+
+def source_info(clip_data):
+    """
+    (rozmiar źródła, czas trwania, czy ma audio, obrót w stopniach) - z nagłówka pliku, bez
+    dekodowania klatek. Rozmiar wideo uwzględnia obrót (pionowe nagrania z telefonu).
+    Gdy ffmpeg -i nie poda rozmiaru lub czasu, parametry odczytuje VideoFileClip.
+    """
+    if clip_data['is_image']:
+        with Image.open(clip_data['path']) as image:
+            return list(image.size), clip_data['image_duration'], False, 0
+
+    streams = ffmpeg_tools.probe_streams(clip_data['path'])
+    if streams['video'] is not None and streams['duration']:
+        return ([streams['video'][2], streams['video'][3]], streams['duration'], streams['audio'] is not None,
+                streams['rotation'])
+
+    clip = VideoFileClip(clip_data['path'])
+    try:
+        width, height = clip.size
+        rotation = (clip.rotation or 0) % 360
+        if rotation in (90, 270):
+            width, height = height, width
+        return [width, height], clip.duration, clip.audio is not None, rotation
+    finally:
+        clip.close()
+
+
+def is_item_invariant(clip_data):
+    """Klip bez tekstów albo z tekstami bez symboli zastępczych wygląda tak samo dla każdego indeksu."""
+    return not any(data_load.PLACEHOLDER_PATTERN.search(t.get('text', '')) for t in clip_data['texts'])
+
+
+def scale_config(config, scale):
+    """
+    Konfiguracja napisu przeskalowana do innej rozdzielczości wyjścia (np. profil draft):
+    rozmiar fontu, szerokość zawijania i pozycje w pikselach. Pozycje względne (0-1)
+    skalują się same.
+    """
+    if scale == 1:
+        return config
+    scaled = dict(config)
+    scaled['fontsize'] = max(1, int(round(config.get('fontsize', 50) * scale)))
+    if config.get('wrap_width'):
+        scaled['wrap_width'] = max(1, int(round(config['wrap_width'] * scale)))
+    pos = config.get('position')
+    if (isinstance(pos, (tuple, list)) and len(pos) == 2 and all(isinstance(p, (int, float)) for p in pos)
+            and not (0 <= pos[0] <= 1 and 0 <= pos[1] <= 1)):
+        scaled['position'] = [pos[0] * scale, pos[1] * scale]
+    return scaled
+
+
+def compile_overlays(texts, duration, final_size, text_size, layout_scale=1):
+    overlays = []
+    for text, config in texts:
+        config = scale_config(config, layout_scale)
+        start = config.get('start_time', 0)
+        if start > duration:
+            continue
+        width, height = text_size(text, config)
+        pos = overlay_position(config, final_size, width, height)
+        overlays.append({
+            'text': text,
+            'config': config,
+            'x': int(pos[0]) if pos is not None else None,
+            'y': int(pos[1]) if pos is not None else None,
+            'position': list(pos) if pos is not None else config.get('position'),
+            'width': width,
+            'height': height,
+            'start': start,
+            'end': start + (config.get('duration') or duration),
+        })
+    return overlays
+
+
+def segment_fingerprint(segment, final_size, encode_params, text_backend=None):
+    description = {key: value for key, value in segment.items() if key not in ('index', 'fingerprint')}
+    description['final_size'] = list(final_size)
+    description['encode'] = encode_params
+    # Ten sam napis z Pillow i z ImageMagick to inne piksele - jak w kluczu cache napisów
+    description['text_backend'] = text_backend
+    payload = json.dumps(description, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def compile_plan(clips_data, item_no, resolve_texts, text_size, encode_params, final_size=None, profile=None,
+                 text_backend=None):
+    """
+    Buduje plan renderu.
+
+    resolve_texts(clip_data) -> [(tekst, config), ...] z podmienionymi symbolami,
+    text_size(tekst, config) -> (szerokość, wysokość) bitmapy napisu,
+    text_backend - nazwa backendu rasteryzacji napisów (wchodzi do odcisków segmentów).
+    Bez `final_size` rozdzielczość wyjścia wynika z profilu (output_profiles) i rozdzielczości
+    pierwszego klipu; napisy są skalowane tak, żeby układ wyglądał jak w rozdzielczości klipu.
+    Brakujące lub nieczytelne pliki są pomijane (z komunikatem), tak jak wcześniej w merge_videos.
+    """
+    segments = []
+    layout_scale = 1
+    layout_size = None
+    for index, clip_data in enumerate(clips_data):
+        if not os.path.exists(clip_data['path']):
+            print(f"ERROR: Clip file not found: {clip_data['path']}")
+            continue
+        try:
+            size, duration, has_audio, rotation = source_info(clip_data)
+
+            clip_layout_size, clip_final_size, clip_layout_scale = layout_size, final_size, layout_scale
+            if clip_layout_size is None:
+                # Układ napisów liczymy zawsze z oryginału - render z proxy ma wyglądać jak końcowy
+                original = clip_data.get('original_path')
+                clip_layout_size = source_info(dict(clip_data, path=original))[0] if original else size
+            if clip_final_size is None:
+                # Rozdzielczość wyjścia i skala napisów też z oryginału - proxy służy tylko do dekodowania
+                clip_final_size = (output_profiles.output_size(profile, clip_layout_size) if profile
+                                   else clip_layout_size)
+                clip_layout_scale = min(clip_final_size[0] / clip_layout_size[0],
+                                        clip_final_size[1] / clip_layout_size[1])
+
+            # Napisy (podmiana symboli, rasteryzacja) też per klip - np. nieznany kolor pomija klip jak dawniej
+            overlays = compile_overlays(resolve_texts(clip_data), duration, clip_final_size, text_size,
+                                        clip_layout_scale)
+        except Exception as e:
+            print(f"ERROR processing clip {clip_data['path']}: {str(e)}")
+            continue
+        layout_size, final_size, layout_scale = clip_layout_size, clip_final_size, clip_layout_scale
+
+        segment = {
+            'index': index,
+            'path': clip_data['path'],
+            'source': file_identity(clip_data['path']),
+            'original_path': clip_data.get('original_path'),
+            'is_image': clip_data['is_image'],
+            'duration': duration,
+            'has_audio': has_audio,
+            'source_size': size,
+            'rotation': rotation,
+            'item_invariant': is_item_invariant(clip_data),
+            'overlays': overlays,
+        }
+        segment['fingerprint'] = segment_fingerprint(segment, final_size, encode_params, text_backend)
+        segments.append(segment)
+
+    return {
+        'version': PLAN_VERSION,
+        'item_no': item_no,
+        'final_size': list(final_size) if final_size else None,
+        'layout_size': list(layout_size) if layout_size else None,
+        'profile': profile['name'] if profile else None,
+        'layout_scale': layout_scale,
+        'encode': encode_params,
+        'text_backend': text_backend,
+        'segments': segments,
+    }
+
+
+def plan_hash(plan):
+    """Odcisk całego planu - zmienia się, gdy zmieni się którykolwiek segment lub parametry wyjścia."""
+    payload = json.dumps([plan['final_size'], plan['encode'], [s['fingerprint'] for s in plan['segments']]],
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def save_plan(plan, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, indent=4, ensure_ascii=False, default=str)
@@ -0,0 +1,186 @@
+# render_progress.py
+
+"""
+Postęp renderu liczony w klatkach całego filmu.
+
+Liczba klatek każdego segmentu jest znana z planu renderu (czas trwania x fps),
+więc procent, tempo (klatki/s) i pozostały czas dotyczą całego zadania, a nie
+pojedynczego paska MoviePy. Segmenty wzięte z cache liczą się jako gotowe, ale nie
+zawyżają tempa (ETA liczone jest tylko z klatek faktycznie przetworzonych).
+
+Wywołania callbacku są ograniczane (domyślnie co 0,25 s), żeby szybkie kodowanie
+nie zalewało kolejki root.after w Tk; zmiana segmentu, etapu i koniec są
+zgłaszane zawsze. Kontrakt callbacku bez zmian: callback(percentage, message).
+"""
+
+import math
+import threading
+import time
+
+MIN_INTERVAL = 0.25
+
+
+def segment_frames(duration, fps):
+    """Liczba klatek segmentu w planie (co najmniej jedna)."""
+    return max(1, int(math.ceil(duration * fps - 1e-9)))
+
+
+def plan_frames(plan, fps):
+    """Klatki wszystkich segmentów planu renderu."""
+    return sum(segment_frames(segment['duration'], fps) for segment in plan['segments'])
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}" if seconds >= 3600 \
+        else f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class RenderProgress:
+    def __init__(self, callback=None, total_frames=0, segment_count=0, min_interval=MIN_INTERVAL):
+        self.callback = callback
+        self.total_frames = total_frames
+        self.segment_count = segment_count
+        self.min_interval = min_interval
+        self.frames_done = 0
+        self.segment_index = None
+        self.segment_name = None
+        self.phase = None
+        self._processed = 0
+        self._segment_start = 0
+        self._segment_frames = None
+        self._pass_start = 0
+        self._pass_frames = None
+        self._started = time.perf_counter()
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+
+    def start(self, total_frames, segment_count):
+        """Początek właściwego renderu (po zbudowaniu planu)."""
+        with self._lock:
+            self.total_frames = total_frames
+            self.segment_count = segment_count
+            self.frames_done = self._processed = 0
+            self._pass_start = 0
+            self._pass_frames = None
+            self._started = time.perf_counter()
+        self._emit(force=True)
+
+    def start_pass(self, frames, segment_count):
+        """
+        Kolejny przebieg tego samego zadania (np. następny wariant filmu renderowany osobno):
+        licznik nie wraca do zera, a `frames` to klatki tego przebiegu, wliczone już w start().
+        """
+        with self._lock:
+            if self._pass_frames is not None:
+                expected = self._pass_start + self._pass_frames
+                if self.frames_done < expected:
+                    self._processed += expected - self.frames_done
+                    self.frames_done = expected
+            self._pass_start = self.frames_done
+            self._pass_frames = frames
+            self.segment_count = segment_count
+        self._emit(force=True)
+
+    def start_segment(self, index, name, frames=None):
+        """
+        Kolejny segment; `frames` - jego klatki z planu (koryguje licznik po finish_segment).
+        index=None - etap całego filmu, bez bieżącego segmentu.
+        """
+        with self._lock:
+            self.segment_index = index
+            self.segment_name = name
+            self.phase = None
+            self._segment_start = self.frames_done
+            self._segment_frames = frames
+        self._emit(force=True)
+
+    def advance(self, frames=1):
+        """Przetworzone (zdekodowane i zakodowane) klatki."""
+        with self._lock:
+            self.frames_done += frames
+            self._processed += frames
+        self._emit()
+
+    def update(self, frames_done):
+        """Liczba gotowych klatek bieżącego przebiegu (np. z `-progress` ffmpeg)."""
+        with self._lock:
+            frames_done += self._pass_start
+            delta = frames_done - self.frames_done
+            if delta <= 0:
+                return
+            self.frames_done = frames_done
+            self._processed += delta
+        self._emit()
+
+    def skip(self, frames):
+        """Klatki gotowe bez przetwarzania (segment z cache) - liczą się do postępu, nie do tempa."""
+        with self._lock:
+            self.frames_done += frames
+        self._emit()
+
+    def finish_segment(self):
+        """Wyrównuje licznik do liczby klatek segmentu z planu (MoviePy może zakodować o klatkę mniej/więcej)."""
+        with self._lock:
+            if self._segment_frames is None:
+                return
+            expected = self._segment_start + self._segment_frames
+            if self.frames_done < expected:
+                self._processed += expected - self.frames_done
+            self.frames_done = expected
+            self._segment_frames = None
+
+    def set_phase(self, message):
+        """Etap bez klatek (łączenie, audio) - procent zostaje, zmienia się tylko komunikat."""
+        with self._lock:
+            self.phase = message
+        self._emit(force=True)
+
+    def finish(self):
+        with self._lock:
+            self.frames_done = max(self.frames_done, self.total_frames)
+            self.phase = None
+        self._emit(force=True)
+
+    def snapshot(self):
+        """Stan postępu jako słownik (do API / raportów)."""
+        with self._lock:
+            elapsed = time.perf_counter() - self._started
+            fps = self._processed / elapsed if elapsed > 0 and self._processed else None
+            remaining = max(0, self.total_frames - self.frames_done)
+            return {
+                'frames_done': min(self.frames_done, self.total_frames) if self.total_frames else self.frames_done,
+                'total_frames': self.total_frames,
+                'percentage': min(100, int(self.frames_done * 100 / self.total_frames)) if self.total_frames else 0,
+                'fps': round(fps, 1) if fps else None,
+                'eta_seconds': round(remaining / fps, 1) if fps else None,
+                'segment_index': self.segment_index,
+                'segment_count': self.segment_count,
+                'segment_name': self.segment_name,
+                'phase': self.phase,
+            }
+
+    def message(self, state=None):
+        state = state or self.snapshot()
+        parts = [f"{state['percentage']}%", f"klatki {state['frames_done']}/{state['total_frames']}"]
+        if state['fps']:
+            parts.append(f"{state['fps']:.0f} kl/s")
+            parts.append(f"pozostało {format_eta(state['eta_seconds'])}")
+        if state['segment_index'] is not None:
+            parts.append(f"plik {state['segment_index'] + 1}/{state['segment_count']}: {state['segment_name']}")
+        if state['phase']:
+            parts.append(state['phase'])
+        return " · ".join(parts)
+
+    def _emit(self, force=False):
+        if not self.callback:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            if not force and now - self._last_emit < self.min_interval:
+                return
+            self._last_emit = now
+        state = self.snapshot()
+        self.callback(percentage=state['percentage'], message=self.message(state))
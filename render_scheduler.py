@@ -0,0 +1,297 @@
+# render_scheduler.py
+
+"""
+Równoległe renderowanie wielu indeksów w puli procesów.
+
+Składanie klatek w MoviePy działa w jednym wątku Pythona, więc pojedynczy render
+nie wykorzysta wszystkich rdzeni. Scheduler dzieli rdzenie na kilka procesów
+(każdy renderuje inny indeks) i wątki enkodera x264 w każdym z nich.
+"""
+
+import _thread
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import Manager
+
+try:
+    import psutil  # opcjonalnie - bez niego RSS jest czytany z /proc (Linux)
+except ImportError:
+    psutil = None
+
+# Minimalna liczba wątków enkodera na proces - poniżej tego x264 staje się wąskim gardłem
+MIN_THREADS_PER_WORKER = 2
+MEMORY_POLL_SECONDS = 0.5
+
+_worker_merger = None
+_worker_threads = None
+_worker_queue = None
+_worker_watchdog = None
+
+
+def total_memory_mb():
+    """Całkowita pamięć RAM w MB albo None, jeśli system nie pozwala jej odczytać."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def plan_workers(jobs_count, workers=None, cpu_count=None, memory_limit_mb=None):
+    """
+    Dzieli rdzenie między procesy i wątki enkodera.
+    Zwraca krotkę (liczba procesów, wątki enkodera na proces).
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if not workers:
+        workers = max(1, cpu_count // MIN_THREADS_PER_WORKER)
+    workers = max(1, min(workers, jobs_count, cpu_count))
+
+    if memory_limit_mb:
+        memory = total_memory_mb()
+        if memory:
+            workers = max(1, min(workers, memory // memory_limit_mb))
+
+    threads_per_worker = max(1, cpu_count // workers)
+    return workers, threads_per_worker
+
+
+def _proc_children():
+    """{pid rodzica: [pid dzieci]} z /proc/<pid>/stat; pusty słownik, jeśli /proc nie istnieje."""
+    children = {}
+    try:
+        pids = [name for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return children
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Pola po nazwie procesu (w nawiasach, może zawierać spacje): stan, ppid, ...
+        ppid = int(stat[stat.rindex(b')') + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(pid))
+    return children
+
+
+def _proc_rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return 0.0
+
+
+def process_tree(pid=None):
+    """Pid procesu i wszystkich jego potomków (np. procesów ffmpeg) albo None, jeśli nie da się ich odczytać."""
+    pid = pid or os.getpid()
+    if psutil is not None:
+        try:
+            return [pid] + [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return [pid]
+    if not os.path.isdir('/proc'):
+        return None
+    children = _proc_children()
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def tree_rss_mb(pids):
+    """Suma pamięci rezydentnej (RSS, MB) podanych procesów."""
+    if psutil is not None:
+        total = 0
+        for pid in pids:
+            try:
+                total += psutil.Process(pid).memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
+    return sum(_proc_rss_mb(pid) for pid in pids)
+
+
+def kill_process(pid):
+    """Zabija proces (psutil także w Windows, gdzie nie ma SIGKILL); błędy - np. proces już zakończony - pomija."""
+    if psutil is not None:
+        try:
+            psutil.Process(pid).kill()
+        except psutil.Error:
+            pass
+        return
+    try:
+        os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+    except OSError:
+        pass
+
+
+class MemoryWatchdog:
+    """
+    Limit pamięci rezydentnej (RSS) procesu renderu razem z jego procesami ffmpeg.
+    Limit przestrzeni adresowej (RLIMIT_AS) się do tego nie nadaje: wątki NumPy/x264
+    i areny malloc rezerwują dużo więcej pamięci wirtualnej, niż faktycznie używają.
+    Po przekroczeniu limitu w trakcie zadania procesy potomne są zabijane, a główny
+    wątek dostaje KeyboardInterrupt - zadanie kończy się błędem, proces obsługuje kolejne.
+    """
+
+    def __init__(self, limit_mb, interval=MEMORY_POLL_SECONDS):
+        self.limit_mb = limit_mb
+        self.interval = interval
+        self.exceeded_mb = None
+        self._active = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        if process_tree() is None:
+            print("Ostrzeżenie: limit pamięci na proces nie jest obsługiwany w tym systemie (brak psutil i /proc).")
+            return False
+        threading.Thread(target=self._run, name="memory-watchdog", daemon=True).start()
+        return True
+
+    def begin(self):
+        with self._lock:
+            self._active = True
+            self.exceeded_mb = None
+
+    def end(self):
+        with self._lock:
+            self._active = False
+
+    def _run(self):
+        own_pid = os.getpid()
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            try:
+                self._check(own_pid)
+            except Exception as e:
+                # Wątek nie może zginąć po cichu - limit przestałby działać
+                print(f"Błąd kontroli limitu pamięci: {e}")
+
+    def _check(self, own_pid):
+        pids = process_tree(own_pid)
+        rss = tree_rss_mb(pids)
+        if rss <= self.limit_mb:
+            return
+        with self._lock:
+            if not self._active or self.exceeded_mb is not None:
+                return
+            self.exceeded_mb = rss
+            for pid in pids[1:]:
+                kill_process(pid)
+            _thread.interrupt_main()
+
+
+def _init_worker(full_clips, threads, memory_limit_mb, progress_queue, render_engine, concat_method,
+                 output_profile, profiles, collect_metrics=None):
+    """Inicjalizacja procesu: jeden VideoMerger i katalog na proces, używane przez wszystkie jego zadania."""
+    global _worker_merger, _worker_threads, _worker_queue, _worker_watchdog
+    if memory_limit_mb:
+        watchdog = MemoryWatchdog(memory_limit_mb)
+        _worker_watchdog = watchdog if watchdog.start() else None
+
+    from segment_cache import SegmentCache
+    from video_merger import VideoMerger
+
+    _worker_merger = VideoMerger(segment_cache=SegmentCache(), concat_method=concat_method,
+                                 render_engine=render_engine, output_profile=output_profile, profiles=profiles,
+                                 collect_metrics=collect_metrics)
+    for clip in full_clips:
+        _worker_merger.add_clip(clip['path'], clip['texts'], clip.get('image_duration'))
+    _worker_threads = threads
+    _worker_queue = progress_queue
+
+
+def _render_job(item_no, output):
+    def progress_callback(percentage=None, message=""):
+        _worker_queue.put((item_no, percentage, message))
+
+    watchdog = _worker_watchdog
+    if watchdog:
+        watchdog.begin()
+    try:
+        if isinstance(output, list):
+            # Kilka wariantów (ścieżka, profil) z jednego dekodowania
+            return _worker_merger.merge_outputs(output, item_no, progress_callback, threads=_worker_threads)
+        return _worker_merger.merge_videos(output, item_no, progress_callback, threads=_worker_threads)
+    except KeyboardInterrupt:
+        if not watchdog or watchdog.exceeded_mb is None:
+            raise
+        message = f"Memory limit exceeded ({watchdog.exceeded_mb:.0f} MB > {watchdog.limit_mb} MB), render cancelled."
+        print(f"ERROR [{item_no}]: {message}")
+        return False, message
+    except Exception as e:
+        traceback.print_exc()
+        return False, f"Error during video merging: {str(e)}"
+    finally:
+        if watchdog:
+            watchdog.end()
+
+
+def render_parallel(full_clips, jobs, progress_callback=None, workers=None, memory_limit_mb=None,
+                    render_engine="moviepy", concat_method="copy", output_profile=None, profiles=None,
+                    collect_metrics=None):
+    """
+    Renderuje listę zadań [(item_no, output_path), ...] w puli procesów; zamiast ścieżki
+    zadanie może mieć listę wariantów [(output_path, profil), ...] (VideoMerger.merge_outputs).
+
+    `progress_callback` ma ten sam kontrakt co w VideoMerger.merge_videos
+    (percentage=None, message=""); komunikaty są poprzedzone indeksem zadania.
+    Zwraca listę krotek (item_no, success, message) w kolejności zadań.
+    """
+    if not jobs:
+        return []
+
+    workers, threads = plan_workers(len(jobs), workers, memory_limit_mb=memory_limit_mb)
+    print(f"Renderowanie równoległe: {workers} proces(y) x {threads} wątk(i) enkodera")
+
+    results = {}
+    with Manager() as manager:
+        progress_queue = manager.Queue()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(full_clips, threads, memory_limit_mb, progress_queue,
+                                           render_engine, concat_method, output_profile,
+                                           profiles, collect_metrics)) as executor:
+            futures = {executor.submit(_render_job, item_no, output_path): item_no
+                       for item_no, output_path in jobs}
+            pending = set(futures)
+
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                _drain_progress(progress_queue, progress_callback)
+                for future in done:
+                    item_no = futures[future]
+                    try:
+                        success, message = future.result()
+                    except Exception as e:
+                        # np. proces roboczy został zabity przez system
+                        success, message = False, f"Error during video merging: {str(e)}"
+                    results[item_no] = (item_no, success, message)
+                    if progress_callback:
+                        progress_callback(percentage=None, message=f"[{item_no}] {message}")
+
+            _drain_progress(progress_queue, progress_callback)
+
+    return [results[item_no] for item_no, _ in jobs]
+
+
+def _drain_progress(progress_queue, progress_callback):
+    while True:
+        try:
+            item_no, percentage, message = progress_queue.get_nowait()
+        except queue.Empty:
+            return
+        if progress_callback:
+            progress_callback(percentage=percentage, message=f"[{item_no}] {message}")
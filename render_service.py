@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Video Merger - local render service (HTTP/JSON API).
+
+Accepts render requests from other tools and queues them onto the persistent
+render job queue (job_queue), e.g.:
+
+    python render_service.py --port 8765 --workers 2
+
+    curl -X POST localhost:8765/jobs -d '{"item_no": "10400", "clips": [{"path": "film.mp4", "texts": []}]}'
+    curl localhost:8765/jobs/1/progress
+
+Endpoints:
+    GET  /health                stan usługi i liczba zadań w każdym stanie
+    GET  /profiles              dostępne profile wyjścia
+    POST /jobs                  nowe zadanie: item_no, clips (klipy użytkownika), opcjonalnie
+                                template (nazwa z katalogu templates albo "default"), profile,
+                                output_path (w --output-dir, domyślnie {item_no}.mp4), metrics
+                                (true - raport czasów etapów {item_no}.metrics.json obok filmu)
+    GET  /jobs[?state=queued]   lista zadań (bez list klipów)
+    GET  /jobs/<id>             zadanie
+    GET  /jobs/<id>/progress    stan, procent i ostatni komunikat zadania
+"""
+
+import argparse
+import json
+import os
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import data_load
+import job_queue
+import output_profiles
+from template_manager import TemplateManager
+from video_merger import CONCAT_COPY, CONCAT_STREAM, ENGINE_MOVIEPY, ENGINE_FFMPEG
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+TEMPLATES_DIR = "templates"
+DEFAULT_TEMPLATE = "template.json"
+MAX_REQUEST_BYTES = 1024 * 1024
+
+_JOB_PATH = re.compile(r"^/jobs/(\d+)(/progress)?$")
+_TEMPLATE_NAME = re.compile(r"^[\w\-. ]+$")
+
+
+class BadRequest(Exception):
+    """Błędne zlecenie - odpowiedź 400 z komunikatem."""
+
+
+class RenderService:
+    """Zamiana zleceń JSON na zadania kolejki renderu; wątki robocze działają w tym procesie."""
+
+    def __init__(self, render_queue, output_dir=".", templates_dir=TEMPLATES_DIR, render_engine=ENGINE_MOVIEPY,
+                 concat_method=CONCAT_COPY):
+        self.queue = render_queue
+        self.output_dir = output_dir
+        self.templates_dir = templates_dir
+        self.render_engine = render_engine
+        self.concat_method = concat_method
+
+    def template_path(self, name):
+        if not name or name == "default":
+            return DEFAULT_TEMPLATE
+        if not _TEMPLATE_NAME.match(name) or name.startswith('.'):
+            raise BadRequest(f"Invalid template name: {name}")
+        path = os.path.join(self.templates_dir, name if name.endswith('.json') else f"{name}.json")
+        if not os.path.exists(path):
+            raise BadRequest(f"Unknown template: {name}")
+        return path
+
+    def load_template(self, name):
+        """Szablon (pre_clips, post_clips, profile) - przy braku pliku domyślnego pusty."""
+        success, result = TemplateManager(self.template_path(name)).load_template()
+        if not success:
+            if name and name != "default":
+                raise BadRequest(result)
+            result = {"pre_clips": [], "post_clips": []}
+        return result
+
+    def output_path(self, path):
+        """
+        Ścieżka pliku wynikowego w katalogu wyjściowym usługi (ścieżki względne - względem niego).
+        Zlecenia nie mogą tworzyć ani nadpisywać plików poza --output-dir.
+        """
+        if not isinstance(path, str):
+            raise BadRequest("'output_path' must be a string.")
+        base = os.path.realpath(self.output_dir)
+        resolved = os.path.realpath(os.path.join(base, path))
+        if resolved == base or os.path.commonpath([base, resolved]) != base:
+            raise BadRequest(f"'output_path' must be inside the output directory: {path}")
+        return resolved
+
+    def submit(self, request):
+        if not isinstance(request, dict):
+            raise BadRequest("Request body must be a JSON object.")
+        item_no = str(request.get('item_no') or '').strip()
+        if not item_no:
+            raise BadRequest("Missing 'item_no'.")
+        clips = request.get('clips', [])
+        if not isinstance(clips, list) or not all(isinstance(c, dict) and c.get('path') for c in clips):
+            raise BadRequest("'clips' must be a list of objects with a 'path'.")
+
+        template = self.load_template(request.get('template'))
+        full_clips = template['pre_clips'] + clips + template['post_clips']
+        if not full_clips:
+            raise BadRequest("Nothing to render: the template and the clip list are empty.")
+
+        template_profiles = template.get('output_profiles')
+        profile = request.get('profile') or template.get('output_profile')
+        try:
+            output_profiles.get_profile(profile, output_profiles.load_profiles(template_profiles))
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+        output_path = self.output_path(request.get('output_path') or f"{item_no}.mp4")
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        options = {'template_profiles': template_profiles, 'render_engine': self.render_engine,
+                   'concat_method': self.concat_method, 'collect_metrics': request.get('metrics')}
+        job_id = self.queue.submit(item_no, output_path, full_clips, profile, options)
+        return self.queue.store.get(job_id)
+
+
+def job_summary(job):
+    """Zadanie bez list klipów i opcji - do odpowiedzi API."""
+    return {key: value for key, value in job.items() if key not in ('clips', 'options')}
+
+
+def job_progress(job):
+    return {'id': job['id'], 'state': job['state'], 'progress': job['progress'], 'message': job['message']}
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    service = None  # RenderService - ustawiany przez make_server
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send_json(status, {'error': message})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        store = self.service.queue.store
+        if url.path == "/health":
+            counts = {}
+            for job in store.list_jobs():
+                counts[job['state']] = counts.get(job['state'], 0) + 1
+            return self._send_json(200, {'status': 'ok', 'jobs': counts})
+        if url.path == "/profiles":
+            return self._send_json(200, output_profiles.load_profiles())
+        if url.path == "/jobs":
+            state = parse_qs(url.query).get('state', [None])[0]
+            return self._send_json(200, [job_summary(job) for job in store.list_jobs(state)])
+
+        match = _JOB_PATH.match(url.path)
+        if not match:
+            return self._error(404, f"Not found: {url.path}")
+        job = store.get(int(match.group(1)))
+        if job is None:
+            return self._error(404, f"Unknown job: {match.group(1)}")
+        return self._send_json(200, job_progress(job) if match.group(2) else job_summary(job))
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/jobs":
+            return self._error(404, f"Not found: {self.path}")
+        try:
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                raise BadRequest("Invalid Content-Length.")
+            if length < 0:
+                raise BadRequest("Invalid Content-Length.")
+            if length > MAX_REQUEST_BYTES:
+                raise BadRequest("Request body too large.")
+            try:
+                request = json.loads(self.rfile.read(length) or b'null')
+            except ValueError as e:
+                raise BadRequest(f"Invalid JSON: {e}")
+            job = self.service.submit(request)
+        except BadRequest as e:
+            return self._error(400, str(e))
+        except Exception as e:
+            print(f"ERROR podczas przyjmowania zadania: {e}")
+            return self._error(500, str(e))
+        self._send_json(201, job_summary(job))
+
+    def log_message(self, format, *args):
+        print(f"[render_service] {self.address_string()} - {format % args}")
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    handler = type("BoundRenderRequestHandler", (RenderRequestHandler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local render service with an HTTP/JSON API.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default {DEFAULT_PORT})")
+    parser.add_argument("--workers", type=int, default=1, help="number of render worker threads")
+    parser.add_argument("--output-dir", default=".", help="directory for output files; requested output paths must stay inside it")
+    parser.add_argument("--templates-dir", default=TEMPLATES_DIR, help="directory with named templates")
+    parser.add_argument("--db", default=job_queue.JOBS_DB, help="render job database")
+    parser.add_argument("--engine", choices=[ENGINE_MOVIEPY, ENGINE_FFMPEG], default=ENGINE_MOVIEPY,
+                        help="render engine (ffmpeg falls back to moviepy for unsupported templates)")
+    parser.add_argument("--concat", choices=[CONCAT_COPY, CONCAT_STREAM], default=CONCAT_COPY,
+                        help="moviepy engine: join encoded segments with -c copy or stream frames into one encoder")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Katalog produktów ładujemy raz przy starcie - wszystkie zadania korzystają z tej samej instancji
+    try:
+        data_load.get_catalog().load()
+    except Exception as e:
+        print(f"Ostrzeżenie: nie udało się wczytać katalogu produktów: {e}")
+
+    render_queue = job_queue.RenderQueue(job_queue.JobStore(args.db), workers=max(1, args.workers),
+                                        owner=job_queue.OWNER_SERVICE)
+    render_queue.start()
+    service = RenderService(render_queue, args.output_dir, args.templates_dir, args.engine, args.concat)
+    server = make_server(service, args.host, args.port)
+    print(f"Usługa renderu nasłuchuje na http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
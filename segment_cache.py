@@ -0,0 +1,98 @@
+# segment_cache.py
+
+"""
+Cache zakodowanych segmentów wideo adresowany zawartością.
+
+Klucz segmentu to odcisk segmentu z planu renderu - SHA-1 z opisu jego wejść
+(plik źródłowy, mtime, rozmiar, czas trwania, rozwiązane napisy z pozycjami,
+rozdzielczość docelowa, parametry kodowania), więc zmiana dowolnego z nich
+daje nowy plik, a stary po prostu przestaje być używany.
+"""
+
+import os
+import uuid
+
+SEGMENT_CACHE_DIR = "segment_cache"
+SEGMENT_WORK_DIR_SUFFIX = ".segments"
+
+
+def file_identity(path):
+    """Tożsamość pliku źródłowego: ścieżka, mtime i rozmiar."""
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def segment_work_dir(output_path):
+    """Katalog roboczy segmentów filmu - obok pliku wynikowego, np. film.mp4 -> film.segments."""
+    return os.path.splitext(output_path)[0] + SEGMENT_WORK_DIR_SUFFIX
+
+
+class SegmentCache:
+    def __init__(self, cache_dir=SEGMENT_CACHE_DIR, extension=".mp4"):
+        self.cache_dir = cache_dir
+        self.extension = extension
+
+    def key_for(self, segment):
+        """Klucz segmentu planu renderu - jego odcisk (render_plan.segment_fingerprint)."""
+        return segment['fingerprint']
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + self.extension)
+
+    def get(self, key):
+        """Ścieżka do gotowego segmentu albo None, jeśli nie ma go w cache."""
+        path = self.path_for(key)
+        return path if os.path.exists(path) else None
+
+    def temp_path_for(self, key):
+        """
+        Ścieżka tymczasowa do zapisu segmentu - po zapisie wywołaj store(). Unikalna także
+        między wątkami jednego procesu (np. kilka zadań usługi renderu koduje ten sam segment).
+        """
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{os.path.splitext(path)[0]}.{os.getpid()}.{uuid.uuid4().hex}.tmp{self.extension}"
+
+    def store(self, key, temp_path):
+        # Atomowa podmiana - równoległe procesy nigdy nie widzą niedokończonego pliku
+        path = self.path_for(key)
+        os.replace(temp_path, path)
+        return path
+
+    def keys(self):
+        if not os.path.isdir(self.cache_dir):
+            return set()
+        found = set()
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if name.endswith(self.extension) and '.tmp' not in name:
+                    found.add(name[:-len(self.extension)])
+        return found
+
+    def prune(self, keep_keys):
+        """
+        Usuwa segmenty spoza `keep_keys` (np. nieaktualne wersje klipów z katalogu roboczego
+        filmu) oraz pliki tymczasowe innych procesów - pozostałości po przerwanym renderze.
+        """
+        removed = 0
+        for key in self.keys() - set(keep_keys):
+            try:
+                os.remove(self.path_for(key))
+                removed += 1
+            except OSError:
+                pass
+        own_marker = f".{os.getpid()}."
+        for prefix in (os.listdir(self.cache_dir) if os.path.isdir(self.cache_dir) else []):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if '.tmp' in name and own_marker not in name:
+                    try:
+                        os.remove(os.path.join(prefix_dir, name))
+                    except OSError:
+                        pass
+        return removed
@@ -5,12 +5,20 @@ class TemplateManager:
     def __init__(self, template_file="template.json"):
         self.template_file = template_file
 
+    # Klucze szablonu poza klipami (profile wyjścia), zachowywane przy zapisie klipów
+    SETTINGS_KEYS = ("output_profiles", "output_profile")
+
     def save_template(self, pre_clips, post_clips):
         """Save the pre and post clips as a default template to a JSON file."""
         template_data = {
             "pre_clips": pre_clips,
             "post_clips": post_clips
         }
+        success, current = self.load_template()
+        if success:
+            for key in self.SETTINGS_KEYS:
+                if key in current:
+                    template_data[key] = current[key]
         try:
             with open(self.template_file, 'w') as f:
                 json.dump(template_data, f, indent=4)
@@ -31,7 +39,11 @@ class TemplateManager:
                     post_clips = template_data.get("post_clips", [])
                     if not (isinstance(pre_clips, list) and isinstance(post_clips, list)):
                         return False, "Invalid template format: pre_clips and post_clips must be lists."
-                    return True, {"pre_clips": pre_clips, "post_clips": post_clips}
+                    result = {"pre_clips": pre_clips, "post_clips": post_clips}
+                    for key in self.SETTINGS_KEYS:
+                        if key in template_data:
+                            result[key] = template_data[key]
+                    return True, result
             return False, "No template found."
         except Exception as e:
             return False, f"Error loading template: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,8 @@
+# conftest.py
+
+"""Moduły aplikacji leżą w katalogu głównym repozytorium (bez pakietu)."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,55 @@
+import pandas as pd
+
+import data_load
+from data_load import ProductCatalog, resolve_placeholders
+
+DATA_MAP = {
+    "{INDEKS}": "10400",
+    "{NAZWA_PL}": "Krzesło",
+    "{NAZWA_EN}": "Chair",
+    "{OPIS}": "Dębowe krzesło {INDEKS}",
+    "{MATERIALY}": "dąb",
+}
+
+
+def test_all_placeholders_are_replaced():
+    assert resolve_placeholders("{INDEKS} - {NAZWA_PL} / {NAZWA_EN} ({MATERIALY})", DATA_MAP) == \
+        "10400 - Krzesło / Chair (dąb)"
+
+
+def test_placeholders_are_case_insensitive():
+    assert resolve_placeholders("{indeks} {Nazwa_Pl}", DATA_MAP) == "10400 Krzesło"
+
+
+def test_values_are_not_resolved_again():
+    # Jeden przebieg - symbol w opisie z bazy zostaje dosłownie
+    assert resolve_placeholders("{OPIS}", DATA_MAP) == "Dębowe krzesło {INDEKS}"
+
+
+def test_unknown_braces_and_missing_values_stay():
+    assert resolve_placeholders("{CENA} {OPIS}", {"{INDEKS}": "1"}) == "{CENA} {OPIS}"
+    assert resolve_placeholders("{INDEKS}", {}) == "{INDEKS}"
+    assert resolve_placeholders("bez symboli", DATA_MAP) == "bez symboli"
+
+
+def test_non_string_values_are_converted():
+    assert resolve_placeholders("{INDEKS}", {"{INDEKS}": 10400}) == "10400"
+
+
+def test_placeholder_map_from_catalog(monkeypatch):
+    catalog = ProductCatalog("unused.xlsx")
+    catalog._ensure_loaded = lambda: None
+    catalog._build_indexes({
+        "Indeksy": pd.DataFrame({"Item No_": ["10400", "10400"], "DescriptionPL": ["Krzesło", "dębowe"],
+                                 "DescriptionENU": ["Oak", "chair"], "Assortment Card No_": ["K1", "K1"]}),
+        "Opisy": pd.DataFrame({"Assortment Card No_": ["K1"], "Opis Indeksu": ["Solidne"]}),
+        "Materialy": pd.DataFrame({"Assortment Card No_": ["K2"], "Material": ["buk"]}),
+    })
+    monkeypatch.setattr(data_load, "_catalog", catalog)
+
+    data_map = data_load.build_placeholder_map("10400")
+    assert data_map["{NAZWA_PL}"] == "Krzesło dębowe"
+    assert data_map["{NAZWA_EN}"] == "Oak chair"
+    assert data_map["{OPIS}"] == "Solidne"
+    assert data_map["{MATERIALY}"] == "nie znaleziono materiału w bazie"
+    assert data_load.build_placeholder_map("99999")["{NAZWA_PL}"] == "Nie znaleziono produktu"
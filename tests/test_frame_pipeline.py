@@ -0,0 +1,81 @@
+import threading
+
+import numpy as np
+import pytest
+
+from frame_pipeline import FramePipeline
+
+SHAPE = (4, 4, 3)
+
+
+def frames(count, composite=None):
+    for i in range(count):
+        yield np.full(SHAPE, i, dtype=np.uint8), i / 30, composite
+
+
+def test_writes_every_frame_in_order():
+    written = []
+    count = FramePipeline(SHAPE, lambda frame: written.append(int(frame[0, 0, 0]))).run(frames(20))
+    assert count == 20
+    assert written == list(range(20))
+
+
+def test_composite_result_goes_to_writer():
+    def composite(buffer, t):
+        buffer += 1
+        return buffer.copy()
+
+    written = []
+    FramePipeline(SHAPE, lambda frame: written.append(int(frame[0, 0, 0]))).run(frames(5, composite))
+    assert written == [1, 2, 3, 4, 5]
+
+
+def test_decode_error_is_raised_and_source_closed():
+    class Source:
+        closed = False
+
+        def __iter__(self):
+            yield from frames(3)
+            raise ValueError("uszkodzony plik")
+
+        def close(self):
+            self.closed = True
+
+    source = Source()
+    with pytest.raises(ValueError, match="uszkodzony plik"):
+        FramePipeline(SHAPE, lambda frame: None).run(source)
+    assert source.closed
+
+
+def test_composite_error_stops_all_stages():
+    def composite(buffer, t):
+        raise RuntimeError("zły napis")
+
+    with pytest.raises(RuntimeError, match="zły napis"):
+        FramePipeline(SHAPE, lambda frame: None).run(frames(1000, composite))
+    assert threading.active_count() == 1
+
+
+def test_writer_error_stops_all_stages():
+    def write_frame(frame):
+        raise OSError("Broken pipe")
+
+    with pytest.raises(OSError):
+        FramePipeline(SHAPE, write_frame).run(frames(1000))
+    assert threading.active_count() == 1
+
+
+def test_keyboard_interrupt_shuts_down_threads():
+    def write_frame(frame):
+        if frame[0, 0, 0] == 2:
+            raise KeyboardInterrupt
+
+    def endless():
+        i = 0
+        while True:
+            yield np.full(SHAPE, i % 250, dtype=np.uint8), i / 30, None
+            i += 1
+
+    with pytest.raises(KeyboardInterrupt):
+        FramePipeline(SHAPE, write_frame).run(endless())
+    assert threading.active_count() == 1
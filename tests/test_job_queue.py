@@ -0,0 +1,88 @@
+import sqlite3
+
+import job_queue
+from job_queue import JobStore
+
+CLIPS = [{'path': 'a.mp4', 'texts': [], 'image_duration': None}]
+
+
+def make_store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def interrupt(store, job_id):
+    store.update(job_id, heartbeat_at=0)
+
+
+def test_claim_takes_oldest_queued_job_once(tmp_path):
+    store = make_store(tmp_path)
+    first = store.submit("1", "1.mp4", CLIPS)
+    second = store.submit("2", "2.mp4", CLIPS)
+
+    job = store.claim_next()
+    assert job['id'] == first
+    assert job['state'] == job_queue.STATE_RUNNING and job['attempts'] == 1
+    assert store.claim_next()['id'] == second
+    assert store.claim_next() is None
+
+
+def test_claim_respects_owner(tmp_path):
+    store = make_store(tmp_path)
+    gui_job = store.submit("1", "1.mp4", CLIPS, owner=job_queue.OWNER_GUI)
+    service_job = store.submit("2", "2.mp4", CLIPS, owner=job_queue.OWNER_SERVICE)
+
+    assert store.claim_next(job_queue.OWNER_SERVICE)['id'] == service_job
+    assert store.claim_next(job_queue.OWNER_SERVICE) is None
+    assert store.claim_next(job_queue.OWNER_GUI)['id'] == gui_job
+
+
+def test_recover_requeues_only_stale_jobs(tmp_path):
+    store = make_store(tmp_path)
+    stale = store.submit("1", "1.mp4", CLIPS)
+    fresh = store.submit("2", "2.mp4", CLIPS)
+    store.claim_next()
+    store.claim_next()
+    interrupt(store, stale)
+
+    assert store.recover_interrupted() == 1
+    assert store.get(stale)['state'] == job_queue.STATE_QUEUED
+    assert store.get(fresh)['state'] == job_queue.STATE_RUNNING
+    assert store.claim_next()['attempts'] == 2
+
+
+def test_recover_respects_owner(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.submit("1", "1.mp4", CLIPS, owner=job_queue.OWNER_GUI)
+    store.claim_next()
+    interrupt(store, job_id)
+
+    assert store.recover_interrupted(owner=job_queue.OWNER_SERVICE) == 0
+    assert store.recover_interrupted(owner=job_queue.OWNER_GUI) == 1
+
+
+def test_job_interrupted_too_often_fails(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.submit("1", "1.mp4", CLIPS)
+    for _ in range(job_queue.MAX_ATTEMPTS):
+        store.claim_next()
+        interrupt(store, job_id)
+        store.recover_interrupted()
+
+    job = store.get(job_id)
+    assert job['state'] == job_queue.STATE_FAILED
+    assert job['attempts'] == job_queue.MAX_ATTEMPTS
+    assert store.claim_next() is None
+
+
+def test_old_database_gets_owner_column(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute(job_queue._SCHEMA.replace("    owner TEXT,\n", ""))
+    conn.execute("INSERT INTO jobs (output_path, clips, options, state, created_at) VALUES ('x.mp4', '[]', '{}', ?, 0)",
+                 (job_queue.STATE_QUEUED,))
+    conn.commit()
+    conn.close()
+
+    store = JobStore(path)
+    # Zadanie sprzed kolumny owner może pobrać każda kolejka
+    assert store.claim_next(job_queue.OWNER_SERVICE)['owner'] is None
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import output_profiles
+from output_profiles import crop_box, get_profile, load_profiles, output_size
+
+
+def profile(name):
+    return get_profile(name, load_profiles(profiles_file=None))
+
+
+def test_default_profile_keeps_clip_size():
+    assert output_size(profile("default"), [1080, 1920]) == [1080, 1920]
+
+
+def test_fixed_size_profile():
+    assert output_size(profile("social"), [1080, 1920]) == [720, 1280]
+
+
+def test_scaled_size_is_even():
+    size = output_size(profile("draft"), [1080, 1920])
+    assert size == [356, 634]
+    assert all(side % 2 == 0 for side in size)
+
+
+def test_scaled_size_never_collapses():
+    assert output_size({'scale': 0.001}, [100, 100]) == [2, 2]
+
+
+def test_stretch_uses_whole_frame():
+    assert crop_box((1080, 1920), (1080, 1080), "stretch") == (0, 0, 1080, 1920)
+
+
+def test_crop_tall_frame_to_square_takes_middle():
+    assert crop_box((1080, 1920), (1080, 1080), "crop") == (0, 420, 1080, 1500)
+
+
+def test_crop_tall_frame_to_horizontal():
+    x1, y1, x2, y2 = crop_box((1080, 1920), (1920, 1080), "crop")
+    assert (x1, x2) == (0, 1080)
+    assert y2 - y1 == round(1080 * 1080 / 1920)
+    assert y1 == (1920 - (y2 - y1)) // 2
+
+
+def test_crop_wide_frame_to_vertical():
+    x1, y1, x2, y2 = crop_box((1920, 1080), (1080, 1920), "crop")
+    assert (y1, y2) == (0, 1080)
+    assert x2 - x1 == round(1080 * 1080 / 1920)
+
+
+def test_profiles_are_completed_from_default():
+    square = profile("square")
+    assert square['audio_codec'] == "aac"
+    assert output_profiles.encode_params(square)['fps'] == 30
+
+
+def test_template_and_file_profiles_override_builtin(tmp_path):
+    profiles_file = tmp_path / "output_profiles.json"
+    profiles_file.write_text(json.dumps({"final": {"crf": 20}, "story": {"size": [540, 960]}}))
+    profiles = load_profiles({"final": {"preset": "medium"}}, str(profiles_file))
+    final = get_profile("final", profiles)
+    assert (final['crf'], final['preset'], final['size']) == (20, "medium", [1080, 1920])
+    assert get_profile("story", profiles)['size'] == [540, 960]
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        profile("cinema")
@@ -0,0 +1,23 @@
+from render_metrics import RenderMetrics
+
+
+def test_report_separates_output_and_encoded_frames():
+    metrics = RenderMetrics()
+    try:
+        metrics.add("write", 2.0, clip=None)
+        metrics.add_frames(30)
+        metrics.add_frames(30)
+        # 90 klatek w pliku, 30 z nich z segmentu w cache
+        report = metrics.report("film.mp4", True, "ok", frames=90)
+    finally:
+        metrics.close()
+    assert report['frames'] == 90
+    assert report['encoded_frames'] == 60
+    assert report['encode_fps'] == 30.0
+
+
+def test_report_defaults_to_encoded_frames():
+    metrics = RenderMetrics()
+    metrics.close()
+    metrics.add_frames(12)
+    assert metrics.report("film.mp4", True, "ok")['frames'] == 12
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+from PIL import Image
+
+import output_profiles
+import render_plan
+
+ENCODE = {'fps': 30, 'codec': 'libx264'}
+
+
+@pytest.fixture
+def board(tmp_path):
+    path = tmp_path / "board.png"
+    Image.new("RGB", (200, 400), (10, 20, 30)).save(path)
+    return str(path)
+
+
+def clip(path, texts=()):
+    return {'path': path, 'is_image': True, 'image_duration': 2, 'texts': list(texts)}
+
+
+def text(value, **config):
+    return {'text': value, 'config': dict({'fontsize': 20, 'movement': 'static', 'position': [0.5, 0.5]}, **config)}
+
+
+def resolve(item_no):
+    return lambda clip_data: [(t['text'].replace('{indeks}', item_no), t['config']) for t in clip_data['texts']]
+
+
+def text_size(value, config):
+    if not config.get('color', 'white'):
+        raise ValueError("unknown color")
+    return len(value) * 10, config['fontsize']
+
+
+def compile_plan(clips, item_no="10400", **kwargs):
+    kwargs.setdefault('text_backend', 'pillow')
+    return render_plan.compile_plan(clips, item_no, resolve(item_no), text_size, ENCODE, **kwargs)
+
+
+def fingerprints(plan):
+    return [segment['fingerprint'] for segment in plan['segments']]
+
+
+def test_same_inputs_give_the_same_fingerprints(board):
+    clips = [clip(board, [text("{indeks}")])]
+    assert fingerprints(compile_plan(clips)) == fingerprints(compile_plan(clips))
+
+
+def test_item_text_changes_only_item_dependent_segments(board):
+    clips = [clip(board), clip(board, [text("{indeks}")])]
+    first, second = compile_plan(clips, "10400"), compile_plan(clips, "10401")
+    assert first['segments'][0]['item_invariant'] and not first['segments'][1]['item_invariant']
+    assert fingerprints(first)[0] == fingerprints(second)[0]
+    assert fingerprints(first)[1] != fingerprints(second)[1]
+
+
+def test_text_backend_and_encoding_invalidate_segments(board):
+    clips = [clip(board, [text("stały")])]
+    base = fingerprints(compile_plan(clips))
+    assert fingerprints(compile_plan(clips, text_backend='imagemagick')) != base
+    assert fingerprints(render_plan.compile_plan(clips, "10400", resolve("10400"), text_size,
+                                                 dict(ENCODE, crf=30), text_backend='pillow')) != base
+
+
+def test_source_change_invalidates_segment(board):
+    clips = [clip(board)]
+    before = fingerprints(compile_plan(clips))
+    Image.new("RGB", (200, 400), (200, 0, 0)).save(board)
+    os.utime(board, (1, 1))
+    assert fingerprints(compile_plan(clips)) != before
+
+
+def test_overlay_position_in_pixels(board):
+    plan = compile_plan([clip(board, [text("abcd", alignment='center')])])
+    overlay = plan['segments'][0]['overlays'][0]
+    assert plan['final_size'] == [200, 400]
+    assert (overlay['x'], overlay['y']) == (100 - 20, 200 - 10)
+
+
+def test_clip_with_failing_text_is_skipped(board, capsys):
+    plan = compile_plan([clip(board, [text("zły", color="")]), clip(board)])
+    assert [segment['index'] for segment in plan['segments']] == [1]
+    assert "ERROR processing clip" in capsys.readouterr().out
+
+
+def test_missing_clip_is_skipped(board, tmp_path):
+    plan = compile_plan([clip(str(tmp_path / "missing.png")), clip(board)])
+    assert [segment['index'] for segment in plan['segments']] == [1]
+
+
+def test_profile_scales_output_and_text(board):
+    profile = output_profiles.get_profile('draft', output_profiles.load_profiles())
+    plan = compile_plan([clip(board, [text("abc")])], profile=profile)
+    assert plan['final_size'] == output_profiles.output_size(profile, [200, 400])
+    assert plan['segments'][0]['overlays'][0]['config']['fontsize'] == round(20 * plan['layout_scale'])
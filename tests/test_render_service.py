@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from render_service import BadRequest, RenderService
+
+
+@pytest.fixture
+def service(tmp_path):
+    return RenderService(render_queue=None, output_dir=str(tmp_path))
+
+
+def test_relative_path_is_resolved_inside_output_dir(service, tmp_path):
+    assert service.output_path("wyniki/10400.mp4") == os.path.join(os.path.realpath(tmp_path), "wyniki", "10400.mp4")
+
+
+def test_absolute_path_inside_output_dir_is_allowed(service, tmp_path):
+    path = os.path.join(os.path.realpath(tmp_path), "10400.mp4")
+    assert service.output_path(path) == path
+
+
+@pytest.mark.parametrize("path", ["../10400.mp4", "wyniki/../../10400.mp4", "/etc/passwd", ".", ""])
+def test_paths_outside_output_dir_are_rejected(service, path):
+    with pytest.raises(BadRequest):
+        service.output_path(path)
+
+
+def test_symlink_out_of_output_dir_is_rejected(service, tmp_path_factory, tmp_path):
+    outside = tmp_path_factory.mktemp("outside")
+    os.symlink(outside, tmp_path / "link")
+    with pytest.raises(BadRequest):
+        service.output_path("link/10400.mp4")
+
+
+def test_non_string_path_is_rejected(service):
+    with pytest.raises(BadRequest):
+        service.output_path(["10400.mp4"])
@@ -0,0 +1,39 @@
+import os
+
+from segment_cache import SegmentCache
+
+KEY = "ab" + "0" * 38
+
+
+def test_temp_paths_are_unique_within_a_process(tmp_path):
+    cache = SegmentCache(str(tmp_path))
+    first, second = cache.temp_path_for(KEY), cache.temp_path_for(KEY)
+    assert first != second
+    assert os.path.dirname(first) == os.path.dirname(cache.path_for(KEY))
+
+
+def test_store_publishes_segment(tmp_path):
+    cache = SegmentCache(str(tmp_path))
+    temp_path = cache.temp_path_for(KEY)
+    with open(temp_path, 'wb') as f:
+        f.write(b"segment")
+    assert cache.get(KEY) is None
+    assert cache.store(KEY, temp_path) == cache.path_for(KEY)
+    assert cache.get(KEY) == cache.path_for(KEY)
+    assert cache.keys() == {KEY}
+
+
+def test_prune_keeps_own_temp_files_and_removes_foreign_ones(tmp_path):
+    cache = SegmentCache(str(tmp_path))
+    own = cache.temp_path_for(KEY)
+    foreign = os.path.join(os.path.dirname(own), f"{KEY}.999999999.0f0f.tmp.mp4")
+    stale_key = "cd" + "1" * 38
+    stale = cache.temp_path_for(stale_key)
+    for path in (own, foreign, stale):
+        open(path, 'wb').close()
+    cache.store(stale_key, stale)
+
+    assert cache.prune(keep_keys=[]) == 1
+    assert os.path.exists(own)
+    assert not os.path.exists(foreign)
+    assert cache.keys() == set()
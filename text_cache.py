@@ -0,0 +1,143 @@
+# text_cache.py
+
+"""
+Cache wyrenderowanych napisów (bitmapy RGBA).
+
+Ten sam napis (np. 'vive.com' albo nazwa produktu na kilku klipach) jest
+rasteryzowany tylko raz. Poziom w pamięci to LRU, poziom na dysku to pliki .npy
+przetrwające restart aplikacji i współdzielone przez procesy batcha. Poziom dyskowy
+ma limit rozmiaru (max_disk_mb): napisy zależne od indeksu (nazwy, opisy) przybywają
+z każdym produktem, więc po przekroczeniu limitu usuwane są najdawniej używane pliki.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+TEXT_CACHE_DIR = "text_cache"
+MAX_DISK_MB = 512
+# Po przekroczeniu limitu cache jest przycinany do tej części limitu (mniej częste przycinanie)
+PRUNE_TO = 0.8
+
+# Pola konfiguracji, od których zależy wygląd bitmapy (pozycja i czas jej nie zmieniają)
+KEY_FIELDS = ('font', 'fontsize', 'color', 'bg_color', 'background_opacity', 'wrap_width', 'alignment', 'opacity')
+
+
+class TextOverlayCache:
+    def __init__(self, max_items=256, cache_dir=TEXT_CACHE_DIR, max_disk_mb=MAX_DISK_MB):
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_mb * 1024 * 1024 if max_disk_mb else None
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # liczone przy pierwszym zapisie, potem aktualizowane
+
+    def key_for(self, text, config, extra=None):
+        description = {"text": text, "config": {field: config.get(field) for field in KEY_FIELDS}, "extra": extra}
+        payload = json.dumps(description, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npy")
+
+    def get(self, key):
+        """Bitmapa RGBA (uint8, HxWx4) albo None."""
+        with self._lock:
+            rgba = self._items.get(key)
+            if rgba is not None:
+                self._items.move_to_end(key)
+                return rgba
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                try:
+                    rgba = np.load(path)
+                except (OSError, ValueError) as e:
+                    print(f"Ostrzeżenie: uszkodzony plik cache napisu '{path}': {e}")
+                    return None
+                try:
+                    os.utime(path)  # czas użycia dla usuwania najdawniej używanych plików
+                except OSError:
+                    pass
+                self._remember(key, rgba)
+                return rgba
+        return None
+
+    def put(self, key, rgba):
+        self._remember(key, rgba)
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp.npy"
+                np.save(tmp_path, rgba)
+                os.replace(tmp_path, path)
+                self._account(os.path.getsize(path))
+            except OSError as e:
+                print(f"Ostrzeżenie: nie udało się zapisać cache napisu: {e}")
+
+    def _disk_files(self):
+        """[(czas użycia, rozmiar, ścieżka)] plików cache na dysku."""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".npy") and '.tmp' not in name:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _account(self, size):
+        if not self.max_disk_bytes:
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(entry[1] for entry in self._disk_files())
+            else:
+                self._disk_bytes += size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._disk_bytes = self.prune(int(self.max_disk_bytes * PRUNE_TO))
+
+    def prune(self, max_bytes):
+        """Usuwa najdawniej używane pliki, aż cache na dysku zmieści się w max_bytes; zwraca jego rozmiar."""
+        files = sorted(self._disk_files())
+        total = sum(entry[1] for entry in files)
+        for _, size, path in files:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        return total
+
+    def _remember(self, key, rgba):
+        with self._lock:
+            self._items[key] = rgba
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+_text_cache = None
+_text_cache_lock = threading.Lock()
+
+
+def get_text_cache():
+    """Współdzielony cache napisów (tworzony przy pierwszym użyciu)."""
+    global _text_cache
+    if _text_cache is None:
+        with _text_cache_lock:
+            if _text_cache is None:
+                _text_cache = TextOverlayCache()
+    return _text_cache
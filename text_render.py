@@ -0,0 +1,203 @@
+# text_render.py
+
+"""
+Backendy rasteryzacji napisów. Każdy backend zamienia tekst i jego konfigurację
+(font, fontsize, color, bg_color, wrap_width, alignment, opacity) na bitmapę RGBA (uint8, HxWx4).
+
+- "pillow" (domyślny): Pillow ImageFont/ImageDraw w tym samym procesie, bez ImageMagick.
+- "imagemagick": MoviePy TextClip, czyli osobny proces `magick` dla każdego napisu.
+
+Backend wybiera się zmienną środowiskową VIDEOM_TEXT_BACKEND albo parametrem VideoMerger.
+"""
+
+import os
+import traceback
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+# Domyślna instalacja ImageMagick na stanowiskach z Windows. Ustawiana tylko, jeśli istnieje,
+# żeby MoviePy importował się także na Linuksie (tam ImageMagick jest szukany w PATH).
+DEFAULT_IMAGEMAGICK_BINARY = r'C:\Program Files\ImageMagick-7.1.1-Q16\magick.exe'
+if 'IMAGEMAGICK_BINARY' not in os.environ and os.path.exists(DEFAULT_IMAGEMAGICK_BINARY):
+    os.environ['IMAGEMAGICK_BINARY'] = DEFAULT_IMAGEMAGICK_BINARY
+
+TEXT_BACKEND_ENV = "VIDEOM_TEXT_BACKEND"
+DEFAULT_TEXT_BACKEND = "pillow"
+
+# Odstęp tła od tekstu z każdej strony - tak jak w dotychczasowym on_color(size=(w + 20, h + 20))
+BACKGROUND_PADDING = 10
+
+# Nazwy fontów w stylu ImageMagick -> pliki fontów na Windows / Linux
+FONT_FILES = {
+    'arial-bold': ['arialbd.ttf', 'Arial Bold.ttf', 'LiberationSans-Bold.ttf', 'DejaVuSans-Bold.ttf'],
+    'arial': ['arial.ttf', 'Arial.ttf', 'LiberationSans-Regular.ttf', 'DejaVuSans.ttf'],
+}
+FALLBACK_FONT_FILES = ['DejaVuSans-Bold.ttf', 'DejaVuSans.ttf']
+
+
+def parse_color(color):
+    """Kolor jako krotka RGB - akceptuje nazwy ('white'), '#RRGGBB' i krotki."""
+    if isinstance(color, (tuple, list)):
+        return tuple(int(c) for c in color[:3])
+    return ImageColor.getrgb(color)[:3]
+
+
+class PillowTextRenderer:
+    name = "pillow"
+
+    def __init__(self):
+        self._fonts = {}
+
+    def _font(self, font_name, fontsize):
+        key = (font_name, fontsize)
+        if key not in self._fonts:
+            self._fonts[key] = self._load_font(font_name, fontsize)
+        return self._fonts[key]
+
+    def _load_font(self, font_name, fontsize):
+        candidates = [font_name, f"{font_name}.ttf"]
+        candidates += FONT_FILES.get(str(font_name).lower(), [])
+        candidates += FALLBACK_FONT_FILES
+        for candidate in candidates:
+            try:
+                return ImageFont.truetype(candidate, fontsize)
+            except (OSError, ValueError):
+                continue
+        print(f"Ostrzeżenie: nie znaleziono fontu '{font_name}', używam domyślnego fontu Pillow.")
+        return ImageFont.load_default()
+
+    def _wrap(self, text, font, wrap_width):
+        lines = []
+        for paragraph in text.split('\n'):
+            words = paragraph.split(' ')
+            line = ""
+            for word in words:
+                candidate = f"{line} {word}" if line else word
+                if line and font.getlength(candidate) > wrap_width:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = candidate
+            lines.append(line)
+        return lines
+
+    def render(self, text, config):
+        font = self._font(config.get('font', 'Arial-Bold'), int(config.get('fontsize', 50)))
+        wrap_width = config.get('wrap_width')
+        alignment = (config.get('alignment') or 'center').lower()
+
+        lines = self._wrap(text, font, wrap_width) if wrap_width else text.split('\n')
+        ascent, descent = font.getmetrics()
+        line_height = ascent + descent
+        line_widths = [int(np.ceil(font.getlength(line))) for line in lines]
+        width = int(wrap_width) if wrap_width else max(max(line_widths), 1)
+        height = max(line_height * len(lines), 1)
+
+        text_alpha = Image.new('L', (width, height), 0)
+        draw = ImageDraw.Draw(text_alpha)
+        for i, (line, line_width) in enumerate(zip(lines, line_widths)):
+            if alignment == 'left':
+                x = 0
+            elif alignment == 'right':
+                x = width - line_width
+            else:
+                x = (width - line_width) / 2
+            draw.text((x, i * line_height), line, fill=255, font=font)
+
+        alpha = np.asarray(text_alpha, dtype=np.float32) / 255.0
+        rgb = np.empty((height, width, 3), dtype=np.float32)
+        rgb[:] = parse_color(config.get('color', 'white'))
+
+        background_color = config.get('bg_color')
+        if background_color and background_color != "None":
+            try:
+                bg_rgb = np.array(parse_color(background_color), dtype=np.float32)
+                bg_alpha = float(config.get('background_opacity', 1.0))
+                padded = (height + 2 * BACKGROUND_PADDING, width + 2 * BACKGROUND_PADDING)
+                inner = (slice(BACKGROUND_PADDING, BACKGROUND_PADDING + height),
+                         slice(BACKGROUND_PADDING, BACKGROUND_PADDING + width))
+
+                out_rgb = np.empty(padded + (3,), dtype=np.float32)
+                out_rgb[:] = bg_rgb
+                out_alpha = np.full(padded, bg_alpha, dtype=np.float32)
+                # Tekst nałożony na tło (operator "over")
+                out_rgb[inner] = rgb * alpha[..., None] + out_rgb[inner] * (1 - alpha[..., None])
+                out_alpha[inner] = alpha + bg_alpha * (1 - alpha)
+                rgb, alpha = out_rgb, out_alpha
+            except ValueError as e:
+                print(f"Ostrzeżenie: Nie udało się ustawić koloru tła '{background_color}'. Błąd: {e}")
+
+        alpha = alpha * config.get('opacity', 0.8)
+        return np.dstack([np.round(rgb), np.round(alpha * 255)]).astype(np.uint8)
+
+
+class ImageMagickTextRenderer:
+    name = "imagemagick"
+
+    def render(self, text, config):
+        from moviepy.editor import TextClip
+
+        wrap_width = config.get('wrap_width')
+
+        align_raw = config.get('alignment', 'center')
+        align_map = {'left': 'west', 'center': 'center', 'right': 'east'}
+        align = align_map.get(align_raw.lower(), 'center')
+
+        textclip_kwargs = {
+            'txt': text,
+            'fontsize': config.get('fontsize', 50),
+            'color': config.get('color', 'white'),
+            'font': config.get('font', 'Arial-Bold'),
+            'align': align
+        }
+
+        if wrap_width:
+            textclip_kwargs['method'] = 'caption'
+            textclip_kwargs['size'] = (wrap_width, None)
+
+        txt_clip = TextClip(**textclip_kwargs)
+
+        background_color = config.get('bg_color')
+        if (background_color and background_color != "None"):
+            try:
+                # Jeśli kolor jest stringiem w formacie hex, konwertujemy go na krotkę RGB
+                rgb_color = background_color
+                if isinstance(background_color, str) and background_color.startswith('#'):
+                    hex_val = background_color.lstrip('#')
+                    if len(hex_val) == 6:
+                        rgb_color = tuple(int(hex_val[i:i + 2], 16) for i in (0, 2, 4))
+                    else:
+                        print(f"Ostrzeżenie: Nieprawidłowy format koloru hex: {background_color}. Oczekiwano #RRGGBB.")
+
+                txt_clip = txt_clip.on_color(
+                    size=(txt_clip.w + 2 * BACKGROUND_PADDING, txt_clip.h + 2 * BACKGROUND_PADDING),
+                    color=rgb_color,
+                    pos=('center', 'center'),
+                    col_opacity=config.get('background_opacity', 1.0)
+                )
+            except Exception as e:
+                print(f"Ostrzeżenie: Nie udało się ustawić koloru tła '{background_color}'. Błąd: {e}")
+                traceback.print_exc()
+
+        rgb = txt_clip.get_frame(0)
+        if txt_clip.mask is not None:
+            alpha = txt_clip.mask.get_frame(0)
+        else:
+            alpha = np.ones(rgb.shape[:2])
+        alpha = alpha * config.get('opacity', 0.8)
+        return np.dstack([rgb, np.round(alpha * 255)]).astype(np.uint8)
+
+
+TEXT_RENDERERS = {
+    PillowTextRenderer.name: PillowTextRenderer,
+    ImageMagickTextRenderer.name: ImageMagickTextRenderer,
+}
+
+
+def get_text_renderer(name=None):
+    """Tworzy backend po nazwie (domyślnie z VIDEOM_TEXT_BACKEND albo "pillow")."""
+    name = (name or os.environ.get(TEXT_BACKEND_ENV) or DEFAULT_TEXT_BACKEND).lower()
+    if name not in TEXT_RENDERERS:
+        raise ValueError(f"Unknown text backend '{name}'. Available: {', '.join(TEXT_RENDERERS)}")
+    return TEXT_RENDERERS[name]()
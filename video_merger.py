@@ -2,47 +2,105 @@
 
 import os
 
-os.environ['IMAGEMAGICK_BINARY'] = r'C:\Program Files\ImageMagick-7.1.1-Q16\magick.exe'
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, concatenate_videoclips, ImageClip
+import text_render  # ustawia ścieżkę ImageMagick (jeśli jest) przed importem MoviePy
+from moviepy.editor import VideoFileClip, CompositeVideoClip, concatenate_videoclips, ImageClip, AudioClip
+import json
 import math
-import re
+import shutil
+import tempfile
 import traceback
+import numpy as np
+import compositor
 import data_load  # NOWOŚĆ: Import modułu do ładowania danych
+import output_profiles
+import proxy_cache
+import ffmpeg_engine
+import ffmpeg_tools
+import frame_pipeline
+import multi_output
+import render_metrics
+import render_progress
+import render_plan
+import text_cache
+from segment_cache import SegmentCache, segment_work_dir
+
+# Parametry kodowania (fps, kodek, preset, CRF, audio) pochodzą z profilu wyjścia (output_profiles) -
+# segmenty łączone bez rekompresji muszą mieć identyczny kodek, fps i parametry audio.
+# Jawny format pikseli segmentów - przy łączeniu przez -c copy musi być wszędzie ten sam
+SEGMENT_FFMPEG_PARAMS = ['-pix_fmt', 'yuv420p']
+
+ENGINE_MOVIEPY = "moviepy"  # klatki składane w Pythonie przez MoviePy
+ENGINE_FFMPEG = "ffmpeg"  # jeden filtergraph ffmpeg (scale/overlay/concat), MoviePy jako zapas
+
+CONCAT_COMPOSE = "compose"  # concatenate_videoclips + jedno kodowanie całości
+CONCAT_COPY = "copy"  # osobne segmenty + ffmpeg concat demuxer (-c copy)
+CONCAT_STREAM = "stream"  # klatki po kolei z jednego źródła naraz do jednego enkodera (stała pamięć)
 
 
 class MoviePyProgressLogger:
-    def __init__(self, callback):
-        self.callback = callback
-
-    def __call__(self, message):
-        if self.callback:
-            match_percent = re.search(r"(\d+)%", message)
-            if match_percent:
-                percent = int(match_percent.group(1))
-                self.callback(percentage=percent, message=f"Zapisywanie: {percent}%")
-            else:
-                if "MoviePy - " not in message:
-                    self.callback(percentage=None, message=message)
+    """
+    Logger MoviePy (proglog) liczący klatki zapisu w RenderProgress i w pomiarach renderu:
+    każdy element paska "t" to jedna klatka filmu, pasek "chunk" (audio) zmienia tylko etap.
+    """
+
+    def __init__(self, progress, metrics=render_metrics.NULL_METRICS):
+        self.progress = progress
+        self.metrics = metrics
+
+    def __call__(self, message=None, **kwargs):
+        # Komunikaty MoviePy ("MoviePy - Writing video ...") nie niosą postępu - liczymy klatki w iter_bar
+        pass
 
     def iter_bar(self, **kwargs):
-        iterable = kwargs.get("t", kwargs.get("iterable", None))
-        if iterable is None:
-            return iter([])
+        # MoviePy przekazuje iterowaną sekwencję pod różnymi nazwami: t= (wideo), chunk= (audio)
+        if not kwargs:
+            return
+        name, iterable = next(iter(kwargs.items()))
+        if name != 't':
+            self.progress.set_phase("Zapisywanie audio...")
+            yield from iterable
+            return
+        self.progress.set_phase("Zapisywanie wideo...")
+        frames = 0
         try:
-            total = len(iterable)
-        except TypeError:
-            total = None
-        for i, item in enumerate(iterable):
-            if self.callback and total:
-                percent = int((i / total) * 100)
-                self.callback(percentage=percent, message=f"Krok {i + 1}/{total}")
-            yield item
+            for item in iterable:
+                yield item
+                frames += 1
+                self.progress.advance()
+        finally:
+            self.metrics.add_frames(frames)
 
 
 class VideoMerger:
-    def __init__(self):
+    def __init__(self, segment_cache=None, concat_method=CONCAT_COMPOSE, text_overlay_cache=None,
+                 text_backend=None, render_engine=ENGINE_MOVIEPY, incremental=False, output_profile=None,
+                 profiles=None, collect_metrics=None):
         self.clips_data = []
-        self.current_progress_callback = None
+        # Profil wyjścia: nazwa profilu z `profiles` (domyślnie: wbudowane + output_profiles.json)
+        self.profiles = profiles if profiles is not None else output_profiles.load_profiles()
+        self.profile = output_profiles.get_profile(output_profile, self.profiles)
+        self.encode_params = output_profiles.encode_params(self.profile)
+        self.render_engine = render_engine
+        # Backend rasteryzacji napisów: "pillow" (w procesie) albo "imagemagick" (TextClip)
+        self.text_renderer = text_render.get_text_renderer(text_backend)
+        self.text_cache = text_overlay_cache or text_cache.get_text_cache()
+        # SegmentCache: klipy niezależne od indeksu (intro/outro, plansze) są kodowane raz i używane ponownie
+        self.segment_cache = segment_cache
+        self.concat_method = concat_method
+        # Tryb przyrostowy: segmenty filmu zostają w katalogu obok pliku wynikowego (film.segments),
+        # a kolejny render tego samego filmu koduje tylko segmenty, których wejścia się zmieniły
+        self.incremental = incremental
+        # Postęp w klatkach całego filmu (render_progress), tworzony na nowo dla każdego renderu
+        self.progress = render_progress.RenderProgress()
+        # Wspólny postęp kilku renderów (warianty w merge_outputs) - kolejne rendery go nie zerują
+        self._shared_progress = False
+        # Plan ostatniego renderu (odcisk zapisuje kolejka zadań)
+        self.last_plan = None
+        # Pomiary czasu etapów (render_metrics): raport film.metrics.json obok pliku wynikowego
+        self.collect_metrics = render_metrics.metrics_enabled(collect_metrics)
+        self.metrics = render_metrics.NULL_METRICS
+        self._placeholder_item_no = None
+        self._placeholder_map = None
 
     def add_clip(self, clip_path, texts_data, image_duration=None):
         is_image = clip_path.lower().endswith(('.jpg', '.jpeg', '.png'))
@@ -58,35 +116,49 @@ class VideoMerger:
         """
         Zamienia wszystkie placeholdery w podanym tekście na realne dane.
         Pozostawia tekst bez zmian, jeśli item_no jest pusty lub żaden symbol nie pasuje.
+        Słownik danych jest budowany raz na indeks (w merge_videos) i używany dla wszystkich klipów.
         """
         if not item_no:
             return text
 
-        # 1. Zbuduj słownik danych (raz – żeby nie wołać do Excela przy każdym symbolu)
+        if self._placeholder_item_no != item_no:
+            self._prepare_placeholders(item_no)
+
+        with self.metrics.stage("resolve_text"):
+            return data_load.resolve_placeholders(text, self._placeholder_map)
+
+    def _prepare_placeholders(self, item_no):
+        self._placeholder_item_no = item_no
+        self._placeholder_map = None
+        if not item_no:
+            return
         try:
-            names = data_load.load_names(item_no)
-            data_map = {
-                "{INDEKS}": item_no,
-                "{NAZWA_PL}": names.get("PL", "Brak nazwy PL"),
-                "{NAZWA_EN}": names.get("EN", "Brak nazwy EN"),
-                "{OPIS}": data_load.load_description(item_no),
-                "{MATERIALY}": data_load.load_materials(item_no),
-            }
+            with self.metrics.stage("catalog", clip=None):
+                self._placeholder_map = data_load.build_placeholder_map(item_no)
         except Exception as e:
             print(f"Błąd _resolve_text dla {item_no}: {e}")
-            return text  # zostaw oryginał, jeśli nie udało się pobrać danych
-
-        # 2. Podmień *wszystkie* wystąpienia znanych kluczy – bez względu na wielkość liter
-        def repl(match):
-            key = match.group(0).upper()
-            return str(data_map.get(key, match.group(0)))
-
-        pattern = re.compile("|".join(re.escape(k) for k in data_map.keys()), re.IGNORECASE)
-        return pattern.sub(repl, text)
+            # zostaw oryginalne teksty, jeśli nie udało się pobrać danych
 
     # W pliku video_merger.py
 
+    def _render_text_rgba(self, text_content, config):
+        """Zwraca bitmapę RGBA napisu, korzystając z cache napisów."""
+        key = self.text_cache.key_for(text_content, config, extra=self.text_renderer.name)
+        rgba = self.text_cache.get(key)
+        if rgba is None:
+            self.metrics.count("text_cache_misses")
+            with self.metrics.stage("text_render"):
+                rgba = self.text_renderer.render(text_content, config)
+            self.text_cache.put(key, rgba)
+        else:
+            self.metrics.count("text_cache_hits")
+        return rgba
+
     def create_text_clip(self, text_content, config, clip_duration):
+        with self.metrics.stage("create_text_clip"):
+            return self._create_text_clip(text_content, config, clip_duration)
+
+    def _create_text_clip(self, text_content, config, clip_duration):
         text_start = config.get('start_time', 0)
         text_dur = config.get('duration')
 
@@ -95,85 +167,13 @@ class VideoMerger:
         if text_start > clip_duration:
             return None
 
+        # Bitmapa napisu (z tłem i przezroczystością) pochodzi z cache - rasteryzacja tylko przy pierwszym użyciu
+        rgba = self._render_text_rgba(text_content, config)
+        txt_clip = ImageClip(rgba).set_duration(duration).set_start(text_start)
 
-        wrap_width = config.get('wrap_width')
-
-
-        align_raw = config.get('alignment', 'center')
-        align_map = {'left': 'west', 'center': 'center', 'right': 'east'}
-        align = align_map.get(align_raw.lower(), 'center')
-
-        textclip_kwargs = {
-            'txt': text_content,
-            'fontsize': config.get('fontsize', 50),
-            'color': config.get('color', 'white'),
-            'font': config.get('font', 'Arial-Bold'),
-            'align': align
-        }
-
-        if wrap_width:
-            textclip_kwargs['method'] = 'caption'
-            textclip_kwargs['size'] = (wrap_width, None)
-
-        txt_clip = TextClip(**textclip_kwargs)
-
-        # --- POCZĄTEK POPRAWIONEJ LOGIKI TŁA ---
-        background_color = config.get('bg_color')
-        if (background_color and background_color!="None"):
-            try:
-                # Domyślnie używamy oryginalnej wartości
-                rgb_color = background_color
-
-                # Jeśli kolor jest stringiem w formacie hex, konwertujemy go na krotkę RGB
-                if isinstance(background_color, str) and background_color.startswith('#'):
-                    hex_val = background_color.lstrip('#')
-                    # Sprawdzamy, czy ma 6 znaków (RRGGBB)
-                    if len(hex_val) == 6:
-                        # Konwertujemy pary hex na liczby całkowite
-                        rgb_color = tuple(int(hex_val[i:i + 2], 16) for i in (0, 2, 4))
-                    else:
-                        print(f"Ostrzeżenie: Nieprawidłowy format koloru hex: {background_color}. Oczekiwano #RRGGBB.")
-
-                # Ustawiamy tło, używając skonwertowanego koloru RGB
-                txt_clip = txt_clip.on_color(
-                    size=(txt_clip.w + 20, txt_clip.h + 20),  # Dodaj trochę paddingu
-                    color=rgb_color,  # Przekazujemy krotkę RGB
-                    pos=('center', 'center'),
-                    col_opacity=config.get('background_opacity', 1.0)
-                )
-            except Exception as e:
-                # Lepsze logowanie błędów
-                print(f"Ostrzeżenie: Nie udało się ustawić koloru tła '{background_color}'. Błąd: {e}")
-                traceback.print_exc()
-        # --- KONIEC POPRAWIONEJ LOGIKI TŁA ---
-
-        txt_clip = txt_clip.set_duration(duration).set_start(text_start)
-        txt_clip = txt_clip.set_opacity(config.get('opacity', 0.8))
-
-        movement = config.get('movement')
-        if movement == 'static':
-            pos = config.get('position', (0.5, 0.5))
-
-            if (isinstance(pos, (tuple, list)) and len(pos) == 2 and
-                    all(isinstance(p, (int, float)) for p in pos)):
-
-                if 0 <= pos[0] <= 1 and 0 <= pos[1] <= 1:
-                    x = pos[0] * self.final_size[0]
-                    y = pos[1] * self.final_size[1]
-
-                    alignment = config.get('alignment', 'center')
-                    if alignment == 'left':
-                        y -= txt_clip.h / 2
-                    elif alignment == 'right':
-                        x -= txt_clip.w
-                        y -= txt_clip.h / 2
-                    else:  # center
-                        x -= txt_clip.w / 2
-                        y -= txt_clip.h / 2
-
-                    pos = (x, y)
-
-            txt_clip = txt_clip.set_position(pos)
+        if config.get('movement') == 'static':
+            txt_clip = txt_clip.set_position(
+                render_plan.static_position(config, self.final_size, txt_clip.w, txt_clip.h))
 
         return txt_clip
 
@@ -187,108 +187,372 @@ class VideoMerger:
     def _float_position(self):
         return lambda t: ('center', 100 + 50 * math.sin(2 * math.pi * t / 3))
 
-    # ZMIANA: process_clip przyjmuje teraz item_no do rozwiązywania symboli
-    def process_clip(self, clip_data, item_no):
+    def _resolve_clip_texts(self, clip_data, item_no):
+        """Lista (tekst, config) z podmienionymi symbolami, bez pustych napisów."""
+        resolved = []
+        for text_info in clip_data['texts']:
+            # ZMIANA: Rozwiązujemy symbol zastępczy przed utworzeniem klipu tekstowego
+            raw_text = text_info.get('text', '').strip()
+            resolved_text = self._resolve_text(raw_text, item_no)
+            if resolved_text:
+                resolved.append((resolved_text, text_info['config']))
+        return resolved
+
+    def _text_size(self, text, config):
+        rgba = self._render_text_rgba(text, config)
+        return rgba.shape[1], rgba.shape[0]
+
+    def build_render_plan(self, item_no, profile=None, proxies=None):
+        """
+        Plan renderu (render_plan) dla bieżącej listy klipów - bez dekodowania klatek.
+        proxies=False wymusza oryginały także dla profilu z proxy (np. wspólne dekodowanie z finalnym).
+        """
+        profile = profile or self.profile
+        if proxies is None:
+            proxies = profile.get('proxies')
+        clips_data = self._with_proxies(self.clips_data) if proxies else self.clips_data
+
+        def resolve_texts(clip_data):
+            index = next(i for i, c in enumerate(clips_data) if c is clip_data)
+            self.metrics.begin_clip(index, clip_data.get('original_path', clip_data['path']))
+            return self._resolve_clip_texts(clip_data, item_no)
+
+        with self.metrics.stage("plan", clip=None):
+            return render_plan.compile_plan(
+                clips_data, item_no,
+                resolve_texts=resolve_texts,
+                text_size=self._text_size,
+                encode_params=output_profiles.encode_params(profile),
+                profile=profile,
+                text_backend=self.text_renderer.name,
+            )
+
+    def _with_proxies(self, clips_data):
+        """
+        Lista klipów z gotowymi proxy w miejscu oryginałów wideo. Brakujące proxy są
+        zlecane w tle, a do tego czasu render używa oryginału.
+        """
+        proxies = proxy_cache.get_proxy_manager()
+        result = []
+        for clip_data in clips_data:
+            proxy = None if clip_data['is_image'] else proxies.proxy_for(clip_data['path'])
+            if proxy:
+                result.append(dict(clip_data, path=proxy, original_path=clip_data['path']))
+            else:
+                if not clip_data['is_image']:
+                    proxies.request(clip_data['path'])
+                result.append(clip_data)
+        return result
+
+    def _is_bakeable(self, overlay, segment):
+        """Napis w stałym miejscu, widoczny przez cały klip - można go wtopić w nieruchomy obraz."""
+        return overlay['x'] is not None and overlay['start'] == 0 and overlay['end'] == segment['duration']
+
+    def _static_overlay_compositor(self, overlays, clip_duration, frame_size=None):
+        """
+        StaticOverlayCompositor dla napisów segmentu albo None, jeśli któryś napis wymaga
+        zwykłego CompositeVideoClip (pozycja nieliczbowa lub napis wydłużający klip).
+        """
+        layers = []
+        for overlay in overlays:
+            if overlay['x'] is None or overlay['end'] > clip_duration + 1e-6:
+                return None
+            rgba = self._render_text_rgba(overlay['text'], overlay['config'])
+            layers.append((rgba, (overlay['x'], overlay['y']), overlay['start'], overlay['end']))
+        return compositor.StaticOverlayCompositor(frame_size or self.final_size, layers)
+
+    def _flatten_image(self, segment):
+        """
+        Skleja obraz (przeskalowany do final_size) i napisy stałe przez cały klip w jedną klatkę.
+        Zwraca (klatka uint8, napisy, których nie dało się wtopić).
+        """
+        image_clip = ImageClip(segment['path'])
+        if list(image_clip.size) != list(self.final_size):
+            image_clip = image_clip.resize(self.final_size)
+
+        frame = image_clip.get_frame(0).astype(np.float32)
+        if image_clip.mask is not None:
+            # Przezroczyste fragmenty obrazu są czarne, tak jak przy składaniu w CompositeVideoClip
+            frame *= image_clip.mask.get_frame(0)[:, :, None]
+        image_clip.close()
+
+        remaining = []
+        for overlay in segment['overlays']:
+            if self._is_bakeable(overlay, segment):
+                rgba = self._render_text_rgba(overlay['text'], overlay['config'])
+                compositor.blit_rgba(frame, rgba, (overlay['x'], overlay['y']))
+            else:
+                remaining.append(overlay)
+
+        return np.clip(np.round(frame), 0, 255).astype(np.uint8), remaining
+
+    def process_segment(self, segment, with_audio=True):
+        """Buduje klip MoviePy dla segmentu planu renderu."""
+        with self.metrics.stage("process_clip", clip=segment['index']):
+            clip, overlay_compositor = self._segment_layers(segment, with_audio)
+        if self.collect_metrics:
+            return clip.fl(self._timed_frame(segment['index'], overlay_compositor))
+        if overlay_compositor is not None:
+            return clip.fl(lambda get_frame, t: overlay_compositor(get_frame(t), t))
+        return clip
+
+    def _timed_frame(self, index, overlay_compositor):
+        """Filtr klatek mierzący dekodowanie i nakładanie napisów (tylko przy włączonych pomiarach)."""
+        def frame_at(get_frame, t):
+            with self.metrics.stage("decode", clip=index):
+                frame = get_frame(t)
+            if overlay_compositor is None:
+                return frame
+            with self.metrics.stage("composite", clip=index):
+                return overlay_compositor(frame, t)
+        return frame_at
+
+    def _open_video(self, segment, with_audio=True):
+        """
+        Otwiera klip wideo już w rozdzielczości wyjściowej. Przy innym rozmiarze źródła
+        skalowanie robi czytnik ffmpeg (-vf scale), więc Python nie dostaje klatek 4K
+        do zmniejszania; przy zgodnym rozmiarze klatki nie są skalowane wcale.
+        Obrócone nagrania zawsze dostają jawny rozmiar - MoviePy nie zna obrotu z
+        displaymatrix i przyjąłby rozmiar klatki sprzed automatycznego obrotu ffmpeg.
+        """
+        width, height = self.final_size
+        if list(segment['source_size']) == [width, height] and not segment.get('rotation'):
+            return VideoFileClip(segment['path'], audio=with_audio)
+        return VideoFileClip(segment['path'], audio=with_audio, target_resolution=(height, width))
+
+    def _segment_layers(self, segment, with_audio=True):
+        """
+        (klip, kompozytor napisów albo None) - napisy w stałych miejscach są nakładane
+        osobno przez StaticOverlayCompositor, pozostałe są już warstwami klipu.
+        """
         try:
-            base_clip = None
-            clip_path = clip_data['path']
+            clip_duration = segment['duration']
+            overlays = segment['overlays']
 
-            if clip_data['is_image']:
-                clip_duration = clip_data['image_duration']
-                base_clip = ImageClip(clip_path).set_duration(clip_duration)
+            if segment['is_image']:
+                # Obraz z napisami stałymi to jedna klatka - składamy ją raz zamiast w każdej klatce filmu
+                frame, overlays = self._flatten_image(segment)
+                base_clip = ImageClip(frame).set_duration(clip_duration)
             else:
-                base_clip = VideoFileClip(clip_path)
-                clip_duration = base_clip.duration
+                base_clip = self._open_video(segment, with_audio)
 
-            if not hasattr(self, 'final_size') or self.final_size is None:
-                if base_clip.size is None:
-                    raise ValueError(f"Nie można odczytać rozmiaru klipu: {clip_path}")
-                self.final_size = base_clip.size
-            base_clip = base_clip.resize(self.final_size)
+            if overlays:
+                # Napisy w stałych miejscach: jedna operacja NumPy na klatkę zamiast CompositeVideoClip
+                overlay_compositor = self._static_overlay_compositor(overlays, clip_duration)
+                if overlay_compositor is not None:
+                    return base_clip, overlay_compositor
 
             text_clips = []
-            for text_info in clip_data['texts']:
-                # ZMIANA: Rozwiązujemy symbol zastępczy przed utworzeniem klipu tekstowego
-                raw_text = text_info.get('text', '').strip()
-                resolved_text = self._resolve_text(raw_text, item_no)
-
-                if resolved_text:
-                    text_clip = self.create_text_clip(
-                        resolved_text,
-                        text_info['config'],
-                        clip_duration
-                    )
-                    if text_clip:
-                        text_clips.append(text_clip)
+            for overlay in overlays:
+                text_clip = self.create_text_clip(overlay['text'], overlay['config'], clip_duration)
+                if text_clip:
+                    text_clips.append(text_clip)
 
             if not text_clips:
-                return base_clip
+                return base_clip, None
 
             final_clip = CompositeVideoClip([base_clip] + text_clips)
-            return final_clip
+            return final_clip, None
 
         except Exception as e:
-            print(f"Error in process_clip for {clip_data['path']}: {str(e)}")
+            print(f"Error in process_clip for {segment['path']}: {str(e)}")
             traceback.print_exc()
             raise
 
-    # ZMIANA: merge_videos przyjmuje teraz item_no
-    def merge_videos(self, output_path, item_no, progress_callback=None):
-        self.current_progress_callback = progress_callback
+    # ZMIANA: process_clip przyjmuje teraz item_no do rozwiązywania symboli
+    def process_clip(self, clip_data, item_no):
+        plan = render_plan.compile_plan(
+            [clip_data], item_no,
+            resolve_texts=lambda data: self._resolve_clip_texts(data, item_no),
+            text_size=self._text_size,
+            encode_params=self.encode_params,
+            final_size=getattr(self, 'final_size', None),
+            text_backend=self.text_renderer.name,
+        )
+        if not plan['segments']:
+            raise ValueError(f"Nie można odczytać klipu: {clip_data['path']}")
+        self.final_size = plan['final_size']
+        return self.process_segment(plan['segments'][0])
+
+    def _report_segment(self, segment, fps=None):
+        path = segment.get('original_path') or segment['path']
+        self.metrics.begin_clip(segment['index'], path)
+        frames = render_progress.segment_frames(segment['duration'], fps or self.encode_params['fps'])
+        self.progress.start_segment(segment['index'], os.path.basename(path), frames)
+
+    def _start_render(self, item_no, progress_callback):
+        if not self._shared_progress:
+            self.progress = render_progress.RenderProgress(progress_callback)
         self.final_size = None
-
-        if not self.clips_data:
-            return False, "No videos or images added to merge!"
+        self.last_plan = None
+        # Dane z katalogu pobieramy raz dla całego renderu (dane mogły się zmienić od poprzedniego)
+        self._prepare_placeholders(item_no)
 
         if not item_no and any('{' in t['text'] for c in self.clips_data for t in c['texts']):
             print(
                 "OSTRZEŻENIE: Wykryto symbole zastępcze, ale nie podano numeru indeksu produktu. Symbole nie zostaną podmienione.")
 
-        processed_clips = []
-        total_clips = len(self.clips_data)
+    def _begin_progress(self, total_frames, segment_count):
+        """Start postępu renderu; przy wspólnym postępie wariantów - kolejny przebieg bez zerowania."""
+        if self._shared_progress:
+            self.progress.start_pass(total_frames, segment_count)
+        else:
+            self.progress.start(total_frames, segment_count)
 
-        for i, clip_data in enumerate(self.clips_data):
-            if self.current_progress_callback:
-                self.current_progress_callback(
-                    message=f"Przetwarzanie pliku {i + 1}/{total_clips}: {os.path.basename(clip_data['path'])}")
+    def merge_outputs(self, targets, item_no, progress_callback=None, threads=None):
+        """
+        Renderuje kilka wariantów filmu naraz: targets to lista (ścieżka, nazwa profilu).
+        Każde źródło jest dekodowane raz, a klatki trafiają do enkoderów wszystkich wariantów
+        (multi_output). Szablony wymagające warstw MoviePy są renderowane wariant po wariancie.
+        Przy włączonych pomiarach raport czasów powstaje obok każdego wariantu.
+        """
+        if not self.clips_data:
+            return False, "No videos or images added to merge!"
+        if self.collect_metrics:
+            self.metrics = render_metrics.RenderMetrics()
+        renderer = multi_output.MultiOutputRenderer(self, targets)
+        try:
+            self._start_render(item_no, progress_callback)
+            with self.metrics.stage("multi_output", clip=None):
+                success, message = renderer.render(item_no, threads)
+            if success:
+                self.progress.finish()
+            if self.collect_metrics:
+                # Jeden raport obok każdego wariantu - etapy są wspólne (jedno dekodowanie)
+                for target in renderer.compiled or []:
+                    self._write_metrics_report(target.output_path, success, message, target.plan,
+                                               target.encode_params)
+            return success, message
+        except multi_output.UnsupportedMultiOutput as e:
+            print(f"Wspólne dekodowanie wariantów nie obsługuje tego szablonu ({e}) - renderowanie osobno.")
+        finally:
+            self.metrics.close()
+            self.metrics = render_metrics.NULL_METRICS
+
+        # Jeden postęp dla wszystkich wariantów - procent nie wraca do zera przy kolejnym pliku
+        variants = [(output_path, output_profiles.get_profile(profile_name, self.profiles))
+                    for output_path, profile_name in targets]
+        self.progress = render_progress.RenderProgress(progress_callback)
+        self.progress.start(sum(render_progress.plan_frames(self.build_render_plan(item_no, variant_profile),
+                                                            output_profiles.encode_params(variant_profile)['fps'])
+                                for _, variant_profile in variants), len(self.clips_data))
+        profile = self.profile
+        messages = []
+        self._shared_progress = True
+        try:
+            for output_path, variant_profile in variants:
+                self.profile = variant_profile
+                self.encode_params = output_profiles.encode_params(variant_profile)
+                success, message = self.merge_videos(output_path, item_no, progress_callback, threads)
+                if not success:
+                    return False, message
+                messages.append(output_path)
+        finally:
+            self._shared_progress = False
+            self.profile = profile
+            self.encode_params = output_profiles.encode_params(profile)
+        self.progress.finish()
+        return True, f"Videos successfully created: {', '.join(messages)}"
 
-            if not os.path.exists(clip_data['path']):
-                print(f"ERROR: Clip file not found: {clip_data['path']}")
-                continue
+    # ZMIANA: merge_videos przyjmuje teraz item_no
+    def merge_videos(self, output_path, item_no, progress_callback=None, threads=None):
+        """
+        Renderuje film do output_path; zwraca (sukces, komunikat). Przy włączonych
+        pomiarach (collect_metrics) obok filmu powstaje raport czasów etapów (render_metrics).
+        """
+        if self.collect_metrics:
+            self.metrics = render_metrics.RenderMetrics()
+        self.last_plan = None
+        try:
+            success, message = self._merge_videos(output_path, item_no, progress_callback, threads)
+            if success and not self._shared_progress:
+                self.progress.finish()
+            if not self.collect_metrics:
+                return success, message
+
+            self._write_metrics_report(output_path, success, message, self.last_plan, self.encode_params)
+            return success, message
+        finally:
+            self.metrics.close()
+            self.metrics = render_metrics.NULL_METRICS
+
+    def _write_metrics_report(self, output_path, success, message, plan, encode_params):
+        frames = int(round(sum(s['duration'] for s in plan['segments']) * encode_params['fps'])) if plan else 0
+        report_path = self.metrics.write_report(output_path, success, message, plan, encode_params, frames)
+        if report_path:
+            print(f"Raport czasów renderu: {report_path}")
+
+    def _merge_videos(self, output_path, item_no, progress_callback=None, threads=None):
+        if not self.clips_data:
+            return False, "No videos or images added to merge!"
+
+        if self.profile.get('fit') == 'crop':
+            # Przycinanie kadru do proporcji profilu obsługuje tylko ścieżka wariantów (multi_output)
+            try:
+                self._start_render(item_no, progress_callback)
+                with self.metrics.stage("multi_output", clip=None):
+                    return multi_output.MultiOutputRenderer(self, [(output_path, self.profile['name'])]).render(
+                        item_no, threads)
+            except multi_output.UnsupportedMultiOutput as e:
+                print(f"Przycinanie kadru nie obsługuje tego szablonu ({e}) - obraz zostanie rozciągnięty.")
+
+        self._start_render(item_no, progress_callback)
+
+        plan = self.build_render_plan(item_no)
+        if not plan['segments']:
+            return False, "No clips were successfully processed! Check console for detailed error messages."
+        self.final_size = plan['final_size']
+        self.last_plan = plan
+        self._begin_progress(render_progress.plan_frames(plan, self.encode_params['fps']), len(self.clips_data))
 
+        if self.render_engine == ENGINE_FFMPEG:
+            engine = ffmpeg_engine.FFmpegRenderEngine(self, self.encode_params)
             try:
-                # ZMIANA: Przekazujemy item_no do process_clip
-                processed_clip = self.process_clip(clip_data, item_no)
-                processed_clips.append(processed_clip)
+                with self.metrics.stage("ffmpeg_render", clip=None):
+                    return engine.render(plan, output_path, self.progress, threads)
+            except ffmpeg_engine.UnsupportedByFilterGraph as e:
+                print(f"Filtergraph ffmpeg nie obsługuje tego szablonu ({e}) - renderowanie przez MoviePy.")
+
+        if self.concat_method == CONCAT_STREAM:
+            return self._merge_streaming(plan, output_path, threads)
+
+        # Cache segmentów ma sens tylko przy łączeniu bez ponownego kodowania
+        if self.concat_method == CONCAT_COPY or self.segment_cache is not None or self.incremental:
+            return self._merge_segments(plan, output_path, threads)
+
+        processed_clips = []
+
+        for segment in plan['segments']:
+            self._report_segment(segment)
+            try:
+                processed_clips.append(self.process_segment(segment))
             except Exception as e:
-                print(f"ERROR processing clip {clip_data['path']}: {str(e)}")
+                print(f"ERROR processing clip {segment['path']}: {str(e)}")
                 continue
 
         if not processed_clips:
             return False, "No clips were successfully processed! Check console for detailed error messages."
 
         try:
-            if self.current_progress_callback:
-                self.current_progress_callback(message="Łączenie i konkatenacja klipów...")
-
-            final_video = concatenate_videoclips(processed_clips, method="compose")
-
-            if self.current_progress_callback:
-                self.current_progress_callback(message="Rozpoczynanie zapisu wideo...")
+            self.progress.set_phase("Łączenie i konkatenacja klipów...")
+            with self.metrics.stage("concatenate", clip=None):
+                final_video = concatenate_videoclips(processed_clips, method="compose")
 
             print(f"Writing final video to: {output_path}")
-            logger = MoviePyProgressLogger(self.current_progress_callback)
-
-            final_video.write_videofile(
-                output_path,
-                fps=29,
-                codec='libx264',
-                audio_codec='aac',
-                threads=os.cpu_count(),
-                preset='ultrafast',
-                verbose=False,
-                logger=logger
-            )
+            # Zapis całości naraz - klatki nie należą już do jednego pliku
+            self.progress.start_segment(None, None)
+            logger = MoviePyProgressLogger(self.progress, self.metrics)
+
+            # Dekodowanie i napisy dzieją się w trakcie zapisu - przy pomiarach są liczone osobno
+            with self.metrics.stage("write", clip=None), ffmpeg_tools.atomic_output(output_path) as temp_path:
+                final_video.write_videofile(
+                    temp_path,
+                    threads=threads or os.cpu_count(),
+                    verbose=False,
+                    logger=logger,
+                    ffmpeg_params=self._crf_params(),
+                    **self._moviepy_params()
+                )
 
             for clip in processed_clips:
                 if clip:
@@ -302,4 +566,246 @@ class VideoMerger:
         except Exception as e:
             print(f"ERROR during video merging: {str(e)}")
             traceback.print_exc()
-            return False, f"Error during video merging: {str(e)}"
\ No newline at end of file
+            return False, f"Error during video merging: {str(e)}"
+
+    def _write_segment(self, clip, path, threads):
+        # Każdy segment musi mieć ścieżkę audio, inaczej nie da się go dokleić przez -c copy
+        if clip.audio is None:
+            clip = clip.set_audio(_silence(clip.duration, self.encode_params['audio_fps']))
+        clip.write_videofile(
+            path,
+            threads=threads or os.cpu_count(),
+            verbose=False,
+            logger=MoviePyProgressLogger(self.progress, self.metrics),
+            # Tymczasowe audio obok segmentu - domyślnie MoviePy pisze je do katalogu bieżącego
+            # pod nazwą zależną tylko od nazwy segmentu, więc równoległe rendery by je nadpisywały
+            temp_audiofile=os.path.splitext(path)[0] + ".audio.m4a",
+            ffmpeg_params=SEGMENT_FFMPEG_PARAMS + self._crf_params(),
+            **self._moviepy_params()
+        )
+
+    def _moviepy_params(self):
+        """Parametry profilu w postaci argumentów write_videofile."""
+        return {key: self.encode_params[key] for key in ('fps', 'codec', 'audio_codec', 'audio_fps', 'preset')}
+
+    def _crf_params(self):
+        crf = self.encode_params.get('crf')
+        return ['-crf', str(crf)] if crf is not None else []
+
+    def _encode_segment(self, segment, path, threads):
+        if segment['is_image']:
+            frame, remaining = self._flatten_image(segment)
+            if not remaining:
+                # Stała klatka - ffmpeg koduje ją bezpośrednio (-loop 1), bez pętli klatek w Pythonie
+                with self.metrics.stage("write", clip=segment['index']):
+                    ffmpeg_tools.encode_still_segment(frame, segment['duration'], path, self.encode_params,
+                                                      threads or os.cpu_count())
+                self.metrics.add_frames(render_progress.segment_frames(segment['duration'],
+                                                                       self.encode_params['fps']))
+                return path
+
+        clip = self.process_segment(segment)
+        try:
+            with self.metrics.stage("write", clip=segment['index']):
+                self._write_segment(clip, path, threads)
+        finally:
+            clip.close()
+        return path
+
+    def _cached_segment(self, cache, segment, threads):
+        """Ścieżka segmentu z cache; koduje go tylko, jeśli nie ma wersji o tym samym odcisku."""
+        key = cache.key_for(segment)
+        cached_path = cache.get(key)
+        if cached_path:
+            self.metrics.count("segments_reused")
+            self.progress.skip(render_progress.segment_frames(segment['duration'], self.encode_params['fps']))
+            return cached_path, True
+
+        temp_path = cache.temp_path_for(key)
+        self._encode_segment(segment, temp_path, threads)
+        self.metrics.count("segments_encoded")
+        return cache.store(key, temp_path), False
+
+    def _merge_segments(self, plan, output_path, threads):
+        """
+        Łączenie przez ffmpeg concat demuxer: każdy segment planu jest kodowany osobno
+        z identycznymi parametrami (kodek, fps, rozdzielczość, pix_fmt, audio), a segmenty
+        są sklejane bez dekodowania (-c copy). Segmenty niezależne od indeksu są brane
+        z cache segmentów (jeśli jest ustawiony), a w trybie przyrostowym pozostałe
+        segmenty - z katalogu roboczego filmu.
+        """
+        work_dir = tempfile.mkdtemp(prefix="videom_")
+        work_cache = None
+        plan_path = None
+        if self.incremental:
+            work_cache = SegmentCache(segment_work_dir(output_path))
+            plan_path = os.path.join(work_cache.cache_dir, "plan.json")
+            if os.path.exists(output_path) and self._rendered_plan_hash(plan_path) == render_plan.plan_hash(plan):
+                shutil.rmtree(work_dir, ignore_errors=True)
+                print(f"Film jest aktualny, pomijam render: {output_path}")
+                return True, f"Video is up to date: {output_path}"
+
+        try:
+            segment_paths = []
+            reused = 0
+
+            for segment in plan['segments']:
+                self._report_segment(segment)
+                try:
+                    if self.segment_cache is not None and segment['item_invariant']:
+                        path, hit = self._cached_segment(self.segment_cache, segment, threads)
+                    elif work_cache is not None:
+                        path, hit = self._cached_segment(work_cache, segment, threads)
+                    else:
+                        path = os.path.join(work_dir, f"segment_{segment['index']:03d}.mp4")
+                        path, hit = self._encode_segment(segment, path, threads), False
+                    segment_paths.append(path)
+                    reused += hit
+                except Exception as e:
+                    print(f"ERROR processing clip {segment['path']}: {str(e)}")
+                    continue
+                finally:
+                    self.progress.finish_segment()
+
+            if not segment_paths:
+                return False, "No clips were successfully processed! Check console for detailed error messages."
+
+            print(f"Segmenty: {len(segment_paths) - reused} zakodowane, {reused} użyte ponownie.")
+            if plan_path and os.path.exists(plan_path):
+                # Plik wynikowy zaraz zostanie nadpisany - do końca łączenia nie jest aktualny
+                os.remove(plan_path)
+            self.progress.set_phase("Łączenie segmentów bez ponownego kodowania...")
+            with self.metrics.stage("concatenate", clip=None), ffmpeg_tools.atomic_output(output_path) as temp_path:
+                ffmpeg_tools.concat_segments(segment_paths, temp_path, work_dir, self.encode_params)
+
+            if work_cache is not None:
+                # Stare wersje segmentów tego filmu nie będą już potrzebne
+                work_cache.prune(segment['fingerprint'] for segment in plan['segments'])
+                if len(segment_paths) == len(plan['segments']):
+                    os.makedirs(work_cache.cache_dir, exist_ok=True)
+                    render_plan.save_plan(plan, plan_path)
+
+            print("Video merge completed successfully!")
+            return True, f"Video successfully created: {output_path}"
+
+        except Exception as e:
+            print(f"ERROR during video merging: {str(e)}")
+            traceback.print_exc()
+            return False, f"Error during video merging: {str(e)}"
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _rendered_plan_hash(self, plan_path):
+        """Odcisk planu, z którego powstał istniejący film (zapisany w katalogu roboczym), albo None."""
+        try:
+            with open(plan_path, 'r', encoding='utf-8') as f:
+                return render_plan.plan_hash(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _segment_times(self, duration, timeline_start, fps):
+        """
+        Czasy klatek segmentu w siatce czasu całego filmu (k / fps), żeby przy wielu klipach
+        obraz nie rozjeżdżał się z audio przez zaokrąglanie długości segmentów.
+        """
+        k = math.ceil(timeline_start * fps - 1e-9)
+        while k / fps < timeline_start + duration - 1e-9:
+            yield k / fps - timeline_start
+            k += 1
+
+    def _stream_frames(self, plan, written_segments):
+        """
+        Generator (klatka, t, kompozytor) dla kolejnych segmentów planu. Otwarte jest
+        tylko jedno źródło naraz; czytnik jest zamykany zaraz po ostatniej klatce.
+        """
+        fps = self.encode_params['fps']
+        timeline = 0.0
+        for segment in plan['segments']:
+            self._report_segment(segment)
+            index = segment['index']
+            try:
+                with self.metrics.stage("process_clip", clip=index):
+                    clip, overlay_compositor = self._segment_layers(segment, with_audio=False)
+            except Exception as e:
+                print(f"ERROR processing clip {segment['path']}: {str(e)}")
+                continue
+            composite = overlay_compositor.apply if overlay_compositor is not None else None
+            if composite is not None and self.collect_metrics:
+                composite = self._timed_composite(index, composite)
+            try:
+                for t in self._segment_times(clip.duration, timeline, fps):
+                    with self.metrics.stage("decode", clip=index):
+                        frame = clip.get_frame(t)
+                    yield frame, t, composite
+                # Napis dłuższy od klipu wydłuża segment - audio musi mieć tę samą długość
+                written_segments.append(dict(segment, duration=clip.duration))
+                timeline += clip.duration
+            finally:
+                _close_clip(clip)
+
+    def _timed_composite(self, index, composite):
+        def timed(buffer, t):
+            with self.metrics.stage("composite", clip=index):
+                return composite(buffer, t)
+        return timed
+
+    def _merge_streaming(self, plan, output_path, threads):
+        """
+        Łączenie strumieniowe: w danej chwili otwarte jest tylko jedno źródło, a jego klatki
+        przechodzą przez potok wątków (dekodowanie -> napisy -> enkoder, FramePipeline)
+        do jednego procesu ffmpeg. Pamięć i liczba procesów nie zależą od liczby klipów.
+        Audio segmentów jest dokładane na końcu jednym wywołaniem ffmpeg, bez ponownego
+        kodowania obrazu.
+        """
+        work_dir = tempfile.mkdtemp(prefix="videom_")
+        try:
+            video_path = os.path.join(work_dir, "video.mp4")
+            writer = ffmpeg_tools.FrameWriter(video_path, plan['final_size'], self.encode_params,
+                                              threads or os.cpu_count())
+
+            def write_frame(frame):
+                with self.metrics.stage("encode", clip=None):
+                    writer.write_frame(frame)
+                self.progress.advance()
+
+            written_segments = []
+            width, height = plan['final_size']
+            try:
+                frame_pipeline.FramePipeline((height, width, 3), write_frame).run(
+                    self._stream_frames(plan, written_segments))
+            finally:
+                self.metrics.add_frames(writer.frames_written)
+                writer.close()
+
+            if not written_segments:
+                return False, "No clips were successfully processed! Check console for detailed error messages."
+
+            self.progress.set_phase("Dokładanie ścieżki audio...")
+            with self.metrics.stage("mux_audio", clip=None), ffmpeg_tools.atomic_output(output_path) as temp_path:
+                ffmpeg_tools.mux_segment_audio(video_path, written_segments, temp_path, self.encode_params)
+
+            print("Video merge completed successfully!")
+            return True, f"Video successfully created: {output_path}"
+
+        except Exception as e:
+            print(f"ERROR during video merging: {str(e)}")
+            traceback.print_exc()
+            return False, f"Error during video merging: {str(e)}"
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _close_clip(clip):
+    """Zamyka klip razem z warstwami (CompositeVideoClip nie zamyka czytników swoich klipów)."""
+    for layer in getattr(clip, 'clips', []):
+        layer.close()
+    clip.close()
+
+
+def _silence(duration, fps):
+    def make_frame(t):
+        if isinstance(t, np.ndarray):
+            return np.zeros((len(t), 2))
+        return np.zeros(2)
+
+    return AudioClip(make_frame, duration=duration, fps=fps)